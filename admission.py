@@ -0,0 +1,321 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+import metrics
+from metrics import Counter, Gauge
+from settings import settings
+
+# Admission control. Token buckets limit how often one client, one interview
+# session and the whole instance may create HeyGen/Gladia sessions, start
+# interviews or send answers. New interview starts additionally go through
+# START_QUEUE, which admits them in order and only while the instance has
+# headroom, so interviews that are already running keep theirs.
+#
+# Limits are "rate/burst" (tokens per second / bucket size), e.g.
+# ADMISSION_HEYGEN_CLIENT=0.1/3; "0" disables a limit. See settings.py.
+
+# Keyed (per client / per session) buckets kept before the least recently used is dropped.
+MAX_KEYS = settings.admission_max_keys
+RESERVE = settings.admission_reserve
+# Behind CapRover's nginx every request comes from the proxy; the client is the
+# address the proxy appended to X-Forwarded-For.
+TRUST_FORWARDED = settings.admission_trust_forwarded
+
+MAX_ACTIVE_INTERVIEWS = settings.admission_max_active_interviews
+START_MAX_WAIT = settings.admission_start_max_wait
+START_MAX_QUEUE = settings.admission_start_max_queue
+START_MAX_LOOP_LAG = settings.admission_start_max_loop_lag
+POLL_INTERVAL = 0.25
+
+ADMISSION_DENIED = Counter(
+    "admission_denied_total",
+    "Requests refused by admission control, by action and limit.",
+    ("action", "scope"),
+)
+START_QUEUE_WAIT = metrics.Histogram(
+    "admission_start_wait_seconds",
+    "Time interview starts spent queued for admission.",
+)
+
+
+def _limit(value: str) -> Optional[Tuple[float, float]]:
+    if value == "0":
+        return None
+    rate, _, burst = value.partition("/")
+    return float(rate), float(burst or rate)
+
+
+class AdmissionDenied(Exception):
+    """A request was refused; retry after `retry_after` seconds.
+
+    `status_code` is 429 when the caller exceeded its own limit and 503 when
+    the instance as a whole has no room.
+    """
+
+    def __init__(self, action: str, scope: str, retry_after: float, status_code: int = 429):
+        self.action = action
+        self.scope = scope
+        self.retry_after = retry_after
+        self.status_code = status_code
+        super().__init__(f"Too many {action} requests ({scope} limit); retry in {retry_after:.1f}s")
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def wait_time(self, now: float, floor: float = 0.0) -> float:
+        """Seconds until a token can be taken while leaving `floor` tokens behind."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        missing = 1 + floor - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self):
+        self.tokens -= 1
+
+
+class KeyedBuckets:
+    """One bucket per key, forgetting the least recently used beyond `max_keys`.
+
+    A forgotten key starts over with a full bucket, which is what it would
+    have refilled to anyway unless it was evicted within `burst / rate`.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = MAX_KEYS):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def get(self, key: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+
+class RateLimit:
+    """Token buckets for one kind of request: per client, per session and global.
+
+    Requests that do not belong to a running interview may not take the last
+    `reserve` share of the global bucket.
+    """
+
+    def __init__(self, action: str, client: Optional[Tuple[float, float]] = None,
+                 session: Optional[Tuple[float, float]] = None, global_: Optional[Tuple[float, float]] = None,
+                 reserve: float = RESERVE):
+        self.action = action
+        self.client = KeyedBuckets(*client) if client else None
+        self.session = KeyedBuckets(*session) if session else None
+        self.global_ = TokenBucket(*global_, time.monotonic()) if global_ else None
+        self.reserve = reserve
+        self.allowed = 0
+        self.denied: Dict[str, int] = {}
+
+    def check(self, client: Optional[str] = None, session: Optional[str] = None, priority: bool = False):
+        """Takes a token from every applicable bucket, or raises AdmissionDenied and takes none."""
+        now = time.monotonic()
+        buckets = []
+        if self.client is not None and client:
+            buckets.append(("client", self.client.get(client, now), 0.0))
+        if self.session is not None and session:
+            buckets.append(("session", self.session.get(session, now), 0.0))
+        if self.global_ is not None:
+            floor = 0.0 if priority else self.reserve * self.global_.burst
+            buckets.append(("global", self.global_, floor))
+        for scope, bucket, floor in buckets:
+            wait = bucket.wait_time(now, floor)
+            if wait > 0:
+                self.denied[scope] = self.denied.get(scope, 0) + 1
+                ADMISSION_DENIED.inc(self.action, scope)
+                raise AdmissionDenied(self.action, scope, wait, 503 if scope == "global" else 429)
+        for _, bucket, _ in buckets:
+            bucket.take()
+        self.allowed += 1
+
+    def stats(self) -> dict:
+        limits = {}
+        for scope, buckets in (("client", self.client), ("session", self.session)):
+            if buckets is not None:
+                limits[scope] = {"rate": buckets.rate, "burst": buckets.burst, "tracked": len(buckets)}
+        if self.global_ is not None:
+            self.global_.wait_time(time.monotonic())
+            limits["global"] = {"rate": self.global_.rate, "burst": self.global_.burst,
+                                "tokens": round(self.global_.tokens, 2), "reserve": self.reserve}
+        return {"limits": limits, "allowed": self.allowed, "denied": dict(self.denied)}
+
+
+class StartQueue:
+    """Admits new interview starts in arrival order, as fast as the instance can take them.
+
+    A start is admitted while the start bucket has a token, fewer than
+    `max_active` interviews are connected or starting, and the event loop is
+    less than `max_loop_lag` late. Running interviews never wait here, so
+    under load new interviews are held back and running ones keep going.
+    Starts that cannot go right away queue for at most `max_wait`; one whose
+    estimated wait is already longer is refused at once.
+    """
+
+    def __init__(self, rate: Optional[Tuple[float, float]], active: Callable[[], int],
+                 max_active: int = MAX_ACTIVE_INTERVIEWS, max_wait: float = START_MAX_WAIT,
+                 max_queue: int = START_MAX_QUEUE, max_loop_lag: float = START_MAX_LOOP_LAG):
+        self.bucket = TokenBucket(*rate, time.monotonic()) if rate else None
+        self._active = active
+        self.max_active = max_active
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.max_loop_lag = max_loop_lag
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._dispatcher: Optional[asyncio.Task] = None
+        # Moving average of the time between queued admissions, for wait estimates.
+        self._interval = 1 / rate[0] if rate else POLL_INTERVAL
+        self._last_admit = 0.0
+        self.starting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _blocked(self, now: float) -> float:
+        """0 when a start can be admitted now, else how long to wait before checking again."""
+        if self.max_active and self._active() + self.starting >= self.max_active:
+            return POLL_INTERVAL
+        if self.max_loop_lag and metrics.loop_lag() > self.max_loop_lag:
+            return POLL_INTERVAL
+        if self.bucket is not None:
+            return self.bucket.wait_time(now)
+        return 0.0
+
+    def estimate(self) -> Tuple[int, float]:
+        """(position, estimated wait in seconds) for a start arriving now."""
+        if not self._waiters and not self._blocked(time.monotonic()):
+            return 0, 0.0
+        position = len(self._waiters) + 1
+        return position, round(position * self._interval, 1)
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        ADMISSION_DENIED.inc("start", reason)
+        raise AdmissionDenied("start", reason, max(retry_after, 1.0), 503)
+
+    def _admit(self, now: float, queued: bool):
+        if self.bucket is not None:
+            self.bucket.take()
+        if queued:
+            self._interval = 0.8 * self._interval + 0.2 * (now - self._last_admit)
+        self._last_admit = now
+        self.admitted += 1
+
+    async def _dispatch(self):
+        while self._waiters:
+            if self._waiters[0].done():  # timed out or the caller went away
+                self._waiters.popleft()
+                continue
+            now = time.monotonic()
+            delay = self._blocked(now)
+            if delay > 0:
+                await asyncio.sleep(min(delay, POLL_INTERVAL))
+                continue
+            self._admit(now, queued=True)
+            self._waiters.popleft().set_result(None)
+        self._dispatcher = None
+
+    @asynccontextmanager
+    async def slot(self):
+        """Waits for admission; the start counts against `max_active` until the block exits."""
+        now = time.monotonic()
+        if not self._waiters and not self._blocked(now):
+            self._admit(now, queued=False)
+        else:
+            _, estimate = self.estimate()
+            if len(self._waiters) >= self.max_queue or estimate > self.max_wait:
+                self._reject("queue_full", estimate)
+            if not self._waiters:
+                self._last_admit = now
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            self.queued += 1
+            if self._dispatcher is None:
+                self._dispatcher = asyncio.create_task(self._dispatch())
+            try:
+                await asyncio.wait_for(future, self.max_wait)
+            except asyncio.TimeoutError:
+                self._reject("queue_timeout", self.estimate()[1])
+            START_QUEUE_WAIT.observe(time.monotonic() - now)
+        self.starting += 1
+        try:
+            yield
+        finally:
+            self.starting -= 1
+
+    def stats(self) -> dict:
+        position, estimate = self.estimate()
+        return {
+            "queued_now": len(self._waiters),
+            "estimated_wait_seconds": estimate,
+            "starting": self.starting,
+            "active": self._active(),
+            "max_active": self.max_active,
+            "max_wait_seconds": self.max_wait,
+            "max_loop_lag_seconds": self.max_loop_lag,
+            "loop_lag_seconds": round(metrics.loop_lag(), 4),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+        }
+
+
+def client_key(request) -> str:
+    """The address of the client behind `request` (an HTTP Request or a WebSocket)."""
+    if TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.rsplit(",", 1)[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+
+START = RateLimit("start", client=_limit(settings.admission_start_client))
+HEYGEN = RateLimit("heygen_session", client=_limit(settings.admission_heygen_client),
+                   global_=_limit(settings.admission_heygen_global))
+GLADIA = RateLimit("gladia_session", client=_limit(settings.admission_gladia_client),
+                   session=_limit(settings.admission_gladia_session),
+                   global_=_limit(settings.admission_gladia_global))
+ANSWERS = RateLimit("answer", session=_limit(settings.admission_answer_session),
+                    global_=_limit(settings.admission_answer_global))
+LIMITS = (START, HEYGEN, GLADIA, ANSWERS)
+
+
+def _active_interviews() -> int:
+    from helper import REGISTRY
+    return REGISTRY.connected_count()
+
+
+START_QUEUE = StartQueue(_limit(settings.admission_start_global), _active_interviews)
+
+ADMISSION_START_QUEUE = Gauge(
+    "admission_start_queue_length",
+    "Interview starts waiting for admission.",
+    function=lambda: len(START_QUEUE._waiters),
+)
+
+
+def get_stats() -> dict:
+    return {
+        "start_queue": START_QUEUE.stats(),
+        **{limit.action: limit.stats() for limit in LIMITS},
+    }
@@ -0,0 +1,136 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from metrics import Counter
+from settings import settings
+
+# Gladia finalizes an utterance after `endpointing` (2 s) of silence, so one
+# spoken answer can arrive as several `user_answer` fragments. Fragments are
+# held until the candidate has been quiet for ANSWER_QUIET_WINDOW seconds, the
+# client sends {"type": "answer_complete"}, the text reaches ANSWER_MAX_CHARS,
+# or the first fragment has waited ANSWER_MAX_HOLD seconds. Gladia's
+# speech_start events (seen by the audio relay) pause the quiet window, so a
+# candidate who is still talking is not cut off. static/interview.js sends
+# every final Gladia utterance as a fragment. A client that sends the whole
+# answer in one message marks it {"final": true} and skips the wait entirely.
+QUIET_WINDOW = settings.answer_quiet_window
+MAX_CHARS = settings.answer_max_chars
+MAX_HOLD = settings.answer_max_hold
+
+ANSWER_FLUSHES = Counter(
+    "answer_flushes_total",
+    "Consolidated answers handed to the n8n forwarder, by flush trigger.",
+    ("reason",),
+)
+ANSWER_FRAGMENTS = Counter(
+    "answer_fragments_total",
+    "user_answer fragments received over interview WebSockets.",
+)
+
+Submit = Callable[[str], Awaitable[bool]]
+
+
+class AnswerAggregator:
+    """Joins one session's answer fragments into a single answer before forwarding."""
+
+    def __init__(self, session_id: str, submit: Submit, quiet_window: float = QUIET_WINDOW,
+                 max_chars: int = MAX_CHARS, max_hold: float = MAX_HOLD):
+        self.session_id = session_id
+        self.quiet_window = quiet_window
+        self.max_chars = max_chars
+        self.max_hold = max_hold
+        self._submit = submit
+        self._fragments: List[str] = []
+        self._length = 0
+        self._first_at = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._speaking = False
+        self._flushes = set()
+        self.fragments = 0
+        self.answers = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._fragments)
+
+    async def add(self, fragment: str):
+        fragment = fragment.strip()
+        if not fragment:
+            return
+        self.fragments += 1
+        ANSWER_FRAGMENTS.inc()
+        if not self._fragments:
+            self._first_at = asyncio.get_running_loop().time()
+        # A final transcript means the utterance it belongs to has ended.
+        self._speaking = False
+        self._fragments.append(fragment)
+        self._length += len(fragment) + 1
+        if self._length >= self.max_chars:
+            await self.flush("size")
+            return
+        self._schedule()
+
+    def speech_started(self):
+        """The candidate started speaking again; wait for what they say next."""
+        self._speaking = True
+        if self._fragments:
+            self._schedule()
+
+    def _schedule(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        hold_left = self._first_at + self.max_hold - asyncio.get_running_loop().time()
+        if self._speaking or self.quiet_window > hold_left:
+            delay, reason = max(hold_left, 0.0), "max_hold"
+        else:
+            delay, reason = self.quiet_window, "quiet"
+        self._timer = asyncio.get_running_loop().call_later(delay, self._flush_later, reason)
+
+    def _flush_later(self, reason: str):
+        self._timer = None
+        task = asyncio.create_task(self.flush(reason))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self, reason: str) -> bool:
+        """Hands the buffered fragments to the forwarder as one answer."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._fragments:
+            return False
+        answer = " ".join(self._fragments)
+        count = len(self._fragments)
+        self._fragments = []
+        self._length = 0
+        self.answers += 1
+        ANSWER_FLUSHES.inc(reason)
+        print(f"Forwarding answer for session {self.session_id} from {count} fragment(s) ({reason})")
+        return await self._submit(answer)
+
+    async def close(self):
+        """Flushes whatever is still buffered, e.g. when the socket closes."""
+        await self.flush("close")
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+AGGREGATORS: Dict[str, AnswerAggregator] = {}
+
+
+def open_aggregator(session_id: str, submit: Submit) -> AnswerAggregator:
+    aggregator = AGGREGATORS[session_id] = AnswerAggregator(session_id, submit)
+    return aggregator
+
+
+async def close_aggregator(session_id: str, aggregator: AnswerAggregator):
+    await aggregator.close()
+    # A reconnect may already have opened a newer aggregator for the session.
+    if AGGREGATORS.get(session_id) is aggregator:
+        del AGGREGATORS[session_id]
+
+
+def note_speech_start(session_id: str):
+    aggregator = AGGREGATORS.get(session_id)
+    if aggregator is not None:
+        aggregator.speech_started()
@@ -0,0 +1,160 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from metrics import Gauge
+from resilience import is_transient, UpstreamUnavailable
+from settings import settings
+
+QUEUE_SIZE = settings.n8n_forward_queue_size
+# What to do when the queue is full: "block" applies backpressure to the socket
+# reader, "drop_oldest" / "drop_newest" discard an answer instead.
+OVERFLOW_POLICY = settings.n8n_forward_policy
+MAX_RETRIES = settings.n8n_forward_retries
+RETRY_BACKOFF = settings.n8n_forward_backoff
+FLUSH_TIMEOUT = settings.n8n_forward_flush_timeout
+
+_CLOSE = object()
+
+Forward = Callable[[str, str], Awaitable[bool]]
+
+
+class AnswerForwarder:
+    """Forwards one session's answers to n8n in order from a background task.
+
+    The WebSocket receive loop only enqueues, so heartbeats and later messages
+    keep flowing while n8n is slow.
+    """
+
+    def __init__(self, session_id: str, forward: Forward, maxsize: int = QUEUE_SIZE,
+                 policy: str = OVERFLOW_POLICY):
+        self.session_id = session_id
+        self.policy = policy
+        self._forward = forward
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._task = asyncio.create_task(self._drain())
+        self._closing = False
+        # Sockets using this forwarder; a resumed socket shares it with the
+        # one it replaces until that one's handler has finished.
+        self.connections = 0
+        self.forwarded = 0
+        self.dropped = 0
+        self.retries = 0
+        self.failures = 0
+        self.last_latency = 0.0
+        self.total_latency = 0.0
+
+    async def submit(self, answer: str) -> bool:
+        """Queues an answer; returns False when it was dropped."""
+        if self._closing:
+            return False
+        if self.policy == "block":
+            await self._queue.put((answer, time.monotonic()))
+            return True
+        try:
+            self._queue.put_nowait((answer, time.monotonic()))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.policy == "drop_newest":
+                print(f"WARNING: n8n forward queue full for session {self.session_id}; dropped newest answer")
+                return False
+            self._queue.get_nowait()
+            self._queue.task_done()
+            self._queue.put_nowait((answer, time.monotonic()))
+            print(f"WARNING: n8n forward queue full for session {self.session_id}; dropped oldest answer")
+            return True
+
+    async def close(self, timeout: float = FLUSH_TIMEOUT):
+        """Forwards what is still queued, then stops; gives up after `timeout` seconds."""
+        if self._closing:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._finish(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"WARNING: Gave up flushing {self._queue.qsize()} answers for session {self.session_id}")
+            self._task.cancel()
+
+    async def _finish(self):
+        await self._queue.put(_CLOSE)
+        # Shielded so a cancelled caller leaves the drain task running to flush.
+        await asyncio.shield(self._task)
+
+    async def _drain(self):
+        while True:
+            item = await self._queue.get()
+            if item is _CLOSE:
+                return
+            answer, queued_at = item
+            try:
+                await self._forward_with_retry(answer)
+                latency = time.monotonic() - queued_at
+                self.last_latency = latency
+                self.total_latency += latency
+            except Exception as e:
+                # e.g. the session store failing; the next answer may still go through.
+                self.failures += 1
+                print(f"Error forwarding answer for session {self.session_id}: {e!r}")
+            finally:
+                self._queue.task_done()
+
+    async def _forward_with_retry(self, answer: str):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                if await self._forward(self.session_id, answer):
+                    self.forwarded += 1
+                else:
+                    self.failures += 1
+                return
+            except (httpx.HTTPError, UpstreamUnavailable) as e:
+                if not is_transient(e) or attempt == MAX_RETRIES:
+                    self.failures += 1
+                    print(f"Error forwarding answer to n8n: {e}")
+                    return
+                self.retries += 1
+                await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+
+    def stats(self) -> dict:
+        return {
+            "depth": self._queue.qsize(),
+            "forwarded": self.forwarded,
+            "dropped": self.dropped,
+            "retries": self.retries,
+            "failures": self.failures,
+            "last_latency_seconds": round(self.last_latency, 3),
+            "avg_latency_seconds": round(self.total_latency / self.forwarded, 3) if self.forwarded else 0.0,
+        }
+
+
+FORWARDERS: Dict[str, AnswerForwarder] = {}
+
+Gauge("n8n_forward_queue_depth", "Answers waiting to be forwarded to n8n, across sessions.",
+      function=lambda: sum(forwarder._queue.qsize() for forwarder in FORWARDERS.values()))
+
+
+def open_forwarder(session_id: str, forward: Forward) -> AnswerForwarder:
+    forwarder = FORWARDERS.get(session_id)
+    if forwarder is None or forwarder._closing:
+        forwarder = FORWARDERS[session_id] = AnswerForwarder(session_id, forward)
+    forwarder.connections += 1
+    return forwarder
+
+
+async def close_forwarder(session_id: str, forwarder: AnswerForwarder):
+    """Releases one socket's use of `forwarder`; the last socket to leave flushes and closes it."""
+    forwarder.connections -= 1
+    if forwarder.connections > 0:
+        return
+    if FORWARDERS.get(session_id) is forwarder:
+        del FORWARDERS[session_id]
+    await forwarder.close()
+
+
+def get_stats(session_id: Optional[str] = None) -> dict:
+    if session_id is not None:
+        forwarder = FORWARDERS.get(session_id)
+        return forwarder.stats() if forwarder else {}
+    return {sid: forwarder.stats() for sid, forwarder in FORWARDERS.items()}
@@ -0,0 +1,108 @@
+import gzip
+import hashlib
+import mimetypes
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt; without it only gzip is offered.
+    brotli = None
+
+# Encodings in order of preference when the client accepts several.
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+# Files smaller than this are not worth compressing.
+MIN_COMPRESS_SIZE = 256
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+class Asset:
+    """One file held in memory, with precompressed variants."""
+
+    __slots__ = ("name", "content_type", "etag", "variants", "hashed_name")
+
+    def __init__(self, name: str, body: bytes, content_type: str):
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        stem, dot, suffix = name.rpartition(".")
+        self.name = name
+        self.content_type = content_type
+        self.etag = f'"{digest}"'
+        self.hashed_name = f"{stem}.{digest}.{suffix}" if dot else f"{name}.{digest}"
+        self.variants: Dict[str, bytes] = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=11)
+
+    def negotiate(self, accept_encoding: str) -> str:
+        accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+        for encoding in ENCODINGS:
+            if encoding in self.variants and encoding in accepted:
+                return encoding
+        return "identity"
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        encoding = self.negotiate(request.headers.get("accept-encoding", ""))
+        # Each encoding is a different representation, so it gets its own ETag.
+        etag = self.etag if encoding == "identity" else f'{self.etag[:-1]}-{encoding}"'
+        headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(self.variants[encoding], media_type=self.content_type, headers=headers)
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates
+
+
+class AssetPipeline:
+    """Fingerprints and precompresses every file under a directory at startup."""
+
+    def __init__(self, directory: str, url_prefix: str = "/static"):
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix
+        self._by_name: Dict[str, Asset] = {}
+        self._by_hashed_name: Dict[str, Asset] = {}
+
+    def build(self):
+        self._by_name.clear()
+        self._by_hashed_name.clear()
+        for path in sorted(self.directory.rglob("*")):
+            if not path.is_file():
+                continue
+            name = path.relative_to(self.directory).as_posix()
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            if content_type.startswith("text/") or content_type == "application/javascript":
+                content_type += "; charset=utf-8"
+            self.add(Asset(name, path.read_bytes(), content_type))
+        print(f"Asset pipeline built {len(self._by_name)} assets (encodings: {', '.join(ENCODINGS)})")
+
+    def add(self, asset: Asset):
+        self._by_name[asset.name] = asset
+        self._by_hashed_name[asset.hashed_name] = asset
+
+    def url(self, name: str) -> str:
+        """Fingerprinted URL of an asset, for use in templates."""
+        return f"{self.url_prefix}/{self._by_name[name].hashed_name}"
+
+    def response(self, path: str, request: Request) -> Optional[Response]:
+        asset = self._by_hashed_name.get(path)
+        if asset is not None:
+            return asset.response(request, IMMUTABLE)
+        # Unfingerprinted paths keep working but must be revalidated.
+        asset = self._by_name.get(path)
+        if asset is not None:
+            return asset.response(request, REVALIDATE)
+        return None
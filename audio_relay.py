@@ -0,0 +1,125 @@
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+import websockets
+
+from codec import encode, decode
+from settings import settings
+
+# 16 kHz, 16-bit mono PCM is 32 bytes per millisecond.
+BATCH_BYTES = settings.audio_relay_batch_bytes
+BATCH_INTERVAL = settings.audio_relay_batch_interval
+# How long to wait for final transcripts after stop_recording.
+DRAIN_TIMEOUT = settings.audio_relay_drain_timeout
+
+OnMessage = Callable[[dict], Awaitable[None]]
+OnError = Callable[[Exception], Awaitable[None]]
+
+
+class AudioRelay:
+    """Relays one session's raw PCM frames to a Gladia live session.
+
+    Small browser frames are coalesced into batches of at least BATCH_BYTES,
+    or whatever arrived within BATCH_INTERVAL, and sent as binary frames over a
+    single upstream WebSocket. Gladia's messages are handed to `on_message`.
+    If the reader or the flusher fails, the other is stopped and `on_error`
+    is awaited with the exception so the caller can close the client socket.
+    """
+
+    def __init__(self, session_id: str, upstream_url: str, on_message: OnMessage,
+                 on_error: Optional[OnError] = None):
+        self.session_id = session_id
+        self.upstream_url = upstream_url
+        self._on_message = on_message
+        self._on_error = on_error
+        self._ws = None
+        self._buffer = bytearray()
+        self._lock = asyncio.Lock()
+        self._reader: Optional[asyncio.Task] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._failure: Optional[asyncio.Task] = None
+        self._closing = False
+        self.error: Optional[Exception] = None
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.frames_out = 0
+
+    async def open(self):
+        self._ws = await websockets.connect(self.upstream_url, max_size=None, compression=None)
+        self._reader = asyncio.create_task(self._read())
+        self._flusher = asyncio.create_task(self._flush_periodically())
+        self._reader.add_done_callback(self._task_done)
+        self._flusher.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+        error = task.exception()
+        if self._closing or self.error is not None:
+            return
+        # The reader only returns when Gladia closes the session, which it
+        # should not do before stop_recording.
+        self._fail(error or ConnectionError("Gladia closed the live session"))
+
+    def _fail(self, error: Exception):
+        self.error = error
+        print(f"ERROR: Audio relay for session {self.session_id} failed: {error!r}")
+        for task in (self._reader, self._flusher):
+            if task is not asyncio.current_task():
+                task.cancel()
+        if self._on_error is not None:
+            self._failure = asyncio.create_task(self._on_error(error))
+
+    async def feed(self, frame: bytes):
+        if self.error is not None:
+            return
+        self.frames_in += 1
+        self.bytes_in += len(frame)
+        self._buffer += frame
+        if len(self._buffer) >= BATCH_BYTES:
+            try:
+                await self._flush()
+            except Exception as e:
+                if not self._closing and self.error is None:
+                    self._fail(e)
+
+    async def _flush(self):
+        async with self._lock:
+            if not self._buffer:
+                return
+            batch = bytes(self._buffer)
+            self._buffer.clear()
+            await self._ws.send(batch)
+            self.frames_out += 1
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(BATCH_INTERVAL)
+            await self._flush()
+
+    async def _read(self):
+        async for raw in self._ws:
+            await self._on_message(decode(raw))
+
+    async def close(self):
+        if self._ws is None:
+            return
+        self._closing = True
+        if self._flusher:
+            self._flusher.cancel()
+        try:
+            if self.error is None:
+                await self._flush()
+                await self._ws.send(encode({"type": "stop_recording"}))
+                # Gladia sends the last transcripts and then closes the socket itself.
+                await asyncio.wait((self._reader,), timeout=DRAIN_TIMEOUT)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._reader.cancel()
+            await self._ws.close()
+            self._ws = None
+            if self._failure is not None and self._failure is not asyncio.current_task():
+                await asyncio.gather(self._failure, return_exceptions=True)
+        print(f"Audio relay for session {self.session_id} closed: "
+              f"{self.frames_in} frames in, {self.frames_out} batches out, {self.bytes_in} bytes")
@@ -0,0 +1,182 @@
+import asyncio
+import re
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import httpx
+from fastapi import HTTPException
+
+import heygen_sessions
+from resilience import UpstreamUnavailable
+from settings import settings
+
+# Segments longer than this are split further at clause boundaries.
+SEGMENT_MAX_CHARS = settings.heygen_segment_max_chars
+# Fragments shorter than this are merged into their neighbour so the avatar
+# does not pause after every "Okay,".
+SEGMENT_MIN_CHARS = settings.heygen_segment_min_chars
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?…])\s+")
+_CLAUSE_BREAK = re.compile(r"(?<=[,;:])\s+")
+
+
+def _merge_short(parts: List[str]) -> List[str]:
+    merged: List[str] = []
+    for part in parts:
+        if merged and (len(merged[-1]) < SEGMENT_MIN_CHARS or len(part) < SEGMENT_MIN_CHARS) \
+                and len(merged[-1]) + len(part) + 1 <= SEGMENT_MAX_CHARS:
+            merged[-1] = f"{merged[-1]} {part}"
+        else:
+            merged.append(part)
+    return merged
+
+
+def _split_long(sentence: str) -> List[str]:
+    if len(sentence) <= SEGMENT_MAX_CHARS:
+        return [sentence]
+    parts = []
+    for clause in _CLAUSE_BREAK.split(sentence):
+        # A clause with no punctuation at all is cut at the last space that fits.
+        while len(clause) > SEGMENT_MAX_CHARS:
+            cut = clause.rfind(" ", 0, SEGMENT_MAX_CHARS)
+            cut = cut if cut > 0 else SEGMENT_MAX_CHARS
+            parts.append(clause[:cut])
+            clause = clause[cut:].lstrip()
+        if clause:
+            parts.append(clause)
+    return _merge_short(parts)
+
+
+def split_segments(text: str) -> List[str]:
+    """Splits text into sentence (or, for long sentences, clause) segments in speaking order."""
+    segments: List[str] = []
+    for sentence in _SENTENCE_BREAK.split(text.strip()):
+        if sentence:
+            segments.extend(_split_long(sentence))
+    return _merge_short(segments)
+
+
+class _Utterance:
+    __slots__ = ("segments", "task_type", "first_sent", "failed")
+
+    def __init__(self, segments: List[str], task_type: str):
+        self.segments: Deque[str] = deque(segments)
+        self.task_type = task_type
+        self.first_sent: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.failed = False
+
+
+class SpeechQueue:
+    """Sends one HeyGen session's speech to HeyGen segment by segment, in order.
+
+    HeyGen queues async tasks itself, so a segment is posted as soon as the one
+    before it was accepted; the avatar starts speaking after the first segment
+    instead of after the whole text. Utterances are spoken in the order they
+    were queued, and `interrupt()` drops everything not yet sent. A queue
+    leaves QUEUES once it has nothing left to send.
+    """
+
+    def __init__(self, session_id: str, streaming_token: str):
+        self.session_id = session_id
+        self.streaming_token = streaming_token
+        self._utterances: Deque[_Utterance] = deque()
+        self._worker: Optional[asyncio.Task] = None
+        self.segments_sent = 0
+        self.segments_cancelled = 0
+
+    @property
+    def pending_segments(self) -> int:
+        return sum(len(utterance.segments) for utterance in self._utterances)
+
+    async def speak(self, text: str, task_type: str) -> dict:
+        """Queues text; returns once its first segment was accepted by HeyGen."""
+        segments = split_segments(text)
+        if not segments:
+            if self._worker is None and QUEUES.get(self.session_id) is self:
+                del QUEUES[self.session_id]
+            raise HTTPException(status_code=400, detail="Text is empty.")
+        utterance = _Utterance(segments, task_type)
+        self._utterances.append(utterance)
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        first = await asyncio.shield(utterance.first_sent)
+        return {"segments": len(segments), "first_task": first}
+
+    def interrupt(self) -> int:
+        """Drops every segment not yet sent; returns how many were dropped."""
+        dropped = 0
+        while self._utterances:
+            utterance = self._utterances.popleft()
+            dropped += len(utterance.segments)
+            if not utterance.first_sent.done():
+                utterance.first_sent.set_exception(HTTPException(status_code=409, detail="Speech was interrupted."))
+                # Nobody may be waiting on it any more; don't log it as unretrieved.
+                utterance.first_sent.exception()
+        self.segments_cancelled += dropped
+        return dropped
+
+    async def _run(self):
+        try:
+            while self._utterances:
+                utterance = self._utterances[0]
+                if not utterance.segments:
+                    self._utterances.popleft()
+                    continue
+                segment = utterance.segments.popleft()
+                try:
+                    result = await heygen_sessions.send_task(self.streaming_token, self.session_id, segment,
+                                                             utterance.task_type)
+                    data = result.get("data")
+                except (httpx.HTTPError, UpstreamUnavailable) as e:
+                    status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else 502
+                    self._fail(utterance, status, e)
+                    continue
+                except Exception as e:
+                    # A malformed HeyGen response must not leave speak() waiting forever.
+                    self._fail(utterance, 502, e)
+                    continue
+                self.segments_sent += 1
+                if not utterance.first_sent.done():
+                    utterance.first_sent.set_result(data)
+        finally:
+            # An idle queue is dropped; the next text for the session starts a new one.
+            if QUEUES.get(self.session_id) is self:
+                del QUEUES[self.session_id]
+
+    def _fail(self, utterance: _Utterance, status: int, error: Exception):
+        print(f"Error sending speech segment to HeyGen session {self.session_id}: {error!r}")
+        # Skip the rest of this utterance rather than speak it with a gap.
+        utterance.segments.clear()
+        if not utterance.first_sent.done():
+            utterance.first_sent.set_exception(HTTPException(status_code=status, detail=f"Error from HeyGen: {error}"))
+            utterance.first_sent.exception()
+
+    def cancel(self):
+        self.interrupt()
+        if self._worker is not None:
+            self._worker.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "pending_segments": self.pending_segments,
+            "segments_sent": self.segments_sent,
+            "segments_cancelled": self.segments_cancelled,
+        }
+
+
+QUEUES: Dict[str, SpeechQueue] = {}
+
+
+def get_queue(session_id: str, streaming_token: str) -> SpeechQueue:
+    queue = QUEUES.get(session_id)
+    if queue is None:
+        queue = QUEUES[session_id] = SpeechQueue(session_id, streaming_token)
+    else:
+        queue.streaming_token = streaming_token
+    return queue
+
+
+def discard_queue(session_id: str):
+    queue = QUEUES.pop(session_id, None)
+    if queue is not None:
+        queue.cancel()
@@ -0,0 +1,123 @@
+"""Replays answer-fragment timings through AnswerAggregator.
+
+Counts how many n8n forwards a sequence of `user_answer` fragments turns into
+with and without aggregation, and how long the last fragment of each answer
+waits before it is forwarded. Fragment timings come either from a recorded
+trace or from a synthetic model of Gladia endpointing:
+
+  recorded   JSON lines of {"t": <seconds since start>, "answer": <text>},
+             {"t": ..., "type": "speech_start"} and {"t": ..., "type":
+             "answer_complete"}, e.g. captured from the interview socket
+  synthetic  --answers answers of 1..--max-fragments utterances each. Every
+             utterance lasts 2-10 s and its final transcript arrives after 2 s
+             of silence (Gladia endpointing); utterances of one answer are
+             separated by 2 s to 2 s + --pause of silence, answers by --think
+
+Time is simulated, so a long trace replays instantly. Run from the repo root:
+
+    python -m benchmarks.answer_aggregation --answers 200
+    python -m benchmarks.answer_aggregation --trace fragments.jsonl
+"""
+import argparse
+import asyncio
+import json
+import random
+from typing import List, Tuple
+
+from answer_aggregator import AnswerAggregator
+
+ENDPOINTING = 2.0
+
+
+class SimulatedLoop(asyncio.SelectorEventLoop):
+    """Event loop whose clock jumps straight to the next scheduled timer."""
+
+    def __init__(self):
+        super().__init__()
+        self._now = 0.0
+
+    def time(self) -> float:
+        return self._now
+
+    def _run_once(self):
+        if not self._ready:
+            pending = [handle._when for handle in self._scheduled if not handle._cancelled]
+            if pending:
+                self._now = max(self._now, min(pending))
+        super()._run_once()
+
+
+def synthetic_trace(answers: int, max_fragments: int, pause: float, think: float, seed: int) -> List[dict]:
+    rng = random.Random(seed)
+    events, now = [], 0.0
+    for index in range(answers):
+        for fragment in range(rng.randint(1, max_fragments)):
+            if fragment:
+                now += ENDPOINTING + rng.uniform(0.0, pause)
+            events.append({"t": now, "type": "speech_start"})
+            now += rng.uniform(2.0, 10.0)
+            events.append({"t": now + ENDPOINTING, "answer": f"answer {index} part {fragment}", "answer_id": index})
+        now += think
+    events.sort(key=lambda event: event["t"])
+    return events
+
+
+def load_trace(path: str) -> List[dict]:
+    with open(path) as trace:
+        return [json.loads(line) for line in trace if line.strip()]
+
+
+async def replay(events: List[dict], quiet_window: float, max_chars: int) -> Tuple[int, List[float]]:
+    loop = asyncio.get_running_loop()
+    forwarded: List[float] = []
+    last_fragment_at = [0.0]
+
+    async def submit(answer: str) -> bool:
+        forwarded.append(loop.time() - last_fragment_at[0])
+        return True
+
+    aggregator = AnswerAggregator("bench", submit, quiet_window=quiet_window, max_chars=max_chars)
+    for event in events:
+        await asyncio.sleep(max(event["t"] - loop.time(), 0.0))
+        if event.get("type") == "answer_complete":
+            await aggregator.flush("complete")
+        elif event.get("type") == "speech_start":
+            aggregator.speech_started()
+        else:
+            last_fragment_at[0] = loop.time()
+            await aggregator.add(event["answer"])
+    await asyncio.sleep(quiet_window + 1)
+    await aggregator.close()
+    return len(forwarded), forwarded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="recorded fragment trace (JSON lines)")
+    parser.add_argument("--answers", type=int, default=100)
+    parser.add_argument("--max-fragments", type=int, default=4)
+    parser.add_argument("--pause", type=float, default=1.5, help="extra pause between fragments of one answer")
+    parser.add_argument("--think", type=float, default=8.0, help="gap between answers (question + thinking)")
+    parser.add_argument("--max-chars", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    events = load_trace(args.trace) if args.trace else synthetic_trace(
+        args.answers, args.max_fragments, args.pause, args.think, args.seed)
+    fragments = sum(1 for event in events if "answer" in event)
+    spoken = len({event["answer_id"] for event in events if "answer_id" in event}) or None
+    print(f"{fragments} fragments" + (f" from {spoken} spoken answers" if spoken else ""))
+    print(f"{'quiet window':>14}{'n8n forwards':>14}{'p50 wait s':>12}{'max wait s':>12}")
+    print(f"{'(none)':>14}{fragments:>14}{0.0:>12.2f}{0.0:>12.2f}")
+    for quiet_window in (0.5, 1.0, 2.0, 3.0):
+        loop = SimulatedLoop()
+        try:
+            count, waits = loop.run_until_complete(replay(events, quiet_window, args.max_chars))
+        finally:
+            loop.close()
+        waits.sort()
+        print(f"{quiet_window:>14.1f}{count:>14}{waits[len(waits) // 2]:>12.2f}{waits[-1]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
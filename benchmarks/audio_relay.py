@@ -0,0 +1,94 @@
+"""Compares base64 JSON audio chunks against the binary AudioRelay.
+
+Streams synthetic 16 kHz PCM to a local fake Gladia WebSocket server, once as
+`audio_chunk` JSON messages (what the browser used to send) and once as raw
+frames through AudioRelay, and reports wire bytes, upstream frames, wall time
+and CPU time. Run from the repo root:
+
+    python -m benchmarks.audio_relay [seconds_of_audio] [frame_samples]
+"""
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+
+import websockets
+
+from audio_relay import AudioRelay
+
+
+class FakeGladia:
+    def __init__(self):
+        self.frames = 0
+        self.wire_bytes = 0
+        self.audio_bytes = 0
+        self.server = None
+
+    async def _handle(self, ws):
+        async for message in ws:
+            self.frames += 1
+            self.wire_bytes += len(message)
+            if isinstance(message, bytes):
+                self.audio_bytes += len(message)
+                continue
+            data = json.loads(message)
+            if data["type"] == "audio_chunk":
+                self.audio_bytes += len(base64.b64decode(data["data"]["chunk"]))
+            elif data["type"] == "stop_recording":
+                await ws.send(json.dumps({"type": "post_final_transcript"}))
+                await ws.close()
+
+    async def start(self) -> str:
+        self.server = await websockets.serve(self._handle, "127.0.0.1", 0, max_size=None, compression=None)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"ws://127.0.0.1:{port}/"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def send_base64_json(url: str, frames):
+    async with websockets.connect(url, max_size=None, compression=None) as ws:
+        for frame in frames:
+            chunk = base64.b64encode(frame).decode()
+            await ws.send(json.dumps({"type": "audio_chunk", "data": {"chunk": chunk}}))
+        await ws.send(json.dumps({"type": "stop_recording"}))
+        async for _ in ws:
+            pass
+
+
+async def send_binary_relay(url: str, frames):
+    async def ignore(message: dict):
+        pass
+
+    relay = AudioRelay("bench", url, ignore)
+    await relay.open()
+    for frame in frames:
+        await relay.feed(frame)
+    await relay.close()
+
+
+async def main(seconds: int, frame_samples: int):
+    frame_bytes = frame_samples * 2
+    total_bytes = seconds * 16000 * 2
+    frames = [os.urandom(frame_bytes) for _ in range(total_bytes // frame_bytes)]
+    print(f"{seconds}s of audio as {len(frames):,} frames of {frame_samples} samples")
+
+    for label, sender in (("base64 json  ", send_base64_json), ("binary relay ", send_binary_relay)):
+        fake = FakeGladia()
+        url = await fake.start()
+        wall, cpu = time.perf_counter(), time.process_time()
+        await sender(url, frames)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        await fake.stop()
+        print(f"{label}: {fake.wire_bytes:>10,} wire bytes for {fake.audio_bytes:,} audio bytes, "
+              f"{fake.frames:>6,} upstream frames, {wall * 1000:7.1f}ms wall, {cpu * 1000:7.1f}ms cpu")
+
+
+if __name__ == "__main__":
+    seconds = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+    frame_samples = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+    asyncio.run(main(seconds, frame_samples))
@@ -0,0 +1,118 @@
+"""Time-to-first-speech of /api/heygen/task versus /api/heygen/task/stream.
+
+Serves a HeyGen streaming.task stub in-process that models the avatar: a task
+is synthesized in `--synth-base` + `--synth-per-char` seconds after it is
+received, then spoken at `--chars-per-second`, and tasks are spoken strictly
+one after another. Time to first speech is when the avatar starts speaking,
+measured from the moment the app received the request. Run from the repo root:
+
+    python -m benchmarks.avatar_speech [--rounds 20]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+PORT = 9152
+STUB_URL = f"http://127.0.0.1:{PORT}"
+
+os.environ.update(HEYGEN_SERVER_URL=f"{STUB_URL}/heygen", HEYGEN_API_KEY="bench")
+
+import httpx  # noqa: E402
+
+import heygen_tracker  # noqa: E402
+import main  # noqa: E402
+
+QUESTION = ("Terima kasih sudah bergabung dengan sesi wawancara hari ini. Pertanyaan pertama: ceritakan tentang "
+            "diri Anda, latar belakang pendidikan Anda, pengalaman kerja yang paling relevan dengan posisi ini, "
+            "dan alasan utama mengapa Anda tertarik untuk bergabung dengan perusahaan kami. Silakan mulai "
+            "kapan pun Anda siap.")
+
+
+class AvatarModel:
+    def __init__(self, synth_base: float, synth_per_char: float, chars_per_second: float):
+        self.synth_base = synth_base
+        self.synth_per_char = synth_per_char
+        self.chars_per_second = chars_per_second
+        self.speaking_until = 0.0
+        self.first_speech = None
+
+    def reset(self):
+        self.speaking_until = 0.0
+        self.first_speech = None
+
+    async def task(self, request: Request):
+        body = await request.json()
+        text = body["text"]
+        ready = time.perf_counter() + self.synth_base + self.synth_per_char * len(text)
+        start = max(ready, self.speaking_until)
+        self.speaking_until = start + len(text) / self.chars_per_second
+        if self.first_speech is None:
+            self.first_speech = start
+        # HeyGen answers an async task once it is accepted, not when it is spoken.
+        await asyncio.sleep(0.02)
+        return JSONResponse({"code": 100, "data": {"task_id": "t"}})
+
+    async def ok(self, request: Request):
+        return JSONResponse({"code": 100, "data": {"token": "bench-token"}})
+
+
+async def measure(app_client: httpx.AsyncClient, model: AvatarModel, path: str) -> float:
+    model.reset()
+    started = time.perf_counter()
+    response = await app_client.post(path, json={"session_id": "bench", "token": "bench-token", "text": QUESTION,
+                                                   "task_type": "repeat"})
+    response.raise_for_status()
+    # Streamed segments keep arriving after the response; wait until the model saw the first one.
+    while model.first_speech is None:
+        await asyncio.sleep(0.001)
+    ttfs = model.first_speech - started
+    await asyncio.sleep(max(model.speaking_until - time.perf_counter(), 0.0) + 0.05)
+    return ttfs
+
+
+async def run(args):
+    model = AvatarModel(args.synth_base, args.synth_per_char, args.chars_per_second)
+    stub = Starlette(routes=[
+        Route("/heygen/v1/streaming.task", model.task, methods=["POST"]),
+        Route("/heygen/v1/streaming.create_token", model.ok, methods=["POST"]),
+    ])
+    server = uvicorn.Server(uvicorn.Config(stub, host="127.0.0.1", port=PORT, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    # /api/heygen/task/stream only serves sessions this server handed out.
+    heygen_tracker.TRACKER.track("bench", "bench-token")
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as app_client:
+            for path in ("/api/heygen/task", "/api/heygen/task/stream"):
+                samples = sorted([await measure(app_client, model, path) for _ in range(args.rounds)])
+                print(f"{path:<26} time to first speech: p50 {samples[len(samples) // 2] * 1000:7.1f} ms, "
+                      f"max {samples[-1] * 1000:7.1f} ms")
+    finally:
+        server.should_exit = True
+        await serving
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--synth-base", type=float, default=0.25)
+    parser.add_argument("--synth-per-char", type=float, default=0.004)
+    parser.add_argument("--chars-per-second", type=float, default=200.0,
+                        help="speaking rate; kept high so the benchmark finishes quickly")
+    args = parser.parse_args()
+    print(f"question: {len(QUESTION)} characters")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,133 @@
+"""Cold start to first fast request, with and without startup warm-up.
+
+Starts the upstream stubs behind a TCP proxy that holds every new connection
+for `--handshake` seconds before forwarding it. That stands in for the DNS
+lookup, TCP and TLS handshakes a fresh container pays against the real n8n,
+HeyGen and Gladia hosts. The app is then launched the way a redeploy does it
+(a fresh uvicorn process), once with STARTUP_WARMUP=false and once with true.
+The benchmark records:
+
+  ready        time from process spawn until /readyz answers 200
+  first        latency of the first /api/heygen/initiate_session after that
+  first fast   time from spawn until an initiate_session answers within --fast-ms
+
+Run from the repo root:
+
+    python -m benchmarks.cold_start [--handshake 0.3] [--rounds 3]
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.loadtest import wait_until_up
+
+APP_PORT = 9157
+STUB_PORT = 9158
+PROXY_PORT = 9159
+
+
+async def start_proxy(handshake: float) -> asyncio.AbstractServer:
+    async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while data := await reader.read(65536):
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle(client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        try:
+            await asyncio.sleep(handshake)
+            upstream_reader, upstream_writer = await asyncio.open_connection("127.0.0.1", STUB_PORT)
+            await asyncio.gather(pipe(client_reader, upstream_writer), pipe(upstream_reader, client_writer))
+        except asyncio.CancelledError:
+            # Connections still open when the benchmark ends.
+            client_writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", PROXY_PORT)
+
+
+async def cold_start(warmup: bool, fast_ms: float, timeout: float) -> dict:
+    upstream_url = f"http://127.0.0.1:{PROXY_PORT}"
+    app_url = f"http://127.0.0.1:{APP_PORT}"
+    env = dict(os.environ,
+               N8N_START_INTERVIEW_URL=f"{upstream_url}/n8n/start",
+               HEYGEN_SERVER_URL=f"{upstream_url}/heygen",
+               HEYGEN_API_KEY="bench",
+               AVATAR_NAME="bench",
+               GLADIA_API_URL=f"{upstream_url}/gladia/v2/live",
+               GLADIA_API_KEY="bench",
+               STARTUP_WARMUP=str(warmup).lower())
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+                                "--port", str(APP_PORT), "--log-level", "warning"],
+                               env=env, stdout=subprocess.DEVNULL)
+    result = {}
+    try:
+        async with httpx.AsyncClient(base_url=app_url, timeout=timeout) as client:
+            while "ready" not in result:
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError("the app did not become ready")
+                try:
+                    if (await client.get("/readyz")).status_code == 200:
+                        result["ready"] = time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.01)
+            while "first_fast" not in result:
+                sent = time.perf_counter()
+                (await client.post("/api/heygen/initiate_session")).raise_for_status()
+                latency = time.perf_counter() - sent
+                result.setdefault("first", latency)
+                if latency * 1000 <= fast_ms:
+                    result["first_fast"] = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+    return result
+
+
+async def run(args):
+    proxy = await start_proxy(args.handshake)
+    try:
+        for warmup in (False, True):
+            samples = [await cold_start(warmup, args.fast_ms, args.timeout) for _ in range(args.rounds)]
+            best = min(samples, key=lambda sample: sample["first_fast"])
+            worst = max(samples, key=lambda sample: sample["first_fast"])
+            print(f"{'on' if warmup else 'off':>8}{best['ready']:>10.2f}{best['first'] * 1000:>12.0f}"
+                  f"{best['first_fast']:>14.2f}{worst['first_fast']:>14.2f}")
+    finally:
+        proxy.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handshake", type=float, default=0.3,
+                        help="seconds every new upstream connection is held (DNS + TCP + TLS)")
+    parser.add_argument("--heygen-latency", type=float, default=0.05)
+    parser.add_argument("--fast-ms", type=float, default=250.0)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    stub_process = subprocess.Popen([sys.executable, "-m", "benchmarks.stubs", "--port", str(STUB_PORT),
+                                     "--heygen-latency", str(args.heygen_latency)], stdout=subprocess.DEVNULL)
+    try:
+        wait_until_up(f"http://127.0.0.1:{STUB_PORT}/n8n/start", stub_process)
+        print(f"handshake {args.handshake * 1000:.0f} ms per new connection, fast = within {args.fast_ms:.0f} ms")
+        print(f"{'warm-up':>8}{'ready s':>10}{'first ms':>12}{'first fast s':>14}{'worst fast s':>14}")
+        asyncio.run(run(args))
+    finally:
+        stub_process.terminate()
+        stub_process.wait()
+
+
+if __name__ == "__main__":
+    main()
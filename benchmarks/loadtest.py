@@ -0,0 +1,269 @@
+"""Asyncio load test for the interview server against local upstream stubs.
+
+Starts benchmarks.stubs and the app (uvicorn main:app) as subprocesses, then
+drives N concurrent interviews end to end:
+
+  1. POST /api/interview/start (optionally POST /api/heygen/initiate_session)
+  2. open /ws/interview/{session_id}/ and hold it until every interview is connected
+  3. push the first question via /api/send-question, as n8n would
+  4. answer each question over the socket; the n8n stub pushes the next one
+     back through /api/send-question until it ends the interview
+
+Reports p50/p95/p99 latency per phase, answer throughput and server memory
+per connected session. Run from the repo root:
+
+    python -m benchmarks.loadtest --interviews 2000 --questions 5
+    python -m benchmarks.loadtest --save-baseline default
+    python -m benchmarks.loadtest --compare default   # exits 1 on regression
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import websockets
+
+from benchmarks import stubs
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.app_url = f"http://127.0.0.1:{args.app_port}"
+        self.ws_url = f"ws://127.0.0.1:{args.app_port}"
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, phase: str, started: float):
+        self.samples.setdefault(phase, []).append(time.perf_counter() - started)
+
+    def fail(self, phase: str, error: Exception):
+        self.errors[phase] = self.errors.get(phase, 0) + 1
+        if self.args.verbose:
+            print(f"{phase} failed: {error!r}")
+
+    async def open_interview(self, http: httpx.AsyncClient, index: int, gate: asyncio.Semaphore):
+        async with gate:
+            started = time.perf_counter()
+            try:
+                response = await http.post(f"{self.app_url}/api/interview/start",
+                                           json={"booking_code": f"bench{index}"})
+                response.raise_for_status()
+                session_id = response.json()["sessionId"]
+            except (httpx.HTTPError, KeyError) as e:
+                self.fail("start", e)
+                return None
+            self.record("start", started)
+
+            if self.args.heygen:
+                started = time.perf_counter()
+                try:
+                    (await http.post(f"{self.app_url}/api/heygen/initiate_session")).raise_for_status()
+                    self.record("heygen_initiate", started)
+                except httpx.HTTPError as e:
+                    self.fail("heygen_initiate", e)
+
+            started = time.perf_counter()
+            try:
+                ws = await websockets.connect(f"{self.ws_url}/ws/interview/{session_id}/", max_size=None)
+            except (OSError, websockets.WebSocketException) as e:
+                self.fail("ws_connect", e)
+                return None
+            self.record("ws_connect", started)
+            return session_id, ws
+
+    async def run_interview(self, http: httpx.AsyncClient, session_id: str, ws) -> int:
+        answers = 0
+        try:
+            started = time.perf_counter()
+            await http.post(f"{self.app_url}/api/send-question",
+                            json={"sessionId": session_id, "question": "Question 1?"})
+            message = json.loads(await asyncio.wait_for(ws.recv(), self.args.timeout))
+            self.record("question_push", started)
+            while message.get("type") == "new_question":
+                started = time.perf_counter()
+                await ws.send(json.dumps({"type": "user_answer",
+                                          "payload": {"answer": "benchmark answer", "final": True}}))
+                message = json.loads(await asyncio.wait_for(ws.recv(), self.args.timeout))
+                self.record("answer_round_trip", started)
+                answers += 1
+        except (asyncio.TimeoutError, httpx.HTTPError, websockets.WebSocketException) as e:
+            self.fail("interview", e)
+        finally:
+            await ws.close()
+        return answers
+
+    async def run(self, server_pid: int) -> dict:
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=self.args.timeout) as http:
+            rss_before = rss_bytes(server_pid)
+            gate = asyncio.Semaphore(self.args.concurrency)
+            started = time.perf_counter()
+            opened = await asyncio.gather(*(self.open_interview(http, i, gate) for i in range(self.args.interviews)))
+            opened = [item for item in opened if item is not None]
+            ramp_seconds = time.perf_counter() - started
+            rss_peak = rss_bytes(server_pid)
+
+            started = time.perf_counter()
+            answers = await asyncio.gather(*(self.run_interview(http, sid, ws) for sid, ws in opened))
+            run_seconds = time.perf_counter() - started
+
+        return {
+            "interviews": self.args.interviews,
+            "connected": len(opened),
+            "answers": sum(answers),
+            "ramp_seconds": round(ramp_seconds, 3),
+            "run_seconds": round(run_seconds, 3),
+            "answers_per_second": round(sum(answers) / run_seconds, 1) if run_seconds else 0.0,
+            "bytes_per_session": int((rss_peak - rss_before) / len(opened)) if opened else 0,
+            "errors": self.errors,
+            "latency": {
+                phase: {
+                    "count": len(values),
+                    "p50": round(percentile(values, 0.50), 4),
+                    "p95": round(percentile(values, 0.95), 4),
+                    "p99": round(percentile(values, 0.99), 4),
+                }
+                for phase, values in self.samples.items()
+            },
+        }
+
+
+def print_report(report: dict):
+    print(f"\ninterviews {report['connected']}/{report['interviews']} connected, "
+          f"{report['answers']} answers in {report['run_seconds']}s "
+          f"({report['answers_per_second']}/s), ramp {report['ramp_seconds']}s")
+    print(f"server memory: {report['bytes_per_session']:,} bytes per connected session")
+    print(f"{'phase':<20}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for phase, stats in report["latency"].items():
+        print(f"{phase:<20}{stats['count']:>8}{stats['p50'] * 1000:>10.1f}"
+              f"{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}")
+    if report["errors"]:
+        print(f"errors: {report['errors']}")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    regressions = []
+    for phase, stats in baseline["latency"].items():
+        current = report["latency"].get(phase)
+        if current and current["p95"] > stats["p95"] * (1 + tolerance):
+            regressions.append(f"{phase} p95 {current['p95'] * 1000:.1f}ms > baseline {stats['p95'] * 1000:.1f}ms")
+    if report["answers_per_second"] < baseline["answers_per_second"] * (1 - tolerance):
+        regressions.append(f"throughput {report['answers_per_second']}/s < baseline {baseline['answers_per_second']}/s")
+    if report["bytes_per_session"] > baseline["bytes_per_session"] * (1 + tolerance):
+        regressions.append(f"memory {report['bytes_per_session']} B/session > baseline {baseline['bytes_per_session']}")
+    return regressions
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interviews", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=200, help="concurrent HTTP requests while ramping up")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--heygen", action="store_true", help="also call /api/heygen/initiate_session")
+    parser.add_argument("--app-port", type=int, default=9000)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs. baseline")
+    parser.add_argument("--admission", action="store_true",
+                        help="keep the configured ADMISSION_* limits (every simulated candidate shares 127.0.0.1)")
+    parser.add_argument("--verbose", action="store_true")
+    stubs.add_arguments(parser)
+    args = parser.parse_args()
+
+    # Thousands of sockets need more than the usual 1024 file descriptors.
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    app_url = f"http://127.0.0.1:{args.app_port}"
+    stub_cmd = [sys.executable, "-m", "benchmarks.stubs", "--port", str(args.stub_port), "--app-url", app_url,
+                "--questions", str(args.questions)]
+    for name in ("n8n", "heygen", "gladia"):
+        stub_cmd += [f"--{name}-latency", str(getattr(args, f"{name}_latency")),
+                     f"--{name}-jitter", str(getattr(args, f"{name}_jitter")),
+                     f"--{name}-error-rate", str(getattr(args, f"{name}_error_rate"))]
+    env = dict(os.environ,
+               N8N_START_INTERVIEW_URL=f"{stub_url}/n8n/start",
+               HEYGEN_SERVER_URL=f"{stub_url}/heygen",
+               HEYGEN_API_KEY="bench",
+               GLADIA_API_URL=f"{stub_url}/gladia/v2/live",
+               GLADIA_API_KEY="bench")
+    if not args.admission:
+        # One client address and start rates far above production would
+        # measure admission control instead of the server.
+        env.update({f"ADMISSION_{name}": "0" for name in (
+            "START_CLIENT", "START_GLOBAL", "HEYGEN_CLIENT", "HEYGEN_GLOBAL", "GLADIA_CLIENT", "GLADIA_SESSION",
+            "GLADIA_GLOBAL", "ANSWER_SESSION", "ANSWER_GLOBAL", "START_MAX_LOOP_LAG")})
+    app_cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.app_port),
+               "--log-level", "warning"]
+
+    quiet = None if args.verbose else subprocess.DEVNULL
+    stub_process = subprocess.Popen(stub_cmd, stdout=quiet)
+    app_process = subprocess.Popen(app_cmd, env=env, stdout=quiet)
+    try:
+        wait_until_up(f"{stub_url}/n8n/start", stub_process)
+        wait_until_up(f"{app_url}/metrics", app_process)
+        report = asyncio.run(LoadTest(args).run(app_process.pid))
+    finally:
+        app_process.terminate()
+        stub_process.terminate()
+        app_process.wait()
+        stub_process.wait()
+
+    print_report(report)
+    if args.save_baseline:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save_baseline}.json"
+        path.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline saved to {path}")
+    if args.compare:
+        baseline = json.loads((BASELINE_DIR / f"{args.compare}.json").read_text())
+        regressions = compare(report, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against baseline '{args.compare}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Fault injection against the upstream resilience policies using local stubs.
+
+Serves benchmarks.stubs in-process and runs three scenarios:
+
+  outage    HeyGen answers every call with 503; the circuit should open after
+            BREAKER_FAILURES calls, later calls should fail in microseconds, and
+            one probe after BREAKER_RESET should close it again once HeyGen recovers
+  overload  n8n takes 2 s per call and 100 callers arrive at once; only
+            MAX_CONCURRENCY are let through, the rest are refused after BULKHEAD_WAIT
+  deadline  each HeyGen call takes 0.4 s and initiate_session() has a 1 s
+            deadline; the third call must be cut short instead of running to its timeout
+
+Run from the repo root:
+
+    python -m benchmarks.resilience
+"""
+import asyncio
+import os
+import time
+
+import uvicorn
+
+PORT = 9150
+STUB_URL = f"http://127.0.0.1:{PORT}"
+
+os.environ.update(
+    HEYGEN_SERVER_URL=f"{STUB_URL}/heygen",
+    HEYGEN_API_KEY="bench",
+    HEYGEN_BREAKER_FAILURES="5",
+    HEYGEN_BREAKER_RESET="1",
+    HEYGEN_MAX_RETRIES="0",
+    N8N_MAX_CONCURRENCY="10",
+    N8N_BULKHEAD_WAIT="0.5",
+)
+
+import httpx  # noqa: E402
+
+import heygen_sessions  # noqa: E402
+import resilience  # noqa: E402
+import upstream  # noqa: E402
+from benchmarks import stubs  # noqa: E402
+from resilience import UpstreamUnavailable  # noqa: E402
+
+
+async def timed(coro) -> tuple:
+    started = time.perf_counter()
+    try:
+        await coro
+        outcome = "ok"
+    except UpstreamUnavailable as e:
+        outcome = e.reason
+    except httpx.HTTPStatusError as e:
+        outcome = f"http_{e.response.status_code}"
+    except Exception as e:
+        outcome = type(e).__name__
+    return outcome, time.perf_counter() - started
+
+
+def summarize(title: str, results: list):
+    print(f"\n{title}")
+    outcomes = {}
+    for outcome, elapsed in results:
+        outcomes.setdefault(outcome, []).append(elapsed)
+    for outcome, times in outcomes.items():
+        print(f"  {outcome:<22}{len(times):>5} calls, mean {sum(times) / len(times) * 1000:8.1f} ms, "
+              f"max {max(times) * 1000:8.1f} ms")
+
+
+async def outage(behaviour: dict):
+    behaviour["heygen"].error_rate = 1.0
+    results = []
+    for _ in range(20):
+        results.append(await timed(resilience.request(
+            upstream.HEYGEN, "streaming.create_token", "POST", f"{STUB_URL}/heygen/v1/streaming.create_token")))
+    summarize("outage: HeyGen returns 503 for every call", results)
+    behaviour["heygen"].error_rate = 0.0
+    await asyncio.sleep(1.1)
+    summarize("outage: HeyGen recovered, probe after the reset timeout",
+              [await timed(resilience.request(upstream.HEYGEN, "streaming.create_token", "POST",
+                                              f"{STUB_URL}/heygen/v1/streaming.create_token"))])
+
+
+async def overload(behaviour: dict):
+    behaviour["n8n"].latency = 2.0
+    calls = [timed(resilience.request(upstream.N8N, "start_interview", "POST", f"{STUB_URL}/n8n/start",
+                                      json={"booking_code": f"overload{i}"}))
+             for i in range(100)]
+    summarize("overload: 100 concurrent n8n starts against a 2 s upstream", await asyncio.gather(*calls))
+    behaviour["n8n"].latency = 0.05
+
+
+async def deadline(behaviour: dict):
+    behaviour["heygen"].latency = 0.4
+    heygen_sessions.INITIATE_DEADLINE = 1.0
+    heygen_sessions._token_cache["token"] = None
+    summarize("deadline: three 0.4 s HeyGen calls under a 1 s deadline",
+              [await timed(heygen_sessions.initiate_session())])
+    behaviour["heygen"].latency = 0.05
+
+
+async def main():
+    behaviour = {name: stubs.UpstreamBehaviour(latency=0.05) for name in ("n8n", "heygen", "gladia")}
+    app = stubs.create_app(STUB_URL, "http://127.0.0.1:1", 5,
+                           behaviour["n8n"], behaviour["heygen"], behaviour["gladia"])
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    upstream.open_clients()
+    try:
+        await outage(behaviour)
+        await overload(behaviour)
+        await deadline(behaviour)
+    finally:
+        await upstream.close_clients()
+        server.should_exit = True
+        await serving
+
+    print("\nfinal upstream state:")
+    for name, state in resilience.get_stats().items():
+        print(f"  {name}: {state}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+"""Per-message cost of the old and new serialization paths.
+
+  * request bodies: json.loads for `await request.json()` plus a separate
+    pydantic validation of the same bytes, versus one pydantic validate_json
+  * WebSocket messages: stdlib json (send_json/receive_json) versus codec (orjson)
+
+Run from the repo root:
+
+    python -m benchmarks.serialization [iterations]
+"""
+import json
+import sys
+import timeit
+
+import codec
+from routes import schemas
+
+BODY = json.dumps({"sessionId": "session_abc123",
+                   "question": "Can you tell me about a time you faced a challenge at work?"}).encode()
+OUTGOING = {"type": "new_question",
+            "payload": {"text": "Can you tell me about a time you faced a challenge at work?"}}
+INCOMING = json.dumps({"type": "user_answer",
+                       "payload": {"answer": "I once had to migrate a legacy billing system " * 4}})
+
+
+def double_parse():
+    schemas.SendQuestionRequest.model_validate_json(BODY)
+    return json.loads(BODY)
+
+
+def single_parse():
+    return schemas.SendQuestionRequest.model_validate_json(BODY)
+
+
+def report(label: str, before, after, iterations: int):
+    old = min(timeit.repeat(before, number=iterations, repeat=5)) / iterations
+    new = min(timeit.repeat(after, number=iterations, repeat=5)) / iterations
+    print(f"{label:<22}{old * 1e9:>10.0f}ns{new * 1e9:>10.0f}ns{old / new:>9.1f}x")
+
+
+def main(iterations: int):
+    print(f"{'':<22}{'before':>12}{'after':>12}{'speedup':>10}")
+    report("request body", double_parse, single_parse, iterations)
+    report("ws encode", lambda: json.dumps(OUTGOING, separators=(",", ":"), ensure_ascii=False),
+           lambda: codec.encode(OUTGOING), iterations)
+    report("ws decode", lambda: json.loads(INCOMING), lambda: codec.decode(INCOMING), iterations)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
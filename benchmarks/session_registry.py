@@ -0,0 +1,49 @@
+"""Measures SessionRegistry memory per session and sweep cost at scale.
+
+Fills the registry with synthetic sessions, keeps a fraction of them active,
+then sweeps with a clock past the TTL. Run from the repo root:
+
+    python -m benchmarks.session_registry [sessions]
+"""
+import sys
+import time
+import tracemalloc
+
+from session_registry import SessionRegistry
+
+
+def main(total: int):
+    registry = SessionRegistry(ttl=60.0, max_sessions=total)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    for i in range(total):
+        registry.set_data(f"session-{i:08d}", {"resumeUrl": f"https://n8n.example.com/webhook-waiting/{i}"})
+    fill = time.perf_counter() - started
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    print(f"fill      : {total:,} sessions in {fill:.3f}s, {used / total:.0f} bytes/session")
+
+    # A sweep with nothing due only peeks at the heap.
+    started = time.perf_counter()
+    registry.sweep()
+    print(f"idle sweep: {(time.perf_counter() - started) * 1e6:.1f}us, {len(registry):,} sessions")
+
+    # Keep every 10th session active, then sweep once their original deadline has passed.
+    for i in range(0, total, 10):
+        registry.get(f"session-{i:08d}").last_active += 30.0
+    started = time.perf_counter()
+    evicted = registry.sweep(now=time.monotonic() + 61.0)
+    print(f"due sweep : evicted {evicted:,} in {time.perf_counter() - started:.3f}s, {len(registry):,} remain")
+
+    # Hitting the cap evicts the oldest session instead of growing.
+    capped = SessionRegistry(ttl=60.0, max_sessions=1000)
+    for i in range(total):
+        capped.set_data(f"session-{i:08d}", {"resumeUrl": "https://n8n.example.com/webhook-waiting/x"})
+    print(f"cap       : {total:,} inserts -> {len(capped):,} sessions, "
+          f"{capped.stats()['evicted_capacity']:,} evicted for capacity")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 300_000)
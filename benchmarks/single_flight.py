@@ -0,0 +1,117 @@
+"""Bursts of interview starts for one booking code against the n8n stub.
+
+Serves benchmarks.stubs in-process (the n8n stub mints a new session ID per
+call) and fires concurrent starts through InterviewRouter.run_start_workflow:
+
+  burst     N concurrent starts for one booking code -> one n8n call, one session
+  reload    the same booking code again after the burst -> served from cache
+  failures  n8n failing -> one call per negative-cache window, not one per retry
+
+Exits 1 when a scenario makes a different number of n8n calls than expected
+(counted by the stub). Run from the repo root:
+
+    python -m benchmarks.single_flight [burst_size]
+"""
+import asyncio
+import os
+import sys
+import time
+
+import uvicorn
+
+PORT = 9151
+STUB_URL = f"http://127.0.0.1:{PORT}"
+NEGATIVE_TTL = 1.0
+
+os.environ.update(N8N_START_INTERVIEW_URL=f"{STUB_URL}/n8n/start", START_NEGATIVE_CACHE_TTL=str(NEGATIVE_TTL))
+
+from fastapi import HTTPException  # noqa: E402
+
+import upstream  # noqa: E402
+from benchmarks import stubs  # noqa: E402
+from routes import InterviewRouter  # noqa: E402
+
+
+async def burst(booking_code: str, size: int) -> tuple:
+    async def start():
+        try:
+            return (await InterviewRouter.run_start_workflow(booking_code))["sessionId"]
+        except HTTPException as e:
+            return f"error {e.status_code}"
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(start() for _ in range(size)))
+    return set(results), time.perf_counter() - started
+
+
+def report(title: str, calls: int, results: set, elapsed: float):
+    print(f"{title:<42} n8n calls {calls:>3}, distinct results {len(results):>3}, {elapsed * 1000:8.1f} ms")
+
+
+def check(failures: list, condition: bool, message: str):
+    if not condition:
+        failures.append(message)
+
+
+async def main(size: int) -> list:
+    """Runs the scenarios above and returns the expectations that did not hold."""
+    behaviour = {name: stubs.UpstreamBehaviour(latency=0.2) for name in ("n8n", "heygen", "gladia")}
+    app = stubs.create_app(STUB_URL, "http://127.0.0.1:1", 5,
+                           behaviour["n8n"], behaviour["heygen"], behaviour["gladia"])
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    upstream.open_clients()
+    n8n = behaviour["n8n"]
+    failures = []
+    try:
+        before = n8n.calls
+        sessions, elapsed = await burst("BK-burst", size)
+        report(f"burst: {size} concurrent starts", n8n.calls - before, sessions, elapsed)
+        check(failures, n8n.calls - before == 1, f"burst made {n8n.calls - before} n8n calls, expected 1")
+        check(failures, len(sessions) == 1 and not any(s.startswith("error") for s in sessions),
+              f"burst returned {sessions}, expected one session")
+
+        before = n8n.calls
+        results, elapsed = await burst("BK-burst", size)
+        report(f"reload: {size} starts after the burst", n8n.calls - before, results, elapsed)
+        check(failures, n8n.calls == before, f"reload made {n8n.calls - before} n8n calls, expected 0")
+        check(failures, results == sessions, f"reload returned {results}, expected the burst's {sessions}")
+
+        # Every burst within NEGATIVE_TTL of the first failure gets the cached error.
+        n8n.error_rate = 1.0
+        before = n8n.calls
+        results, elapsed = set(), 0.0
+        for _ in range(3):
+            batch, took = await burst("BK-failing", size)
+            results |= batch
+            elapsed += took
+            await asyncio.sleep(NEGATIVE_TTL / 5)
+        report(f"failures: 3 x {size} starts within the TTL", n8n.calls - before, results, elapsed)
+        check(failures, n8n.calls - before == 1, f"failing bursts made {n8n.calls - before} n8n calls, expected 1")
+        check(failures, len(results) == 1 and next(iter(results)).startswith("error"),
+              f"failing bursts returned {results}, expected one error")
+
+        # Once the negative entry expires, the next burst tries n8n again, once.
+        await asyncio.sleep(NEGATIVE_TTL)
+        before = n8n.calls
+        results, elapsed = await burst("BK-failing", size)
+        report(f"failures: {size} starts after the TTL", n8n.calls - before, results, elapsed)
+        check(failures, n8n.calls - before == 1, f"retry after the TTL made {n8n.calls - before} n8n calls, expected 1")
+    finally:
+        await upstream.close_clients()
+        server.should_exit = True
+        await serving
+    print(f"\n{InterviewRouter.START_FLIGHTS.stats()}")
+    return failures
+
+
+if __name__ == "__main__":
+    failed = asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
+    for failure in failed:
+        print(f"FAIL: {failure}")
+    if failed:
+        sys.exit(1)
+    print("single flight: one n8n call per burst, negative cache honoured")
@@ -0,0 +1,163 @@
+"""Local stand-ins for n8n, HeyGen and Gladia with configurable latency and errors.
+
+One Starlette app serves all three under /n8n, /heygen and /gladia. The n8n
+stub behaves like the interview workflow: after receiving an answer on its
+resume URL it pushes the next question back to the app via /api/send-question,
+and ends the interview after `--questions` answers. Run standalone with:
+
+    python -m benchmarks.stubs --port 9100 --app-url http://127.0.0.1:9000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+from dataclasses import dataclass
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+
+@dataclass
+class UpstreamBehaviour:
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    # Requests received (n8n: interview starts only).
+    calls: int = 0
+
+    async def delay(self):
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0.0))
+
+    def fails(self) -> bool:
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+def create_app(public_url: str, app_url: str, questions: int,
+               n8n: UpstreamBehaviour, heygen: UpstreamBehaviour, gladia: UpstreamBehaviour) -> Starlette:
+    ids = itertools.count()
+    answered = {}
+    client = httpx.AsyncClient(timeout=30.0)
+
+    def error():
+        return JSONResponse({"error": "injected failure"}, status_code=503)
+
+    # --- n8n ---
+    async def n8n_start(request: Request):
+        body = await request.json()
+        n8n.calls += 1
+        await n8n.delay()
+        if n8n.fails():
+            return error()
+        session_id = f"{body.get('booking_code', 'bench')}-{next(ids)}"
+        return JSONResponse({"sessionId": session_id, "resumeUrl": f"{public_url}/n8n/resume/{session_id}"})
+
+    async def push_next(session_id: str):
+        await n8n.delay()
+        count = answered[session_id] = answered.get(session_id, 0) + 1
+        if count >= questions:
+            answered.pop(session_id, None)
+            await client.post(f"{app_url}/api/interview/end", json={"sessionId": session_id})
+        else:
+            await client.post(f"{app_url}/api/send-question",
+                              json={"sessionId": session_id, "question": f"Question {count + 1}?"})
+
+    async def n8n_resume(request: Request):
+        session_id = request.path_params["session_id"]
+        await request.json()
+        if n8n.fails():
+            return error()
+        asyncio.create_task(push_next(session_id))
+        return JSONResponse({"ok": True})
+
+    # --- HeyGen ---
+    def heygen_route(name: str, payload):
+        async def handler(request: Request):
+            heygen.calls += 1
+            await heygen.delay()
+            if heygen.fails():
+                return error()
+            return JSONResponse(payload() if callable(payload) else payload)
+        return Route(f"/heygen/v1/streaming.{name}", handler, methods=["POST"])
+
+    def new_session():
+        return {"data": {"session_id": f"hg-{next(ids)}", "url": "wss://livekit.invalid", "access_token": "lk"}}
+
+    # --- Gladia ---
+    async def gladia_init(request: Request):
+        gladia.calls += 1
+        await gladia.delay()
+        if gladia.fails():
+            return error()
+        ws_url = public_url.replace("http://", "ws://") + f"/gladia/live/{next(ids)}"
+        return JSONResponse({"id": "gladia-bench", "url": ws_url})
+
+    async def gladia_live(websocket: WebSocket):
+        await websocket.accept()
+        received = 0
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes"):
+                    received += len(message["bytes"])
+                    # Roughly one final transcript per second of 16 kHz audio.
+                    if received >= 32000:
+                        received = 0
+                        await websocket.send_text(json.dumps({
+                            "type": "transcript",
+                            "data": {"is_final": True, "utterance": {"text": "benchmark answer"}},
+                        }))
+                elif message.get("text") and json.loads(message["text"]).get("type") == "stop_recording":
+                    await websocket.close()
+                    return
+        except WebSocketDisconnect:
+            pass
+
+    return Starlette(routes=[
+        Route("/n8n/start", n8n_start, methods=["POST"]),
+        Route("/n8n/resume/{session_id}", n8n_resume, methods=["POST"]),
+        heygen_route("create_token", {"data": {"token": "bench-token"}}),
+        heygen_route("new", new_session),
+        heygen_route("start", {"code": 100}),
+        heygen_route("stop", {"code": 100}),
+        heygen_route("task", {"code": 100, "data": {"task_id": "t"}}),
+        heygen_route("interrupt", {"code": 100}),
+        Route("/gladia/v2/live", gladia_init, methods=["POST"]),
+        WebSocketRoute("/gladia/live/{stream_id}", gladia_live),
+    ], on_shutdown=[client.aclose])
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    for name in ("n8n", "heygen", "gladia"):
+        parser.add_argument(f"--{name}-latency", type=float, default=0.05)
+        parser.add_argument(f"--{name}-jitter", type=float, default=0.0)
+        parser.add_argument(f"--{name}-error-rate", type=float, default=0.0)
+    parser.add_argument("--questions", type=int, default=5)
+
+
+def behaviour(args, name: str) -> UpstreamBehaviour:
+    return UpstreamBehaviour(getattr(args, f"{name}_latency"), getattr(args, f"{name}_jitter"),
+                             getattr(args, f"{name}_error_rate"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--app-url", default="http://127.0.0.1:9000")
+    add_arguments(parser)
+    args = parser.parse_args()
+    app = create_app(f"http://127.0.0.1:{args.port}", args.app_url, args.questions,
+                     behaviour(args, "n8n"), behaviour(args, "heygen"), behaviour(args, "gladia"))
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Overhead of span tracing, enabled versus disabled.
+
+Measures the cost of one `tracing.span()` with and without an active trace,
+and the mean latency of a cheap endpoint (/api/upstreams) served in-process
+with and without TracingMiddleware. Run from the repo root:
+
+    python -m benchmarks.tracing [--requests 2000]
+"""
+import argparse
+import asyncio
+import time
+import timeit
+
+import httpx
+
+import main
+import tracing
+
+
+def span_cost(number: int) -> float:
+    def instrumented():
+        with tracing.span("bench.span"):
+            pass
+    return min(timeit.repeat(instrumented, number=number, repeat=5)) / number
+
+
+async def request_latency(app, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        for _ in range(50):
+            await client.get("/api/upstreams")
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get("/api/upstreams")
+        return (time.perf_counter() - started) / requests
+
+
+def cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--spans", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"span() without a trace: {span_cost(args.spans) * 1e9:7.1f} ns")
+    token = tracing._current.set(tracing.Trace("bench"))
+    try:
+        print(f"span() inside a trace:  {span_cost(args.spans) * 1e9:7.1f} ns")
+    finally:
+        tracing._current.reset(token)
+
+    plain = asyncio.run(request_latency(main.app, args.requests))
+    traced = asyncio.run(request_latency(tracing.TracingMiddleware(main.app), args.requests))
+    print(f"GET /api/upstreams untraced: {plain * 1e6:7.1f} us/request")
+    print(f"GET /api/upstreams traced:   {traced * 1e6:7.1f} us/request ({(traced - plain) * 1e6:+.1f} us)")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,86 @@
+"""Compares a fresh httpx client per call against the shared upstream pool.
+
+Runs a tiny local HTTP server that counts accepted TCP connections, then fires
+the same number of POSTs both ways. Run from the repo root:
+
+    python -m benchmarks.upstream_pool [requests] [concurrency]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+
+import upstream
+
+
+class StubServer:
+    """Minimal keep-alive HTTP/1.1 server that answers every request with `{}`."""
+
+    def __init__(self):
+        self.connections = 0
+        self.requests = 0
+        self.server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}/"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def _run(url: str, total: int, concurrency: int, pooled: bool) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            if pooled:
+                await upstream.get_client(upstream.N8N).post(url, json={"answer": "ok"})
+            else:
+                async with httpx.AsyncClient() as client:
+                    await client.post(url, json={"answer": "ok"})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - started
+
+
+async def main(total: int, concurrency: int):
+    for pooled in (False, True):
+        stub = StubServer()
+        url = await stub.start()
+        upstream.open_clients()
+        elapsed = await _run(url, total, concurrency, pooled)
+        await upstream.close_clients()
+        await stub.stop()
+        label = "shared pool " if pooled else "client/call "
+        print(f"{label}: {total} requests in {elapsed:.3f}s "
+              f"({total / elapsed:,.0f} req/s), {stub.connections} TCP connections opened")
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main(total, concurrency))
@@ -0,0 +1,19 @@
+from typing import Union
+
+import orjson
+
+# WebSocket and pub/sub messages are encoded with orjson instead of the stdlib
+# json module that WebSocket.send_json/receive_json use.
+
+
+def encode(message: dict) -> str:
+    """Encodes a message as the JSON text frame the browser expects."""
+    return orjson.dumps(message).decode()
+
+
+def decode(raw: Union[str, bytes]) -> dict:
+    """Decodes a JSON message; raises ValueError unless it is a JSON object."""
+    message = orjson.loads(raw)
+    if not isinstance(message, dict):
+        raise ValueError("Expected a JSON object")
+    return message
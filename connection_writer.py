@@ -0,0 +1,149 @@
+import asyncio
+from collections import deque
+from typing import Deque
+
+from fastapi import WebSocket
+
+from codec import encode
+from metrics import WS_MESSAGES_SENT, WS_MESSAGE_FAILURES
+from settings import settings
+
+QUEUE_SIZE = settings.ws_writer_queue_size
+# What to do when a client's queue is full: "drop_oldest" discards the oldest
+# queued message, "coalesce" replaces a queued message of the same type with
+# the newer one, "disconnect" closes the slow client's socket. Only unnumbered
+# (ephemeral) messages are ever discarded: a numbered one sits in the replay
+# buffer until acked, and the client would ack past a gap. When nothing can be
+# discarded the socket is closed instead, and the client resumes from its last ack.
+SLOW_CONSUMER_POLICY = settings.ws_slow_consumer_policy
+# Longest a single socket send may take before the client counts as stalled.
+SEND_TIMEOUT = settings.ws_send_timeout
+CLOSE_TIMEOUT = 1.0
+
+# Close code sent to clients that cannot keep up ("try again later").
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+_CLOSE = object()
+
+
+def _discardable(message) -> bool:
+    """Only unnumbered messages may be dropped; numbered ones must reach the client or be replayed."""
+    return isinstance(message, dict) and "seq" not in message
+
+
+class ConnectionWriter:
+    """Owns all sends to one WebSocket.
+
+    Callers enqueue without awaiting the network; a dedicated task sends in
+    order with a per-message deadline, so one congested client can never stall
+    the HTTP handler (e.g. an n8n callback) that produced its message.
+    """
+
+    def __init__(self, session_id: str, websocket: WebSocket, maxsize: int = QUEUE_SIZE,
+                 policy: str = SLOW_CONSUMER_POLICY, send_timeout: float = SEND_TIMEOUT):
+        self.session_id = session_id
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self._queue: Deque = deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+        self._task = asyncio.create_task(self._run())
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, message: dict) -> bool:
+        """Queues a message for sending; returns False if the connection refused it."""
+        if self._closed:
+            return False
+        if len(self._queue) >= self.maxsize and not self._make_room(message):
+            return False
+        self._queue.append(message)
+        self._ready.set()
+        return True
+
+    def _make_room(self, message: dict) -> bool:
+        if self.policy != "disconnect":
+            if self.policy == "coalesce" and _discardable(message):
+                for index in range(len(self._queue) - 1, -1, -1):
+                    queued = self._queue[index]
+                    if _discardable(queued) and queued.get("type") == message.get("type"):
+                        del self._queue[index]
+                        self.coalesced += 1
+                        return True
+            for index, queued in enumerate(self._queue):
+                if _discardable(queued):
+                    del self._queue[index]
+                    self.dropped += 1
+                    WS_MESSAGE_FAILURES.inc("slow_consumer")
+                    return True
+            if _discardable(message):
+                self.dropped += 1
+                WS_MESSAGE_FAILURES.inc("slow_consumer")
+                return False
+        # Only numbered messages are queued: close the socket so the client
+        # reconnects and gets them replayed instead of losing one.
+        WS_MESSAGE_FAILURES.inc("slow_consumer")
+        print(f"WARNING: Session '{self.session_id}' is not keeping up; disconnecting it")
+        self.stop()
+        asyncio.get_running_loop().create_task(self.abort())
+        return False
+
+    async def _run(self):
+        while True:
+            while not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+            message = self._queue.popleft()
+            if message is _CLOSE:
+                return
+            try:
+                await asyncio.wait_for(self.websocket.send_text(encode(message)), self.send_timeout)
+            except asyncio.TimeoutError:
+                WS_MESSAGE_FAILURES.inc("send_timeout")
+                print(f"ERROR: Send to session '{self.session_id}' exceeded {self.send_timeout}s; disconnecting it")
+                # abort() cancels self._task; this is that task, so detach it first.
+                self._task = None
+                await self.abort()
+                return
+            except Exception as e:
+                WS_MESSAGE_FAILURES.inc("send_error")
+                print(f"ERROR: Failed to send message to session '{self.session_id}': {e}")
+                self._closed = True
+                return
+            self.sent += 1
+            WS_MESSAGES_SENT.inc("local")
+
+    async def close(self, timeout: float = SEND_TIMEOUT):
+        """Sends what is still queued, then stops the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.append(_CLOSE)
+        self._ready.set()
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+
+    def stop(self):
+        """Stops the writer immediately, e.g. after the client disconnected."""
+        self._closed = True
+        self._queue.clear()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def abort(self, code: int = SLOW_CONSUMER_CLOSE_CODE):
+        """Drops queued messages and closes the socket."""
+        self.stop()
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code), CLOSE_TIMEOUT)
+        except Exception as e:
+            print(f"Error closing WebSocket for session {self.session_id}: {e}")
@@ -1,48 +1,187 @@
+import asyncio
 from fastapi import WebSocket
-from typing import Dict
-import httpx
+from typing import Optional
 
-SESSIONS: Dict[str, Dict] = {}
-active_connections: Dict[str, WebSocket] = {}
+from upstream import N8N
+import resilience
+from session_backends import create_backends
+from session_registry import SessionRegistry
+from metrics import Gauge, WS_MESSAGES_SENT, WS_MESSAGE_FAILURES
+from connection_writer import ConnectionWriter, SEND_TIMEOUT
+from settings import settings
 
+# Messages are numbered per session and kept until the client acks them, so
+# a client that reconnects with ?last_seq=N gets everything after N replayed.
+# High-rate, short-lived events are neither numbered nor replayed.
+EPHEMERAL_TYPES = {"transcript", "speech_start", "speech_end", "server_draining"}
+# How long shutdown waits for queued messages to reach clients.
+DRAIN_TIMEOUT = settings.ws_drain_timeout
+# "Service restart": tells clients to reconnect, see static/interview.js.
+SERVICE_RESTART_CLOSE_CODE = 1012
 
-async def connect(websocket: WebSocket, session_id: str):
+# Sockets and (with the memory backend) session data live on per-process
+# registry records that expire when idle. Session data goes through a
+# pluggable store so a redeployed instance sees it, and messages for sockets
+# held by the other instance are routed over the message bus.
+REGISTRY = SessionRegistry()
+STORE, BUS = create_backends(REGISTRY)
+
+Gauge("ws_connections", "Interview WebSockets held by this worker.", function=REGISTRY.connected_count)
+Gauge("interview_sessions", "Sessions held in this worker's registry.", function=lambda: len(REGISTRY))
+
+
+async def start_routing():
+    await BUS.start(deliver_local)
+    REGISTRY.start_sweeper()
+
+
+async def stop_routing():
+    await REGISTRY.stop_sweeper()
+    await BUS.stop()
+    await STORE.close()
+
+
+async def connect(websocket: WebSocket, session_id: str, last_seq: Optional[int] = None):
     await websocket.accept()
-    active_connections[session_id] = websocket
-    print(f"WebSocket connected for session: {session_id}")
+    previous = REGISTRY.writer(session_id)
+    if previous is not None:
+        previous.stop()
+    writer = ConnectionWriter(session_id, websocket)
+    REGISTRY.attach(session_id, websocket, writer)
+    # Replayed before anything else can be queued on the new writer.
+    missed = REGISTRY.replay_after(session_id, last_seq)
+    if missed is None:
+        print(f"WARNING: Session '{session_id}' resumed after seq {last_seq} but the replay buffer overflowed")
+        writer.enqueue({'type': 'replay_gap', 'payload': {'last_seq': last_seq}})
+        # Still send what survived; the newest messages matter most.
+        missed = REGISTRY.replay_after(session_id, None)
+    for message in missed:
+        writer.enqueue(message)
+    await BUS.subscribe(session_id)
+    print(f"WebSocket connected for session: {session_id}"
+          + (f" (resumed after seq {last_seq}, {len(missed)} replayed)" if last_seq is not None else ""))
 
 
-def disconnect(session_id: str):
-    if session_id in active_connections:
-        del active_connections[session_id]
+async def disconnect(session_id: str, websocket: Optional[WebSocket] = None):
+    writer = REGISTRY.writer(session_id)
+    if writer is not None and (websocket is None or writer.websocket is websocket):
+        writer.stop()
+    if REGISTRY.detach(session_id, websocket):
+        await BUS.unsubscribe(session_id)
     print(f"WebSocket disconnected for session: {session_id}")
 
 
-async def send_personal_message(message: dict, session_id: str):
-    # Check if a websocket connection exists for the given session_id
-    if session_id in active_connections:
-        websocket = active_connections[session_id]
-        await websocket.send_json(message)
-        # If successful, print a success message
-        print(f"SUCCESS: Sent message to session '{session_id}': {message}")
-    else:
-        # If no connection is found, print a detailed error message
-        # print("--------------------------------------------------")
-        print(f"ERROR: Could not find an active WebSocket connection for session_id: '{session_id}'")
-        # print(f"Currently active connections are for these session_ids: {list(active_connections.keys())}")
-        # print("--------------------------------------------------")
+async def deliver_local(session_id: str, message: dict) -> Optional[str]:
+    """Delivers to a socket held by this worker: 'delivered', 'buffered', or None if not held here.
+
+    A message is numbered exactly once, here, and the numbered envelope goes
+    both to the replay buffer and to the writer. If the writer refuses it
+    (socket closing), the envelope is already buffered for the resume.
+    """
+    # Only enqueues: the connection's writer task does the actual send.
+    writer = REGISTRY.writer(session_id)
+    if writer is None:
+        return None
+    REGISTRY.touch(session_id)
+    if message.get("type") in EPHEMERAL_TYPES:
+        return "delivered" if writer.enqueue(message) else None
+    envelope = REGISTRY.sequence(session_id, message)
+    return "delivered" if writer.enqueue(envelope) else "buffered"
+
+
+async def is_known_session(session_id: str) -> bool:
+    """Whether this worker tracks the session or the shared store has a record of it."""
+    return REGISTRY.get(session_id) is not None or bool(await STORE.get(session_id))
+
+
+async def buffer_for_resume(session_id: str, message: dict) -> bool:
+    """Keeps a message for a known session whose socket is gone, to replay on reconnect."""
+    if message.get("type") in EPHEMERAL_TYPES:
+        return False
+    if not await is_known_session(session_id):
+        return False
+    REGISTRY.sequence(session_id, message)
+    return True
+
 
+async def route_message(message: dict, session_id: str) -> str:
+    """Delivers a message and returns 'delivered', 'buffered' or 'no_connection'."""
+    # Deliver directly when this worker holds the socket, otherwise route it
+    # to whichever worker does (which numbers it in its own registry).
+    status = await deliver_local(session_id, message)
+    if status == "buffered":
+        WS_MESSAGE_FAILURES.inc("buffered")
+        print(f"Session '{session_id}' refused a message while closing; kept for replay on reconnect")
+    if status is not None:
+        return status
+    if await BUS.publish(session_id, message):
+        WS_MESSAGES_SENT.inc("routed")
+        print(f"SUCCESS: Routed message to session '{session_id}' via {type(BUS).__name__}")
+        return "delivered"
+    if await buffer_for_resume(session_id, message):
+        WS_MESSAGE_FAILURES.inc("buffered")
+        print(f"Session '{session_id}' is disconnected; message kept for replay on reconnect")
+        return "buffered"
+    # If no connection is found, print a detailed error message
+    WS_MESSAGE_FAILURES.inc("no_connection")
+    print(f"ERROR: Could not find an active WebSocket connection for session_id: '{session_id}'")
+    return "no_connection"
 
-async def forward_answer_to_n8n(session_id: str, answer: str):
-    session_data = SESSIONS.get(session_id)
+
+async def send_personal_message(message: dict, session_id: str) -> bool:
+    return await route_message(message, session_id) == "delivered"
+
+
+async def send_with_status(message: dict, session_id: str, timeout: float = SEND_TIMEOUT) -> str:
+    """Sends a message and reports the outcome as one of
+    'delivered', 'buffered', 'no_connection', 'timeout' or 'error'.
+
+    'delivered' means a connection accepted the message into its send queue;
+    'buffered' means it will be replayed when the client reconnects.
+    """
+    try:
+        return await asyncio.wait_for(route_message(message, session_id), timeout)
+    except asyncio.TimeoutError:
+        WS_MESSAGE_FAILURES.inc("timeout")
+        print(f"ERROR: Timed out sending message to session '{session_id}'")
+        return "timeout"
+    except Exception as e:
+        print(f"ERROR: Failed to send message to session '{session_id}': {e}")
+        return "error"
+
+
+async def drain_connections(timeout: float = DRAIN_TIMEOUT):
+    """Flushes every socket's queued messages, then asks the clients to reconnect.
+
+    Runs before the server closes the sockets on shutdown so nothing already
+    queued is lost; clients resume from their last acknowledged message on
+    whichever instance they reach next.
+    """
+    records = REGISTRY.connected()
+    if not records:
+        return
+    print(f"Draining {len(records)} WebSocket connection(s)...")
+    writers = [record.writer for record in records]
+    for writer in writers:
+        writer.enqueue({'type': 'server_draining'})
+    await asyncio.gather(*(writer.close(timeout) for writer in writers), return_exceptions=True)
+    await asyncio.gather(*(writer.abort(code=SERVICE_RESTART_CLOSE_CODE) for writer in writers),
+                         return_exceptions=True)
+    print("WebSocket connections drained.")
+
+
+async def forward_answer_to_n8n(session_id: str, answer: str) -> bool:
+    """Posts one answer to the session's n8n resume URL.
+
+    HTTP errors are raised so the caller (see answer_forwarder) can retry them.
+    """
+    session_data = await STORE.get(session_id)
     if not session_data or not session_data.get('resumeUrl'):
         print(f"Error: Could not find resumeUrl for session {session_id}")
-        return
+        return False
 
     resume_url = session_data['resumeUrl']
     # print(f"Forwarding answer for session {session_id} to {resume_url}")
-    async with httpx.AsyncClient() as client:
-        try:
-            await client.post(resume_url, json={'sessionId': session_id, 'answer': answer})
-        except httpx.RequestError as e:
-            print(f"Error forwarding answer to n8n: {e}")
+    await resilience.request(N8N, "forward_answer", "POST", resume_url,
+                             json={'sessionId': session_id, 'answer': answer})
+    return True
@@ -0,0 +1,307 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Optional, Set
+
+import httpx
+from fastapi import HTTPException
+
+from upstream import HEYGEN
+import resilience
+import tracing
+from settings import settings
+from single_flight import SingleFlight
+
+HEYGEN_API_KEY = settings.heygen_api_key
+HEYGEN_SERVER_URL = settings.heygen_server_url
+AVATAR_NAME = settings.avatar_name
+
+# Must match `activity_idle_timeout` sent to streaming.new below.
+ACTIVITY_IDLE_TIMEOUT = 120
+
+# Streaming tokens are reused until shortly before this age.
+TOKEN_TTL = settings.heygen_token_ttl
+TOKEN_REFRESH_MARGIN = 60.0
+
+POOL_SIZE = settings.heygen_pool_size
+# Pooled sessions are retired this many seconds before HeyGen would idle them out.
+POOL_RETIRE_MARGIN = settings.heygen_pool_retire_margin
+POOL_RETRY_DELAY = 5.0
+# Overall budget for token + streaming.new + streaming.start in initiate_session().
+INITIATE_DEADLINE = settings.heygen_initiate_deadline
+
+_token_cache = {"token": None, "expires_at": 0.0}
+# Concurrent refreshes (pool refills, initiate_session calls) share one create_token call.
+_token_flight = SingleFlight(ttl=0, negative_ttl=0, max_entries=1)
+
+
+def new_session_body() -> dict:
+    return {
+        "quality": "high",
+        "avatar_name": AVATAR_NAME,
+        "voice": {
+            "rate": 1
+        },
+        "video_encoding": "VP8",
+        "disable_idle_timeout": False,
+        "version": "v2",
+        "stt_settings": {
+            "provider": "deepgram",
+            "confidence": 0.55
+        },
+        "activity_idle_timeout": ACTIVITY_IDLE_TIMEOUT
+    }
+
+
+def _auth_headers(token: str) -> dict:
+    return {
+        'Authorization': f'Bearer {token}',
+        'Content-Type': 'application/json'
+    }
+
+
+async def get_streaming_token() -> str:
+    """Returns a cached streaming token, creating a new one when it is about to expire."""
+    if _token_cache["token"] and _token_cache["expires_at"] - TOKEN_REFRESH_MARGIN > time.monotonic():
+        return _token_cache["token"]
+    return await _token_flight.run("token", _create_streaming_token)
+
+
+async def _create_streaming_token() -> str:
+    now = time.monotonic()
+    try:
+        token_url = f"{HEYGEN_SERVER_URL}/v1/streaming.create_token"
+        token_response = await resilience.request(HEYGEN, "streaming.create_token", "POST", token_url,
+                                                  headers={'X-Api-Key': HEYGEN_API_KEY}, idempotent=True)
+        streaming_token = token_response.json()["data"]["token"]
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code,
+                            detail=f"Failed to create HeyGen token: {e.response.text}")
+    except (KeyError, TypeError):
+        raise HTTPException(status_code=500, detail="Could not parse token from HeyGen response.")
+
+    _token_cache["token"] = streaming_token
+    _token_cache["expires_at"] = now + TOKEN_TTL
+    return streaming_token
+
+
+async def create_session(streaming_token: str) -> dict:
+    new_session_url = f"{HEYGEN_SERVER_URL}/v1/streaming.new"
+    try:
+        # Not retried: a retry after a lost response would leave an orphan session.
+        new_session_response = await resilience.request(HEYGEN, "streaming.new", "POST", new_session_url,
+                                                        headers=_auth_headers(streaming_token),
+                                                        json=new_session_body(), timeout=30.0)
+        session_data = new_session_response.json()["data"]
+        session_id = session_data.get("session_id")
+        livekit_url = session_data.get("url")
+        livekit_token = session_data.get("access_token")
+
+        if not all([session_id, livekit_url, livekit_token]):
+            raise HTTPException(status_code=502,
+                                detail="HeyGen new session response is missing required data (session_id, url, or access_token).")
+
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code,
+                            detail=f"Failed to create new HeyGen session: {e.response.text}")
+    except (KeyError, TypeError):
+        raise HTTPException(status_code=500, detail="Could not parse new session data from HeyGen response.")
+
+    return {"session_id": session_id, "url": livekit_url, "access_token": livekit_token}
+
+
+async def start_session(streaming_token: str, session_id: str):
+    start_session_url = f"{HEYGEN_SERVER_URL}/v1/streaming.start"
+    try:
+        await resilience.request(HEYGEN, "streaming.start", "POST", start_session_url,
+                                 headers=_auth_headers(streaming_token), json={"session_id": session_id},
+                                 idempotent=True)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code,
+                            detail=f"Failed to start HeyGen session: {e.response.text}")
+
+
+async def stop_session(streaming_token: str, session_id: str):
+    stop_session_url = f"{HEYGEN_SERVER_URL}/v1/streaming.stop"
+    response = await resilience.request(HEYGEN, "streaming.stop", "POST", stop_session_url,
+                                        headers=_auth_headers(streaming_token), json={"session_id": session_id},
+                                        idempotent=True)
+    return response.json()
+
+
+async def send_task(streaming_token: str, session_id: str, text: str, task_type: str = "repeat") -> dict:
+    """Queues text for the avatar to speak; returns once HeyGen accepted it, not when speech ends."""
+    task_url = f"{HEYGEN_SERVER_URL}/v1/streaming.task"
+    response = await resilience.request(HEYGEN, "streaming.task", "POST", task_url,
+                                        headers=_auth_headers(streaming_token),
+                                        json={"session_id": session_id, "text": text, "task_type": task_type,
+                                              "task_mode": "async"})
+    return response.json()
+
+
+async def interrupt_session(streaming_token: str, session_id: str) -> dict:
+    """Stops whatever the avatar is currently saying."""
+    interrupt_url = f"{HEYGEN_SERVER_URL}/v1/streaming.interrupt"
+    response = await resilience.request(HEYGEN, "streaming.interrupt", "POST", interrupt_url,
+                                        headers=_auth_headers(streaming_token), json={"session_id": session_id},
+                                        idempotent=True)
+    return response.json()
+
+
+def session_response(streaming_token: str, session: dict) -> dict:
+    return {
+        "message": "HeyGen session successfully initiated.",
+        "session_id": session["session_id"],
+        "token": streaming_token,
+        "livekit_connection": {
+            "server_url": session["url"],
+            "token": session["access_token"]
+        }
+    }
+
+
+async def initiate_session() -> dict:
+    """Runs token creation, session creation and session start against HeyGen."""
+    with resilience.deadline(INITIATE_DEADLINE):
+        streaming_token = await get_streaming_token()
+        session = await create_session(streaming_token)
+        await start_session(streaming_token, session["session_id"])
+    return session_response(streaming_token, session)
+
+
+class SessionPool:
+    """Keeps `size` HeyGen sessions created and started ahead of time.
+
+    A background task refills the pool after every hand-out and stops pooled
+    sessions before HeyGen's activity idle timeout would close them.
+    """
+
+    def __init__(self, size: int, max_age: float):
+        self.size = size
+        self.max_age = max_age
+        self._ready: Deque[tuple] = deque()  # (expires_at, response)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # Sessions found expired by acquire(), being stopped in the background.
+        self._retiring: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_failures = 0
+        self.retired = 0
+        self.last_refill_seconds = 0.0
+        self.total_refill_seconds = 0.0
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._ready:
+            _, response = self._ready.popleft()
+            await self._retire(response)
+        if self._retiring:
+            await asyncio.gather(*self._retiring, return_exceptions=True)
+
+    def acquire(self) -> Optional[dict]:
+        """Hands out a ready session, or None when the pool is empty."""
+        now = time.monotonic()
+        while self._ready:
+            expires_at, response = self._ready.popleft()
+            if expires_at > now:
+                self.hits += 1
+                self._wakeup.set()
+                return response
+            task = asyncio.create_task(self._retire(response))
+            self._retiring.add(task)
+            task.add_done_callback(self._retiring.discard)
+        self.misses += 1
+        self._wakeup.set()
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "ready": len(self._ready),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refills": self.refills,
+            "refill_failures": self.refill_failures,
+            "retired": self.retired,
+            "last_refill_seconds": round(self.last_refill_seconds, 3),
+            "avg_refill_seconds": round(self.total_refill_seconds / self.refills, 3) if self.refills else 0.0,
+        }
+
+    async def _retire(self, response: dict):
+        self.retired += 1
+        try:
+            await stop_session(response["token"], response["session_id"])
+        except Exception as e:
+            # Also a malformed response body; the session idles out on HeyGen's side.
+            print(f"Error stopping pooled HeyGen session {response['session_id']}: {e!r}")
+
+    async def _refill_one(self):
+        started = time.monotonic()
+        with tracing.background("heygen_pool.refill"):
+            response = await initiate_session()
+        # Never hand out a session whose token expires before the session would.
+        expires_at = min(started + self.max_age, _token_cache["expires_at"] - TOKEN_REFRESH_MARGIN)
+        self._ready.append((expires_at, response))
+        elapsed = time.monotonic() - started
+        self.refills += 1
+        self.last_refill_seconds = elapsed
+        self.total_refill_seconds += elapsed
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            while self._ready and self._ready[0][0] <= now:
+                _, response = self._ready.popleft()
+                await self._retire(response)
+
+            delay = None
+            while len(self._ready) < self.size:
+                try:
+                    await self._refill_one()
+                except Exception as e:
+                    # Any failure, e.g. a non-JSON body, backs off instead of ending the refill task.
+                    self.refill_failures += 1
+                    print(f"Error refilling HeyGen session pool: {e!r}")
+                    delay = POOL_RETRY_DELAY
+                    break
+
+            if delay is None:
+                delay = self._ready[0][0] - time.monotonic() if self._ready else POOL_RETRY_DELAY
+            # Not wait_for: on Python 3.11 it swallows a stop() that lands
+            # just as acquire() sets the event, and stop() then hangs.
+            wakeup = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait((wakeup,), timeout=max(delay, 0.0))
+            finally:
+                wakeup.cancel()
+
+
+POOL: Optional[SessionPool] = None
+
+
+def start_pool():
+    global POOL
+    if POOL_SIZE <= 0:
+        return
+    POOL = SessionPool(POOL_SIZE, ACTIVITY_IDLE_TIMEOUT - POOL_RETIRE_MARGIN)
+    POOL.start()
+    print(f"HeyGen session pool started with size {POOL_SIZE}")
+
+
+async def stop_pool():
+    global POOL
+    if POOL is not None:
+        await POOL.stop()
+        POOL = None
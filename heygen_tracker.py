@@ -0,0 +1,239 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from fastapi import HTTPException
+
+import avatar_speech
+import helper
+import heygen_sessions
+from metrics import Counter, Gauge
+from resilience import UpstreamUnavailable
+from settings import settings
+
+# HeyGen sessions count against a small concurrent-session quota until they
+# are stopped, and a closed tab never calls /api/heygen/stop_session. Every
+# session this server hands out is tracked, bound to its interview socket
+# (the client sends {"type": "heygen_session", ...} on connect) and stopped
+# once the socket has been gone for REAP_GRACE seconds or the interview ends.
+# The grace period lets a client that is only reconnecting keep its avatar.
+REAP_GRACE = settings.heygen_reap_grace
+# Sessions never bound to a socket (tab closed while the interview was
+# starting) are stopped after this long; 0 leaves them to HeyGen's idle timeout.
+UNBOUND_TTL = settings.heygen_unbound_ttl
+REAP_CONCURRENCY = settings.heygen_reap_concurrency
+REAP_INTERVAL = 1.0
+# Store key marking a session bound on some worker, so the worker that created
+# it does not reap it as unbound (SESSION_BACKEND=redis).
+BOUND_KEY_PREFIX = "heygen-bound:"
+
+HEYGEN_REAPED = Counter(
+    "heygen_sessions_reaped_total",
+    "HeyGen sessions stopped by the server, by reason.",
+    ("reason",),
+)
+
+
+class TrackedSession:
+    __slots__ = ("session_id", "token", "interview_id", "created_at", "reap_at", "reason", "attempts")
+
+    def __init__(self, session_id: str, token: str, now: float):
+        self.session_id = session_id
+        self.token = token
+        self.interview_id: Optional[str] = None
+        self.created_at = now
+        self.reap_at: Optional[float] = None
+        self.reason = ""
+        self.attempts = 0
+
+
+class SessionTracker:
+    """Stops HeyGen sessions whose interview is gone, a batch at a time.
+
+    A background task wakes every REAP_INTERVAL (or when an interview ends)
+    and stops every session that is due, at most `concurrency` at once. The
+    number of live sessions is bounded by the HeyGen quota, so finding the
+    due ones is a plain scan.
+    """
+
+    def __init__(self, grace: float = REAP_GRACE, unbound_ttl: float = UNBOUND_TTL,
+                 concurrency: int = REAP_CONCURRENCY):
+        self.grace = grace
+        self.unbound_ttl = unbound_ttl
+        self.concurrency = concurrency
+        self._sessions: Dict[str, TrackedSession] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.reaped: Dict[str, int] = {}
+        self.reap_failures = 0
+        self.stopped_by_client = 0
+        self.adopted_elsewhere = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Sessions still tracked are left running: their interviews may resume
+        # on another instance after a redeploy.
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def track(self, session_id: str, token: str):
+        """Records a session handed out to a client, not yet bound to an interview."""
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = TrackedSession(session_id, token, now)
+        session.token = token
+        if session.interview_id is None and self.unbound_ttl > 0:
+            session.reap_at, session.reason = now + self.unbound_ttl, "unbound"
+
+    async def bind(self, session_id: str, token: Optional[str], interview_id: str):
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not token:
+                return
+            # Created by another worker; this one holds the socket now.
+            session = self._sessions[session_id] = TrackedSession(session_id, token, time.monotonic())
+            await helper.STORE.set(BOUND_KEY_PREFIX + session_id, {"interview": interview_id})
+        elif token:
+            session.token = token
+        session.interview_id = interview_id
+        session.reap_at, session.reason = None, ""
+
+    def token_for(self, session_id: str) -> Optional[str]:
+        """The token of a session bound to an interview whose socket is connected, else None."""
+        session = self._sessions.get(session_id)
+        if session is None or session.interview_id is None or session.reap_at is not None:
+            return None
+        return session.token
+
+    def release(self, session_id: str):
+        """The client stopped the session itself."""
+        if self._sessions.pop(session_id, None) is not None:
+            self.stopped_by_client += 1
+
+    def _bound_to(self, interview_id: str) -> List[TrackedSession]:
+        return [session for session in self._sessions.values() if session.interview_id == interview_id]
+
+    def interview_connected(self, interview_id: str):
+        for session in self._bound_to(interview_id):
+            if session.reason == "socket_closed":
+                session.reap_at, session.reason = None, ""
+
+    def interview_disconnected(self, interview_id: str):
+        due = time.monotonic() + self.grace
+        for session in self._bound_to(interview_id):
+            if session.reap_at is None:
+                session.reap_at, session.reason = due, "socket_closed"
+
+    def interview_ended(self, interview_id: str):
+        now = time.monotonic()
+        for session in self._bound_to(interview_id):
+            session.reap_at, session.reason = now, "interview_ended"
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), REAP_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.reap_due()
+            except Exception as e:
+                # Keep reaping: an orphaned HeyGen session costs until it is stopped.
+                print(f"Error reaping HeyGen sessions: {e!r}")
+
+    async def reap_due(self):
+        now = time.monotonic()
+        due = [session for session in self._sessions.values()
+               if session.reap_at is not None and session.reap_at <= now]
+        if not due:
+            return
+        for session in due:
+            del self._sessions[session.session_id]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def reap(session: TrackedSession):
+            async with semaphore:
+                await self._reap(session)
+
+        results = await asyncio.gather(*(reap(session) for session in due), return_exceptions=True)
+        for session, result in zip(due, results):
+            if isinstance(result, Exception):
+                # e.g. the session store (Redis) failing; stop the session on a later pass.
+                retrying = self._retry_later(session, REAP_INTERVAL)
+                print(f"Error reaping HeyGen session {session.session_id}"
+                      f"{'; will retry' if retrying else ''}: {result!r}")
+        print(f"Reaped {len(due)} HeyGen session(s); {len(self._sessions)} still tracked")
+
+    async def _reap(self, session: TrackedSession):
+        if session.reason == "unbound" and await helper.STORE.get(BOUND_KEY_PREFIX + session.session_id):
+            # Bound on another worker, which reaps it.
+            self.adopted_elsewhere += 1
+            return
+        avatar_speech.discard_queue(session.session_id)
+        try:
+            await heygen_sessions.stop_session(session.token, session.session_id)
+        except UpstreamUnavailable as e:
+            # HeyGen is failing or saturated; try again once the breaker allows it.
+            if not self._retry_later(session, e.retry_after):
+                print(f"Error reaping HeyGen session {session.session_id}: {e}")
+            return
+        except (httpx.HTTPError, HTTPException, ValueError) as e:
+            # Usually already closed by HeyGen (idle timeout) or by the client on another worker.
+            print(f"HeyGen session {session.session_id} could not be stopped (probably already closed): {e}")
+        if session.interview_id is not None:
+            await helper.STORE.delete(BOUND_KEY_PREFIX + session.session_id)
+        self.reaped[session.reason] = self.reaped.get(session.reason, 0) + 1
+        HEYGEN_REAPED.inc(session.reason)
+
+    def _retry_later(self, session: TrackedSession, delay: float) -> bool:
+        """Tracks a session that could not be reaped again; False once it has failed three times."""
+        session.attempts += 1
+        if session.attempts >= 3:
+            self.reap_failures += 1
+            return False
+        session.reap_at = time.monotonic() + max(delay, REAP_INTERVAL)
+        self._sessions.setdefault(session.session_id, session)
+        return True
+
+    def stats(self) -> dict:
+        pending = sum(1 for session in self._sessions.values() if session.reap_at is not None)
+        bound = sum(1 for session in self._sessions.values() if session.interview_id is not None)
+        return {
+            "live": len(self._sessions),
+            "bound": bound,
+            "unbound": len(self._sessions) - bound,
+            "pending_reap": pending,
+            "reaped": dict(self.reaped),
+            "reap_failures": self.reap_failures,
+            "stopped_by_client": self.stopped_by_client,
+            "adopted_elsewhere": self.adopted_elsewhere,
+            "grace_seconds": self.grace,
+            "unbound_ttl_seconds": self.unbound_ttl,
+        }
+
+
+TRACKER = SessionTracker()
+
+HEYGEN_LIVE = Gauge(
+    "heygen_sessions_live",
+    "HeyGen sessions handed out by this worker and not yet stopped.",
+    function=lambda: len(TRACKER),
+)
@@ -1,11 +1,100 @@
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+import asyncio
+import math
+import os
+import signal
+import threading
+from contextlib import asynccontextmanager
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from routes import StaticRouter, InterviewRouter, HeyGenRouter, GladiaRouter
+from routes import StaticRouter, InterviewRouter, HeyGenRouter, GladiaRouter, MetricsRouter
+import upstream
+import heygen_sessions
+import heygen_tracker
+import helper
+import metrics
+import tracing
+import warmup
+from resilience import UpstreamUnavailable
+from admission import AdmissionDenied
+
+
+def drain_on_sigterm():
+    """Drains interview WebSockets before the server's own SIGTERM handling runs.
+
+    uvicorn closes every open WebSocket with 1012 as soon as it starts shutting
+    down, before the lifespan shutdown below, so messages still queued would be
+    lost. This handler drains first, then restores the previous handler and
+    re-raises the signal.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return  # Signal handlers can only be installed from the main thread (not e.g. under TestClient).
+    loop = asyncio.get_running_loop()
+    previous = signal.getsignal(signal.SIGTERM)
+
+    async def drain_then_exit():
+        try:
+            await helper.drain_connections()
+        finally:
+            signal.signal(signal.SIGTERM, previous)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def handle(signum, frame):
+        signal.signal(signal.SIGTERM, previous)
+        loop.call_soon_threadsafe(loop.create_task, drain_then_exit())
+
+    signal.signal(signal.SIGTERM, handle)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    StaticRouter.build_assets()
+    upstream.open_clients()
+    warmup.start()
+    metrics.start_loop_monitor()
+    await helper.start_routing()
+    heygen_sessions.start_pool()
+    heygen_tracker.TRACKER.start()
+    drain_on_sigterm()
+    yield
+    await helper.drain_connections()
+    await InterviewRouter.cancel_pending_starts()
+    await warmup.stop()
+    await heygen_tracker.TRACKER.stop()
+    await heygen_sessions.stop_pool()
+    await helper.stop_routing()
+    await upstream.close_clients()
+    await metrics.stop_loop_monitor()
+
 
 # --- Application Setup ---
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    headers = {"Retry-After": str(max(math.ceil(exc.retry_after), 1))}
+    return ORJSONResponse({"detail": str(exc)}, status_code=503, headers=headers)
+
+
+@app.exception_handler(httpx.RequestError)
+async def upstream_request_error_handler(request: Request, exc: httpx.RequestError):
+    # The upstream could not be reached or did not answer in time.
+    status_code = 504 if isinstance(exc, httpx.TimeoutException) else 502
+    return ORJSONResponse({"detail": f"Upstream request failed: {type(exc).__name__}"}, status_code=status_code)
+
+
+@app.exception_handler(AdmissionDenied)
+async def admission_denied_handler(request: Request, exc: AdmissionDenied):
+    headers = {"Retry-After": str(max(math.ceil(exc.retry_after), 1))}
+    return ORJSONResponse({"detail": str(exc)}, status_code=exc.status_code, headers=headers)
+
+# Installed only when enabled so untraced requests don't pay for it.
+if tracing.ENABLED:
+    app.add_middleware(tracing.TracingMiddleware)
 
 origins = ["*","http://localhost:3000"]
 
@@ -18,10 +107,10 @@ app.add_middleware(
 )
 
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
 app.include_router(StaticRouter.router)
 app.include_router(InterviewRouter.router)
 app.include_router(HeyGenRouter.router)
 app.include_router(GladiaRouter.router)
+app.include_router(MetricsRouter.router)
 
 #test2
\ No newline at end of file
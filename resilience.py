@@ -0,0 +1,350 @@
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import httpx
+
+from upstream import get_client, UPSTREAMS
+from metrics import Counter, Gauge, UPSTREAM_LATENCY
+import tracing
+from settings import settings
+
+# Every outbound call to n8n, HeyGen and Gladia goes through `request()` below,
+# which applies that upstream's policy in this order:
+#
+#   deadline  - the caller's overall deadline caps the call's timeout, and a
+#               call with no time left is refused without touching the network
+#   breaker   - after BREAKER_FAILURES consecutive failures the operation is
+#               failed fast for BREAKER_RESET seconds, then one probe is let through
+#   bulkhead  - at most MAX_CONCURRENCY calls of the operation in flight; callers
+#               wait up to BULKHEAD_WAIT seconds for a slot instead of piling up
+#   retries   - idempotent calls retry transient failures, but only while the
+#               upstream's retry budget has tokens, so retries cannot multiply
+#               load on an upstream that is already struggling
+#
+# Breakers and bulkheads are kept per operation: a burst of failing or slow
+# n8n start workflows (which any client can trigger) must not fail fast or
+# queue the answer forwarding of interviews already running.
+#
+# Each setting is configured per upstream, e.g. `HEYGEN_MAX_CONCURRENCY`
+# or `N8N_BREAKER_FAILURES` (see settings.py).
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+UPSTREAM_REJECTIONS = Counter(
+    "upstream_rejections_total",
+    "Upstream calls refused locally by the resilience policy.",
+    ("upstream", "reason"),
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total",
+    "Retries of idempotent upstream calls.",
+    ("upstream",),
+)
+CIRCUIT_STATE = Gauge(
+    "upstream_circuit_state",
+    "Circuit breaker state per upstream operation (0 closed, 1 half-open, 2 open).",
+    ("upstream", "operation"),
+)
+IN_FLIGHT = Gauge(
+    "upstream_in_flight",
+    "Upstream calls currently holding a bulkhead slot.",
+    ("upstream",),
+)
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("upstream_deadline", default=None)
+
+
+class UpstreamUnavailable(Exception):
+    """Raised instead of calling an upstream that is failing, saturated or out of time."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float = 0.0):
+        super().__init__(f"{upstream} unavailable: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Bounds every upstream call made inside the block to `seconds` from now.
+
+    Nested deadlines can only shorten the one already in effect.
+    """
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        expires_at = min(expires_at, current)
+    token = _deadline.set(expires_at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is none."""
+    expires_at = _deadline.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return isinstance(error, (httpx.RequestError, UpstreamUnavailable))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, operation: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.operation = operation
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probing = False
+        CIRCUIT_STATE.set(0, name, operation)
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.set(_STATE_VALUES[state], self.name, self.operation)
+
+    def allow(self):
+        if self.state == CLOSED:
+            return
+        if self.state == OPEN:
+            wait = self.opened_at + self.reset_timeout - time.monotonic()
+            if wait > 0:
+                raise UpstreamUnavailable(self.name, "circuit_open", retry_after=wait)
+            self._set_state(HALF_OPEN)
+        # Half-open: exactly one probe at a time decides whether to close again.
+        if self._probing:
+            raise UpstreamUnavailable(self.name, "circuit_open", retry_after=1.0)
+        self._probing = True
+
+    def record_success(self):
+        self._probing = False
+        self.failures = 0
+        if self.state != CLOSED:
+            print(f"Circuit for {self.name} {self.operation} closed again.")
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+                print(f"WARNING: Circuit for {self.name} {self.operation} opened after "
+                      f"{self.failures} consecutive failures.")
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def release(self):
+        """Frees the half-open probe slot when the call ended without a verdict."""
+        self._probing = False
+
+
+class RetryBudget:
+    """Allows retries worth `ratio` of recent calls, plus a small fixed allowance."""
+
+    def __init__(self, ratio: float, minimum: float):
+        self.ratio = ratio
+        self.capacity = minimum
+        self.tokens = minimum
+
+    def deposit(self):
+        self.tokens = min(self.tokens + self.ratio, self.capacity + 100 * self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Compartment:
+    """The breaker and bulkhead of one upstream operation."""
+
+    def __init__(self, breaker: CircuitBreaker, max_concurrency: int):
+        self.breaker = breaker
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+
+    def stats(self) -> dict:
+        return {
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "times_opened": self.breaker.times_opened,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+        }
+
+
+class UpstreamPolicy:
+    def __init__(self, name: str):
+        self.name = name
+        self.max_concurrency = settings.upstream(name, "max_concurrency")
+        self.bulkhead_wait = settings.upstream(name, "bulkhead_wait")
+        self.max_retries = settings.upstream(name, "max_retries")
+        self.retry_backoff = settings.upstream(name, "retry_backoff")
+        self.breaker_failures = settings.upstream(name, "breaker_failures")
+        self.breaker_reset = settings.upstream(name, "breaker_reset")
+        self.budget = RetryBudget(settings.upstream(name, "retry_ratio"), settings.upstream(name, "retry_min"))
+        self._compartments: Dict[str, Compartment] = {}
+        self.calls = 0
+        self.retries = 0
+        self.rejected: Dict[str, int] = {}
+
+    def compartment(self, operation: str) -> Compartment:
+        compartment = self._compartments.get(operation)
+        if compartment is None:
+            breaker = CircuitBreaker(self.name, operation, self.breaker_failures, self.breaker_reset)
+            compartment = self._compartments[operation] = Compartment(breaker, self.max_concurrency)
+        return compartment
+
+    def _count_rejection(self, reason: str):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        UPSTREAM_REJECTIONS.inc(self.name, reason)
+
+    def _reject(self, reason: str, retry_after: float = 0.0) -> UpstreamUnavailable:
+        self._count_rejection(reason)
+        return UpstreamUnavailable(self.name, reason, retry_after)
+
+    def _timeout(self, requested: Optional[float]):
+        left = remaining()
+        if left is None:
+            return requested if requested is not None else httpx.USE_CLIENT_DEFAULT
+        if left <= 0:
+            raise self._reject("deadline_exceeded")
+        timeout = requested if requested is not None else get_client(self.name).timeout.read
+        return min(timeout, left)
+
+    async def _acquire(self, compartment: Compartment):
+        wait = self.bulkhead_wait
+        left = remaining()
+        if left is not None:
+            wait = min(wait, max(left, 0.0))
+        compartment.waiting += 1
+        # Only a call that actually queues for a slot gets a span.
+        queued = tracing.span(f"{self.name}.queue") if compartment.slots.locked() else tracing.NOOP
+        try:
+            with queued:
+                await asyncio.wait_for(compartment.slots.acquire(), wait)
+        except asyncio.TimeoutError:
+            raise self._reject("bulkhead_full", retry_after=1.0)
+        finally:
+            compartment.waiting -= 1
+        compartment.in_flight += 1
+        IN_FLIGHT.inc(self.name)
+
+    def _release(self, compartment: Compartment):
+        compartment.in_flight -= 1
+        IN_FLIGHT.dec(self.name)
+        compartment.slots.release()
+
+    async def _attempt(self, operation: str, method: str, url: str, timeout: Optional[float],
+                       kwargs: dict) -> httpx.Response:
+        call_timeout = self._timeout(timeout)
+        compartment = self.compartment(operation)
+        breaker = compartment.breaker
+        try:
+            breaker.allow()
+        except UpstreamUnavailable as e:
+            raise self._reject(e.reason, e.retry_after)
+        try:
+            await self._acquire(compartment)
+        except BaseException:
+            breaker.release()
+            raise
+        try:
+            with UPSTREAM_LATENCY.time(self.name, operation):
+                response = await get_client(self.name).request(method, url, timeout=call_timeout, **kwargs)
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            if is_transient(e):
+                breaker.record_failure()
+            else:
+                # A 4xx means the upstream is up and answering.
+                breaker.record_success()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        finally:
+            self._release(compartment)
+        breaker.record_success()
+        return response
+
+    async def request(self, operation: str, method: str, url: str, *, idempotent: bool = False,
+                      timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        self.calls += 1
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                with tracing.span(f"{self.name}.{operation}"):
+                    return await self._attempt(operation, method, url, timeout, kwargs)
+            except (httpx.HTTPError, UpstreamUnavailable) as e:
+                if not idempotent or not is_transient(e) or attempt >= self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                left = remaining()
+                if left is not None and left <= delay:
+                    raise
+                if not self.budget.withdraw():
+                    self._count_rejection("retry_budget_exhausted")
+                    raise
+                attempt += 1
+                self.retries += 1
+                UPSTREAM_RETRIES.inc(self.name)
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        compartments = self._compartments.values()
+        states = {compartment.breaker.state for compartment in compartments}
+        return {
+            # The worst state of any operation; see `operations` for each one.
+            "circuit": next((state for state in (OPEN, HALF_OPEN) if state in states), CLOSED),
+            "times_opened": sum(compartment.breaker.times_opened for compartment in compartments),
+            "in_flight": sum(compartment.in_flight for compartment in compartments),
+            "waiting": sum(compartment.waiting for compartment in compartments),
+            "max_concurrency": self.max_concurrency,
+            "retry_tokens": round(self.budget.tokens, 2),
+            "calls": self.calls,
+            "retries": self.retries,
+            "rejected": dict(self.rejected),
+            "operations": {operation: compartment.stats() for operation, compartment in self._compartments.items()},
+        }
+
+
+POLICIES: Dict[str, UpstreamPolicy] = {}
+
+
+def get_policy(name: str) -> UpstreamPolicy:
+    policy = POLICIES.get(name)
+    if policy is None:
+        policy = POLICIES[name] = UpstreamPolicy(name)
+    return policy
+
+
+async def request(name: str, operation: str, method: str, url: str, **kwargs) -> httpx.Response:
+    """Calls an upstream under its policy and returns the (2xx) response.
+
+    Raises httpx errors like a plain client call, or UpstreamUnavailable when
+    the policy refuses the call.
+    """
+    return await get_policy(name).request(operation, method, url, **kwargs)
+
+
+def get_stats() -> dict:
+    return {name: get_policy(name).stats() for name in UPSTREAMS}
@@ -1,23 +1,64 @@
 import httpx
-from fastapi import APIRouter, Request, Body, HTTPException
+import websockets
+from fastapi import APIRouter, Request, Body, HTTPException, WebSocket, WebSocketDisconnect
 from typing import Dict, Any
 from . import schemas
-from dotenv import load_dotenv
-import os
+from upstream import GLADIA
+import resilience
+from resilience import UpstreamUnavailable
+from audio_relay import AudioRelay
+from helper import send_personal_message, is_known_session
+import answer_aggregator
+import admission
+from admission import AdmissionDenied
+from helper import REGISTRY
+from settings import settings
 
-load_dotenv()
+GLADIA_API_KEY = settings.gladia_api_key
+GLADIA_API_URL = settings.gladia_api_url
 
-GLADIA_API_KEY = os.getenv("GLADIA_API_KEY")
+# Gladia message types that are streamed back to the browser over the interview socket.
+RELAYED_MESSAGE_TYPES = {"transcript", "speech_start", "speech_end"}
 
 router = APIRouter(tags=["3. Gladia Transcription"])
 
+
+async def create_live_session() -> dict:
+    """Initializes a Gladia live session and returns its `id` and WebSocket `url`."""
+    headers = {'X-Gladia-Key': GLADIA_API_KEY, 'Content-Type': 'application/json'}
+    body = {
+        "encoding": "wav/pcm",
+        "sample_rate": 16000,
+        'model': "solaria-1",
+        "endpointing": 2,
+        "language_config": {
+            "languages": ["id"],
+            "code_switching": False,
+        },
+        "maximum_duration_without_endpointing": 60,
+        "realtime_processing": {
+            "translation": False,
+        },
+        "pre_processing": {
+            "audio_enhancer": False,
+            "speech_threshold": 0.6
+        },
+    }
+
+    response = await resilience.request(GLADIA, "live.init", "POST", GLADIA_API_URL, headers=headers, json=body)
+    return response.json()
+
+
 @router.post(
     "/api/gladia/init",
     summary="Initialize Gladia Live Transcription",
     description="""Proxies a request to the Gladia API to initialize a live audio transcription session.
-    The request body and response will match the format specified by the official Gladia API documentation.""",
+    The request body and response will match the format specified by the official Gladia API documentation.
+    Superseded by the `/ws/audio/{session_id}/` relay, which keeps the Gladia URL on the server.""",
+    deprecated=True,
     response_model=schemas.GladiaInitResponse,
     responses={
+        429: {"model": schemas.ErrorResponse, "description": "This client created too many sessions; retry after the `Retry-After` header."},
         502: {"model": schemas.ErrorResponse, "description": "Error communicating with the Gladia API."}
     }
 )
@@ -25,30 +66,66 @@ async def gladia_api_init(
     request: Request,
     # We use a generic Dict here because it's a direct proxy.
 ):
-    headers = {'X-Gladia-Key': GLADIA_API_KEY, 'Content-Type': 'application/json'}
+    admission.GLADIA.check(client=admission.client_key(request))
     try:
-        body = {
-            "encoding": "wav/pcm",
-            "sample_rate": 16000,
-            'model': "solaria-1",
-            "endpointing": 2,
-            "language_config": {
-                "languages": ["id"],
-                "code_switching": False,
-            },
-            "maximum_duration_without_endpointing": 60,
-            "realtime_processing": {
-                "translation": False,
-            },
-            "pre_processing": {
-                "audio_enhancer": False,
-                "speech_threshold": 0.6
-            },
-        }
-
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post("https://api.gladia.io/v2/live", headers=headers, json=body)
-            return response.json()
+        return await create_live_session()
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=502, detail=f"Error from Gladia: {e.response.text}")
+
+
+@router.websocket("/ws/audio/{session_id}/")
+async def audio_relay_endpoint(websocket: WebSocket, session_id: str):
+    # The browser sends raw 16 kHz 16-bit mono PCM as binary frames. Audio is
+    # relayed to Gladia from here and transcripts come back over the
+    # interview socket as {"type": "transcript", "payload": <Gladia message>}.
+    await websocket.accept()
+    # Every relay opens a billed Gladia session, so only interviews this
+    # deployment knows about get one.
+    if not await is_known_session(session_id):
+        print(f"Refusing Gladia audio relay for unknown session {session_id}")
+        await websocket.close(code=1008, reason="Unknown interview session")
+        return
+    try:
+        # Reconnects of a running interview may use the reserved share.
+        admission.GLADIA.check(client=admission.client_key(websocket), session=session_id,
+                               priority=REGISTRY.websocket(session_id) is not None)
+    except AdmissionDenied as e:
+        print(f"Refusing Gladia audio relay for {session_id}: {e}")
+        await websocket.close(code=1013, reason=f"retry after {e.retry_after:.0f}s")
+        return
+
+    async def relay_transcript(message: dict):
+        if message.get("type") == "speech_start":
+            answer_aggregator.note_speech_start(session_id)
+        if message.get("type") in RELAYED_MESSAGE_TYPES:
+            await send_personal_message({"type": message["type"], "payload": message}, session_id)
+
+    async def relay_failed(error: Exception):
+        # Ends the receive loop below; the client sees why transcription stopped.
+        try:
+            await websocket.close(code=1011, reason="Transcription relay failed")
+        except RuntimeError:
+            pass  # the client already went away
+
+    try:
+        live_session = await create_live_session()
+        relay = AudioRelay(session_id, live_session["url"], relay_transcript, relay_failed)
+        await relay.open()
+    except (httpx.HTTPError, UpstreamUnavailable, OSError, websockets.WebSocketException,
+            KeyError, ValueError) as e:
+        # KeyError / ValueError: Gladia answered without a URL or with a non-JSON body.
+        print(f"Error opening Gladia audio relay for {session_id}: {e!r}")
+        await websocket.close(code=1011)
+        return
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes"):
+                await relay.feed(message["bytes"])
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await relay.close()
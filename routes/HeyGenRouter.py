@@ -1,16 +1,42 @@
-from fastapi import APIRouter, Request, Body, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 import httpx
+from typing import Optional
 from . import schemas
-import os
-from dotenv import load_dotenv
+from upstream import HEYGEN
+import resilience
+import heygen_sessions
+import avatar_speech
+import heygen_tracker
+import tracing
+import admission
+from helper import REGISTRY
+import time
+from settings import settings
 
-load_dotenv()
-
-HEYGEN_API_KEY = os.getenv("HEYGEN_API_KEY")
-HEYGEN_SERVER_URL = os.getenv("HEYGEN_SERVER_URL")
+HEYGEN_API_KEY = settings.heygen_api_key
+HEYGEN_SERVER_URL = settings.heygen_server_url
 
 router = APIRouter(tags=["2. HeyGen Streaming"])
 
+
+def _admit_session(request: Request):
+    """Rate-limits HeyGen session creation; clients of a running interview may use the reserve."""
+    interview_id = request.headers.get("x-interview-session")
+    priority = bool(interview_id) and REGISTRY.websocket(interview_id) is not None
+    admission.HEYGEN.check(client=admission.client_key(request), priority=priority)
+
+
+def _session_token(session_id: str, token: Optional[str]) -> str:
+    """The caller's token, or the one a session bound to a connected interview was created with."""
+    if token:
+        return token
+    token = heygen_tracker.TRACKER.token_for(session_id)
+    if token is None:
+        raise HTTPException(status_code=403,
+                            detail="A token is required for sessions not bound to a connected interview.")
+    return token
+
+
 @router.post(
     "/api/heygen/create_token",
     summary="Create HeyGen Streaming Token",
@@ -21,11 +47,9 @@ async def heygen_create_token():
     headers = {'X-Api-Key': HEYGEN_API_KEY}
     api_url = f"{HEYGEN_SERVER_URL}/v1/streaming.create_token"
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(api_url, headers=headers)
-
-        response.raise_for_status()
-        return response.json()
+    response = await resilience.request(HEYGEN, "streaming.create_token", "POST", api_url, headers=headers,
+                                        idempotent=True)
+    return response.json()
 
 @router.post(
     "/api/heygen/new_session",
@@ -34,17 +58,18 @@ async def heygen_create_token():
     deprecated=True,
     responses={
         400: {"model": schemas.ErrorResponse, "description": "Session token is missing."},
+        429: {"model": schemas.ErrorResponse, "description": "This client created too many sessions; retry after the `Retry-After` header."},
         502: {"model": schemas.ErrorResponse, "description": "Could not establish a video stream with HeyGen."}
     }
 )
 async def heygen_new_session(
-    request: Request,
-    request_body: schemas.HeyGenNewSessionRequest = Body(...) # For documentation
+    request_body: schemas.HeyGenNewSessionRequest,
+    request: Request
 ):
-    body = await request.json()
-    token = body.get("token")
+    token = request_body.token
     if not token:
         raise HTTPException(status_code=400, detail="Session token is missing")
+    _admit_session(request)
 
     headers = {
         'Authorization': f'Bearer {token}',
@@ -68,13 +93,17 @@ async def heygen_new_session(
         "activity_idle_timeout": 120
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(api_url, headers=headers, json=heygen_body, timeout=30.0)
-        response.raise_for_status()
+    response = await resilience.request(HEYGEN, "streaming.new", "POST", api_url, headers=headers,
+                                        json=heygen_body, timeout=30.0)
+    try:
         response_data = response.json()
-        if not response_data.get("data") or not response_data["data"].get("url"):
-            raise HTTPException(status_code=502, detail="HeyGen response is missing the LiveKit URL.")
-        return response_data
+        data = response_data["data"]
+        if not data.get("session_id") or not data.get("url"):
+            raise ValueError
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=502, detail="HeyGen response is missing the session ID or LiveKit URL.")
+    heygen_tracker.TRACKER.track(data["session_id"], token)
+    return response_data
 
 @router.post(
     "/api/heygen/start_session",
@@ -88,65 +117,62 @@ async def heygen_new_session(
     }
 )
 async def heygen_start_session(
-    request: Request,
-    request_body: schemas.HeyGenSessionRequest = Body(...) # For documentation
+    request_body: schemas.HeyGenSessionRequest
 ):
     """Starts the video stream for a previously created session."""
-    body = await request.json()
-    token = body.get("token")
-    session_id = body.get("session_id")
+    token = request_body.token
+    session_id = request_body.session_id
     headers = {
         'Authorization': f'Bearer {token}',
         'Content-Type': 'application/json'
     }
 
     api_url = f"{HEYGEN_SERVER_URL}/v1/streaming.start"
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(api_url, headers=headers, json={"session_id": session_id})
-            response.raise_for_status()
-            return response.json()
-        except httpx.HTTPStatusError as e:
-            # Handle specific errors like 404 Not Found from HeyGen
-            if e.response.status_code == 404:
-                raise HTTPException(status_code=404, detail=f"HeyGen session not found: {e.response.text}")
-            raise HTTPException(status_code=502, detail=f"Error from HeyGen: {e.response.text}")
+    try:
+        response = await resilience.request(HEYGEN, "streaming.start", "POST", api_url, headers=headers,
+                                            json={"session_id": session_id}, idempotent=True)
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        # Handle specific errors like 404 Not Found from HeyGen
+        if e.response.status_code == 404:
+            raise HTTPException(status_code=404, detail=f"HeyGen session not found: {e.response.text}")
+        raise HTTPException(status_code=502, detail=f"Error from HeyGen: {e.response.text}")
 
 @router.post(
     "/api/heygen/stop_session",
     summary="Stop an active HeyGen session",
 )
 async def heygen_stop_session(
-    request: Request,
-    request_body: schemas.HeyGenSessionRequest = Body(...)
+    request_body: schemas.HeyGenSessionRequest
 ):
-    body = await request.json()
-    token, session_id = body.get("token"), body.get("session_id")
+    token, session_id = request_body.token, request_body.session_id
     headers = {
         'Authorization': f'Bearer {token}',
         'Content-Type': 'application/json'
     }
 
     api_url = f"{HEYGEN_SERVER_URL}/v1/streaming.stop"
-    async with httpx.AsyncClient() as client:
-        response = await client.post(api_url, headers=headers, json={"session_id": session_id})
-        response.raise_for_status()
-        return response.json()
+    avatar_speech.discard_queue(session_id)
+    heygen_tracker.TRACKER.release(session_id)
+    response = await resilience.request(HEYGEN, "streaming.stop", "POST", api_url, headers=headers,
+                                        json={"session_id": session_id}, idempotent=True)
+    return response.json()
 
 @router.post(
     "/api/heygen/task",
     summary="Send a TTS task to HeyGen",
-    description="Sends a text prompt for the avatar to speak during the session."
+    description="Sends a text prompt for the avatar to speak during the session. `token` may be omitted for a session this server handed out that is bound to a connected interview.",
+    responses={
+        403: {"model": schemas.ErrorResponse, "description": "`token` is missing and the session is not bound to a connected interview."}
+    }
 )
 async def heygen_api_task(
-    request: Request,
-    request_body: schemas.HeyGenTaskRequest = Body(...) # For documentation
+    request_body: schemas.HeyGenTaskRequest
 ):
-    body = await request.json()
-    token = body.get("token")
-    session_id = body.get("session_id")
-    text = body.get("text")
-    task_type = body.get("task_type", "text")
+    token = _session_token(request_body.session_id, request_body.token)
+    session_id = request_body.session_id
+    text = request_body.text
+    task_type = request_body.task_type
 
     payload = {
         "session_id": session_id,
@@ -159,95 +185,108 @@ async def heygen_api_task(
     }
 
     api_url = f"{HEYGEN_SERVER_URL}/v1/streaming.task"
-    async with httpx.AsyncClient() as client:
-        response = await client.post(api_url, headers=headers, json=payload)
-        return {"status": "ok", "heygen_status_code": response.status_code}
+    try:
+        response = await resilience.request(HEYGEN, "streaming.task", "POST", api_url, headers=headers, json=payload)
+    except httpx.HTTPStatusError as e:
+        response = e.response
+    return {"status": "ok", "heygen_status_code": response.status_code}
+
+
+@router.post(
+    "/api/heygen/task/stream",
+    summary="Stream a TTS task to HeyGen sentence by sentence",
+    description="""Splits the text into sentence or clause segments and sends them to HeyGen in order, so the avatar starts speaking after the first segment.
+    Returns once the first segment was accepted; the rest follow in the background. Texts sent for the same session are spoken in the order they arrive.
+    Only serves sessions this server handed out; `token` may be omitted while the session is bound to a connected interview.""",
+    response_model=schemas.HeyGenStreamTaskResponse,
+    responses={
+        403: {"model": schemas.ErrorResponse, "description": "`token` is missing and the session is not bound to a connected interview."},
+        404: {"model": schemas.ErrorResponse, "description": "The session was not handed out by this server or was already stopped."},
+        409: {"model": schemas.ErrorResponse, "description": "The text was interrupted before its first segment was sent."}
+    }
+)
+async def heygen_stream_task(
+    request_body: schemas.HeyGenTaskRequest
+):
+    started = time.perf_counter()
+    if request_body.session_id not in heygen_tracker.TRACKER:
+        raise HTTPException(status_code=404, detail="Unknown HeyGen session.")
+    token = _session_token(request_body.session_id, request_body.token)
+    queue = avatar_speech.get_queue(request_body.session_id, token)
+    result = await queue.speak(request_body.text, request_body.task_type)
+    return {
+        "status": "ok",
+        "segments": result["segments"],
+        "queued_segments": queue.pending_segments,
+        "first_segment_seconds": round(time.perf_counter() - started, 3),
+        "first_task": result["first_task"],
+    }
+
+
+@router.post(
+    "/api/heygen/task/interrupt",
+    summary="Interrupt the avatar",
+    description="Drops the session's queued speech segments and asks HeyGen to stop the one being spoken. `token` may be omitted while the session is bound to a connected interview.",
+    response_model=schemas.HeyGenInterruptResponse,
+    responses={
+        403: {"model": schemas.ErrorResponse, "description": "`token` is missing and the session is not bound to a connected interview."}
+    }
+)
+async def heygen_interrupt_task(
+    request_body: schemas.HeyGenInterruptRequest
+):
+    token = _session_token(request_body.session_id, request_body.token)
+    queue = avatar_speech.QUEUES.get(request_body.session_id)
+    cancelled = queue.interrupt() if queue is not None else 0
+    await heygen_sessions.interrupt_session(token, request_body.session_id)
+    return {"status": "ok", "cancelled_segments": cancelled}
 
 
 @router.post(
     "/api/heygen/initiate_session",
     summary="Initiate a complete HeyGen Streaming Session",
-    description="Handles token creation, session creation, and starting the session in a single call, returning only the necessary LiveKit connection details.",
-    response_model=schemas.InitiateSessionResponse
+    description="""Handles token creation, session creation, and starting the session in a single call, returning only the necessary LiveKit connection details.
+    Clients re-creating the avatar of a running interview should send its session ID as `X-Interview-Session`; they are admitted ahead of new interviews when HeyGen capacity runs low.""",
+    response_model=schemas.InitiateSessionResponse,
+    responses={
+        429: {"model": schemas.ErrorResponse, "description": "This client created too many sessions; retry after the `Retry-After` header."},
+        503: {"model": schemas.ErrorResponse, "description": "HeyGen is failing or the server-wide session rate is exhausted; retry after the `Retry-After` header."}
+    }
 )
-async def initiate_heygen_session():
+async def initiate_heygen_session(request: Request):
     """
     Wraps the entire HeyGen session startup process into a single API call.
+    Hands out a pre-warmed session when the session pool is enabled.
     """
-    headers = {'X-Api-Key': HEYGEN_API_KEY}
+    _admit_session(request)
+    if heygen_sessions.POOL is not None:
+        with tracing.span("heygen.pool_acquire"):
+            pooled = heygen_sessions.POOL.acquire()
+        if pooled is not None:
+            heygen_tracker.TRACKER.track(pooled["session_id"], pooled["token"])
+            return pooled
+
+    response = await heygen_sessions.initiate_session()
+    heygen_tracker.TRACKER.track(response["session_id"], response["token"])
+    return response
 
-    async with httpx.AsyncClient() as client:
-        # 1. Create a session token
-        try:
-            token_url = f"{HEYGEN_SERVER_URL}/v1/streaming.create_token"
-            token_response = await client.post(token_url, headers=headers)
-            token_response.raise_for_status()
-            streaming_token = token_response.json()["data"]["token"]
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code,
-                                detail=f"Failed to create HeyGen token: {e.response.text}")
-        except (KeyError, TypeError):
-            raise HTTPException(status_code=500, detail="Could not parse token from HeyGen response.")
-
-        # 2. Create a new session
-        auth_headers = {
-            'Authorization': f'Bearer {streaming_token}',
-            'Content-Type': 'application/json'
-        }
-        new_session_url = f"{HEYGEN_SERVER_URL}/v1/streaming.new"
-        # Using the default avatar from your provided code
-        new_session_body = {
-            "quality": "high",
-            "avatar_name": os.getenv("AVATAR_NAME"),
-            "voice": {
-                "rate": 1
-            },
-            "video_encoding": "VP8",
-            "disable_idle_timeout": False,
-            "version": "v2",
-            "stt_settings": {
-                "provider": "deepgram",
-                "confidence": 0.55
-            },
-            "activity_idle_timeout": 120
-        }
-
-        try:
-            new_session_response = await client.post(new_session_url, headers=auth_headers, json=new_session_body,
-                                                     timeout=30.0)
-            new_session_response.raise_for_status()
-            session_data = new_session_response.json()["data"]
-            session_id = session_data.get("session_id")
-            livekit_url = session_data.get("url")
-            livekit_token = session_data.get("access_token")
-
-            if not all([session_id, livekit_url, livekit_token]):
-                raise HTTPException(status_code=502,
-                                    detail="HeyGen new session response is missing required data (session_id, url, or access_token).")
-
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code,
-                                detail=f"Failed to create new HeyGen session: {e.response.text}")
-        except (KeyError, TypeError):
-            raise HTTPException(status_code=500, detail="Could not parse new session data from HeyGen response.")
-
-        # 3. Start the session
-        start_session_url = f"{HEYGEN_SERVER_URL}/v1/streaming.start"
-        try:
-            start_response = await client.post(start_session_url, headers=auth_headers, json={"session_id": session_id})
-            start_response.raise_for_status()
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(status_code=e.response.status_code,
-                                detail=f"Failed to start HeyGen session: {e.response.text}")
-
-        # 4. Return only what's needed for the client
-        return {
-            "message": "HeyGen session successfully initiated.",
-            "session_id": session_id,
-            "token": streaming_token,
-            "livekit_connection": {
-                "server_url": livekit_url,
-                "token": livekit_token
-            }
-        }
 
+@router.get(
+    "/api/heygen/sessions",
+    summary="Tracked HeyGen session statistics",
+    description="Reports how many HeyGen sessions this worker handed out are live (bound to an interview socket or not), and how many it reaped after their interview ended or its socket closed."
+)
+async def heygen_session_stats():
+    return heygen_tracker.TRACKER.stats()
+
+
+@router.get(
+    "/api/heygen/pool",
+    summary="HeyGen session pool statistics",
+    description="Reports the pre-warmed session pool size, hit/miss counts and refill latency.",
+    response_model=schemas.HeyGenPoolStats
+)
+async def heygen_pool_stats():
+    if heygen_sessions.POOL is None:
+        return {"enabled": False}
+    return {"enabled": True, **heygen_sessions.POOL.stats()}
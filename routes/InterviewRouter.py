@@ -1,47 +1,178 @@
+import asyncio
+import re
+import uuid
 import httpx
-from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect, Body, HTTPException
+from fastapi import APIRouter, Depends, Request, WebSocket, WebSocketDisconnect, HTTPException
 from . import schemas
-from helper import send_personal_message, connect, disconnect, forward_answer_to_n8n, SESSIONS
-import os
-from dotenv import load_dotenv
+from .admin import ADMIN_RESPONSES, require_admin
+from upstream import N8N
+import resilience
+import tracing
+from helper import send_personal_message, send_with_status, connect, disconnect, forward_answer_to_n8n, STORE, REGISTRY
+import answer_forwarder
+import answer_aggregator
+import heygen_tracker
+import admission
+from admission import AdmissionDenied
+from single_flight import SingleFlight
+from codec import decode
+from settings import settings
 
-load_dotenv()
+N8N_START_INTERVIEW_URL = settings.n8n_start_interview_url
+START_DEADLINE = settings.n8n_start_deadline
+BATCH_SEND_CONCURRENCY = settings.batch_send_concurrency
+BOOKING_CODE_PATTERN = re.compile(settings.booking_code_pattern)
 
-N8N_START_INTERVIEW_URL = os.getenv("N8N_START_INTERVIEW_URL")
+# Repeated starts for one booking code (double clicks, reloads, client retries)
+# share a single n8n workflow run and reuse its session for START_CACHE_TTL.
+# Admission refusals are not cached: the retry after `Retry-After` should run.
+START_FLIGHTS = SingleFlight(
+    ttl=settings.start_cache_ttl,
+    negative_ttl=settings.start_negative_cache_ttl,
+    max_entries=settings.start_cache_max,
+    uncached=(AdmissionDenied,),
+)
+
+# Background n8n start workflows launched by /api/interview/start_async.
+_pending_starts = set()
 
 router = APIRouter(tags=["1. Interview Lifecycle"])
 
 @router.post(
     "/api/interview/start",
     summary="Start a new interview session",
-    description="Starts the interview process using a booking code, gets a session ID from the backend, and returns it.",
+    description="Starts the interview process using a booking code, gets a session ID from the backend, and returns it. Repeated starts for the same booking code share one backend call and return the same session.",
     response_model=schemas.StartInterviewResponse,
     responses={
-        502: {"model": schemas.ErrorResponse, "description": "Error communicating with the backend workflow service (n8n)."}
+        429: {"model": schemas.ErrorResponse, "description": "This client started too many interviews; retry after the `Retry-After` header."},
+        502: {"model": schemas.ErrorResponse, "description": "Error communicating with the backend workflow service (n8n)."},
+        503: {"model": schemas.ErrorResponse, "description": "n8n is failing or saturated, or the start queue is full; retry after the `Retry-After` header."}
     }
 )
 async def start_interview(
-    request: Request,
-    request_body: schemas.StartInterviewRequest = Body(...) # For documentation
+    request_body: schemas.StartInterviewRequest,
+    request: Request
 ):
-    body = await request.json()
-    booking_code = body.get('booking_code')
+    admission.START.check(client=admission.client_key(request))
+    return await run_start_workflow(request_body.booking_code)
+
+
+async def run_start_workflow(booking_code: str) -> dict:
+    """Starts (or joins) the n8n start workflow for a booking code."""
+    # Covers time spent waiting on another caller's in-flight workflow.
+    with tracing.span("n8n.start_flight"):
+        return await START_FLIGHTS.run(booking_code, lambda: _start_workflow(booking_code))
+
+
+async def _start_workflow(booking_code: str) -> dict:
+    # New interviews wait here while the instance is busy; joiners of an
+    # in-flight start and cached sessions never do.
+    async with admission.START_QUEUE.slot():
+        return await _call_start_workflow(booking_code)
+
+
+async def _call_start_workflow(booking_code: str) -> dict:
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(N8N_START_INTERVIEW_URL, json={'booking_code': booking_code}, timeout=90.0)
-            response.raise_for_status()
+        with resilience.deadline(START_DEADLINE):
+            response = await resilience.request(N8N, "start_interview", "POST", N8N_START_INTERVIEW_URL,
+                                                json={'booking_code': booking_code}, timeout=90.0)
+        try:
             n8n_data = response.json()
+        except ValueError:
+            n8n_data = None
+        if not isinstance(n8n_data, dict):
+            raise HTTPException(status_code=502, detail="Backend workflow returned a response that is not a JSON object.")
 
         session_id = n8n_data.get('sessionId')
         resume_url = n8n_data.get('resumeUrl')
         if not session_id or not resume_url:
             raise HTTPException(status_code=502, detail="Backend workflow did not return a valid session ID and resume URL.")
 
-        SESSIONS[session_id] = {'resumeUrl': resume_url}
+        await STORE.set(session_id, {'resumeUrl': resume_url, 'bookingCode': booking_code})
         return {"sessionId": session_id, "resumeUrl": resume_url}
     except httpx.HTTPStatusError as e:
         raise HTTPException(status_code=502, detail=f"Error communicating with n8n workflow: {e.response.text}")
 
+
+async def _start_in_background(handle: str, booking_code: str):
+    try:
+        result = {"status": "ready", **await run_start_workflow(booking_code)}
+        message = {'type': 'interview_started', 'payload': result}
+    except Exception as e:
+        # Anything, including a malformed n8n response, must fail the handle:
+        # otherwise it stays "pending" and the client polls forever.
+        detail = e.detail if isinstance(e, HTTPException) else str(e) or type(e).__name__
+        print(f"Error starting interview for pending handle {handle}: {detail}")
+        result = {"status": "failed", "detail": detail}
+        message = {'type': 'interview_start_failed', 'payload': result}
+    await STORE.set(handle, result)
+    await send_personal_message(message, handle)
+
+
+async def cancel_pending_starts():
+    """Cancels background start workflows at shutdown."""
+    for task in list(_pending_starts):
+        task.cancel()
+    await asyncio.gather(*_pending_starts, return_exceptions=True)
+
+
+@router.post(
+    "/api/interview/start_async",
+    status_code=202,
+    summary="Start a new interview session without waiting for n8n",
+    description="""Validates the booking code and returns immediately with a pending handle while the n8n start workflow runs in the background.
+    Connect to `socketUrl` to receive `{"type": "interview_started", "payload": {"sessionId", "resumeUrl"}}` (or `interview_start_failed`), or poll `statusUrl`.
+    HeyGen and microphone setup can run while the workflow is still in progress.
+    When the server is busy the start is queued; `queuePosition` and `estimatedWait` say for how long.""",
+    response_model=schemas.StartInterviewAcceptedResponse,
+    responses={
+        422: {"model": schemas.ErrorResponse, "description": "The booking code is malformed."},
+        429: {"model": schemas.ErrorResponse, "description": "This client started too many interviews; retry after the `Retry-After` header."},
+        503: {"model": schemas.ErrorResponse, "description": "The start queue is full; retry after the `Retry-After` header."}
+    }
+)
+async def start_interview_async(
+    request_body: schemas.StartInterviewRequest,
+    request: Request
+):
+    booking_code = request_body.booking_code.strip()
+    if not BOOKING_CODE_PATTERN.match(booking_code):
+        raise HTTPException(status_code=422, detail="Booking code is malformed.")
+    admission.START.check(client=admission.client_key(request))
+    position, estimated_wait = admission.START_QUEUE.estimate()
+    if estimated_wait > admission.START_QUEUE.max_wait:
+        raise AdmissionDenied("start", "queue_full", estimated_wait, status_code=503)
+
+    handle = uuid.uuid4().hex
+    await STORE.set(handle, {"status": "pending"})
+    task = asyncio.create_task(_start_in_background(handle, booking_code))
+    _pending_starts.add(task)
+    task.add_done_callback(_pending_starts.discard)
+    return {
+        "handle": handle,
+        "status": "pending",
+        "statusUrl": f"/api/interview/start/{handle}",
+        "socketUrl": f"/ws/interview/{handle}/",
+        "queuePosition": position,
+        "estimatedWait": estimated_wait,
+    }
+
+
+@router.get(
+    "/api/interview/start/{handle}",
+    summary="Poll a pending interview start",
+    description="Polling fallback for `/api/interview/start_async` when the WebSocket is unavailable.",
+    response_model=schemas.StartInterviewStatusResponse,
+    responses={
+        404: {"model": schemas.ErrorResponse, "description": "Unknown or expired handle."}
+    }
+)
+async def start_interview_status(handle: str):
+    record = await STORE.get(handle)
+    if not record or "status" not in record:
+        raise HTTPException(status_code=404, detail="Unknown or expired start handle.")
+    return record
+
 @router.post(
     "/api/send-question",
     summary="Send a question to the user",
@@ -49,16 +180,40 @@ async def start_interview(
     response_model=schemas.StatusResponse
 )
 async def send_question(
-    request: Request,
-    request_body: schemas.SendQuestionRequest = Body(...) # For documentation
+    request_body: schemas.SendQuestionRequest
 ):
-    body = await request.json()
-    session_id = body.get('sessionId')
-    question_text = body.get('question')
+    session_id = request_body.sessionId
+    question_text = request_body.question
     message = {'type': 'new_question', 'payload': {'text': question_text}}
-    await send_personal_message(message, session_id)
+    status = await send_with_status(message, session_id)
+    if status == "buffered":
+        return {"status": "Client is reconnecting; question will be delivered when it resumes."}
+    if status != "delivered":
+        return {"status": "Question could not be delivered to the client."}
     return {"status": "Question sent to client."}
 
+@router.post(
+    "/api/send-questions",
+    summary="Send questions to many users",
+    description="Pushes questions to many sessions concurrently (bounded by `BATCH_SEND_CONCURRENCY`, each send limited by `WS_SEND_TIMEOUT`) and reports the delivery status of every item.",
+    response_model=schemas.BatchSendQuestionsResponse
+)
+async def send_questions(
+    request_body: schemas.BatchSendQuestionsRequest
+):
+    semaphore = asyncio.Semaphore(BATCH_SEND_CONCURRENCY)
+
+    async def deliver(item: schemas.SendQuestionRequest) -> dict:
+        session_id = item.sessionId
+        message = {'type': 'new_question', 'payload': {'text': item.question}}
+        async with semaphore:
+            status = await send_with_status(message, session_id)
+        return {"sessionId": session_id, "status": status}
+
+    results = await asyncio.gather(*(deliver(item) for item in request_body.items))
+    delivered = sum(1 for result in results if result["status"] == "delivered")
+    return {"delivered": delivered, "failed": len(results) - delivered, "results": results}
+
 @router.post(
     "/api/interview/end",
     summary="End the interview session",
@@ -66,29 +221,112 @@ async def send_question(
     response_model=schemas.StatusResponse
 )
 async def end_interview(
-    request: Request,
-    request_body: schemas.EndInterviewRequest = Body(...) # For documentation
+    request_body: schemas.EndInterviewRequest
 ):
-    body = await request.json()
-    session_id = body.get('sessionId')
-    if session_id in SESSIONS:
-        del SESSIONS[session_id]
+    session_id = request_body.sessionId
+    session_data = await STORE.get(session_id)
+    if session_data and session_data.get('bookingCode'):
+        START_FLIGHTS.forget(session_data['bookingCode'])
+    await STORE.delete(session_id)
+    heygen_tracker.TRACKER.interview_ended(session_id)
     message = {'type': 'end_interview'}
     await send_personal_message(message, session_id)
     return {"status": "End interview command sent."}
 
+@router.get(
+    "/api/interview/forwarding",
+    summary="Answer forwarding queue statistics",
+    description="Reports queue depth, drops, retries and forward latency of each connected session's n8n answer queue. Requires the `X-Admin-Token` header.",
+    dependencies=[Depends(require_admin)],
+    responses=ADMIN_RESPONSES
+)
+async def forwarding_stats():
+    return answer_forwarder.get_stats()
+
+@router.get(
+    "/api/interview/start_cache",
+    summary="Interview start coalescing statistics",
+    description="Reports how many starts were coalesced onto an in-flight n8n call or served from the booking-code cache."
+)
+async def start_cache_stats():
+    return START_FLIGHTS.stats()
+
+@router.get(
+    "/api/interview/sessions",
+    summary="Session registry statistics",
+    description="Reports how many sessions this worker holds, the idle TTL and how many were evicted. Requires the `X-Admin-Token` header.",
+    dependencies=[Depends(require_admin)],
+    responses=ADMIN_RESPONSES
+)
+async def session_stats():
+    return REGISTRY.stats()
+
+async def _answer_admitted(session_id: str) -> bool:
+    """Takes an answer token; over the limit the fragment is dropped and the client told so."""
+    try:
+        admission.ANSWERS.check(session=session_id, priority=True)
+        return True
+    except AdmissionDenied as e:
+        await send_personal_message({'type': 'rate_limited', 'payload': {'retry_after': round(e.retry_after, 1)}},
+                                    session_id)
+        return False
+
 @router.websocket("/ws/interview/{session_id}/")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     # WebSockets are not formally part of the OpenAPI spec,
     # so they won't appear in the docs. Their function is described
     # in the HTTP endpoints that use them.
-    await connect(websocket, session_id)
+    # Server messages carry a per-session `seq`; clients acknowledge them with
+    # {"type": "ack", "seq": N} and resume with ?last_seq=N after a drop.
+    # Clients with an avatar send {"type": "heygen_session", "payload":
+    # {"session_id", "token"}} so the HeyGen session is stopped with the interview.
+    last_seq = websocket.query_params.get("last_seq")
+    await connect(websocket, session_id, int(last_seq) if last_seq and last_seq.isdigit() else None)
+    heygen_tracker.TRACKER.interview_connected(session_id)
+    # A pending-start handle whose workflow finished before the socket connected.
+    pending = await STORE.get(session_id)
+    if pending and pending.get("status") in ("ready", "failed"):
+        message_type = 'interview_started' if pending["status"] == "ready" else 'interview_start_failed'
+        await send_personal_message({'type': message_type, 'payload': pending}, session_id)
+    forwarder = answer_forwarder.open_forwarder(session_id, forward_answer_to_n8n)
+    # Fragments of one spoken answer are joined before they reach the forwarder.
+    aggregator = answer_aggregator.open_aggregator(session_id, forwarder.submit)
     try:
         while True:
-            data = await websocket.receive_json()
-            if data.get("type") == "user_answer":
-                answer = data.get("payload", {}).get("answer")
-                if answer:
-                    await forward_answer_to_n8n(session_id, answer)
+            try:
+                data = decode(await websocket.receive_text())
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or not isinstance(data.get("payload") or {}, dict):
+                print(f"Ignoring malformed WebSocket message from session {session_id}")
+                continue
+            payload = data.get("payload") or {}
+            REGISTRY.touch(session_id)
+            message_type = data.get("type")
+            if message_type == "user_answer":
+                answer = payload.get("answer")
+                if isinstance(answer, str) and answer and await _answer_admitted(session_id):
+                    # Buffered until the answer is complete, then queued and
+                    # forwarded in order by a background task so this loop
+                    # keeps reading while n8n is slow.
+                    await aggregator.add(answer)
+                if payload.get("final"):
+                    await aggregator.flush("complete")
+            elif message_type == "answer_complete":
+                await aggregator.flush("complete")
+            elif message_type == "ack" and isinstance(data.get("seq"), int):
+                REGISTRY.ack(session_id, data["seq"])
+            elif message_type == "heygen_session":
+                if payload.get("session_id"):
+                    await heygen_tracker.TRACKER.bind(payload["session_id"], payload.get("token"), session_id)
     except WebSocketDisconnect:
-        disconnect(session_id)
\ No newline at end of file
+        pass
+    finally:
+        # Also runs when the handler fails, so the registry never keeps a dead socket.
+        await disconnect(session_id, websocket)
+        # Unless a reconnect already replaced this socket, the avatar is
+        # stopped if the client does not come back within the grace period.
+        if REGISTRY.websocket(session_id) in (None, websocket):
+            heygen_tracker.TRACKER.interview_disconnected(session_id)
+        await answer_aggregator.close_aggregator(session_id, aggregator)
+        await answer_forwarder.close_forwarder(session_id, forwarder)
\ No newline at end of file
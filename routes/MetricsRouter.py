@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+
+import admission
+import metrics
+import resilience
+import tracing
+import warmup
+from .admin import ADMIN_RESPONSES, require_admin
+
+router = APIRouter(tags=["Monitoring"])
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Prometheus metrics",
+    description="Upstream latency histograms, WebSocket and session gauges, message counters and event-loop lag in Prometheus text format."
+)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get(
+    "/readyz",
+    summary="Readiness check",
+    description="""Returns 200 once required settings are present and upstream hosts are resolved and pooled connections opened (see `STARTUP_WARMUP`), 503 before that.
+    The body reports warm-up results per upstream and startup milestones in seconds after process start.""",
+    responses={503: {"description": "Still warming up, or required settings are missing."}}
+)
+async def readiness():
+    if not warmup.is_ready():
+        return ORJSONResponse(warmup.get_stats(), status_code=503)
+    warmup.mark("first_ready_check")
+    return warmup.get_stats()
+
+
+@router.get(
+    "/api/upstreams",
+    summary="Upstream resilience state",
+    description="Reports circuit breaker state, bulkhead occupancy, retry budget and rejection counts for n8n, HeyGen and Gladia."
+)
+async def get_upstream_state():
+    return resilience.get_stats()
+
+
+@router.get(
+    "/api/admission",
+    summary="Admission control state",
+    description="Reports the interview start queue (length, estimated wait, active interviews, loop lag) and, for each rate limit, its configured rates, global tokens left and how many requests it allowed and denied per scope."
+)
+async def admission_stats():
+    return admission.get_stats()
+
+
+@router.get(
+    "/api/traces",
+    summary="Recent slow request traces",
+    description="Lists the slowest recent requests (over `TRACE_SLOW_THRESHOLD`) with their upstream and handler spans. Requires `TRACING_ENABLED` and the `X-Admin-Token` header.",
+    dependencies=[Depends(require_admin)],
+    responses=ADMIN_RESPONSES
+)
+async def get_traces():
+    return tracing.get_stats()
+
+
+@router.post(
+    "/api/admin/profile",
+    summary="Profile the event loop",
+    description="""Samples the live event loop's call stack for `seconds` (at most `PROFILE_MAX_SECONDS`) and returns the hottest functions.
+    `format=collapsed` returns folded stacks for flamegraph tools instead. Requires the `X-Admin-Token` header to match `ADMIN_TOKEN`.""",
+    dependencies=[Depends(require_admin)],
+    responses={
+        **ADMIN_RESPONSES,
+        409: {"description": "Another profile is already running."}
+    }
+)
+async def profile_event_loop(seconds: float = 5.0, format: str = "json"):
+    try:
+        profile = await tracing.profile_loop(seconds)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if format == "collapsed":
+        return PlainTextResponse(profile["collapsed"])
+    return profile
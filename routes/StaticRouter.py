@@ -1,9 +1,24 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 
+from assets import Asset, AssetPipeline, REVALIDATE
+
 router = APIRouter(tags=["Frontend"])
 templates = Jinja2Templates(directory="templates")
+assets = AssetPipeline("static")
+
+# The homepage has no per-request content, so it is rendered once at startup.
+_homepage: Asset = None
+
+
+def build_assets():
+    """Fingerprints and precompresses static/ and renders the homepage against it."""
+    global _homepage
+    assets.build()
+    html = templates.get_template("index.html").render(asset_url=assets.url)
+    _homepage = Asset("index.html", html.encode(), "text/html; charset=utf-8")
+
 
 @router.get(
     "/",
@@ -12,4 +27,20 @@ templates = Jinja2Templates(directory="templates")
     description="Serves the main `index.html` template which contains the frontend application."
 )
 async def get_homepage(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
\ No newline at end of file
+    if _homepage is None:
+        build_assets()
+    return _homepage.response(request, REVALIDATE)
+
+
+@router.api_route(
+    "/static/{path:path}",
+    methods=["GET", "HEAD"],
+    summary="Serve static assets",
+    description="Serves files from `static/`. Fingerprinted URLs (`name.<hash>.ext`) are cacheable forever; every response is precompressed and supports ETag revalidation.",
+    include_in_schema=False
+)
+async def get_static_asset(path: str, request: Request):
+    response = assets.response(path, request)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return response
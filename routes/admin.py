@@ -0,0 +1,20 @@
+import secrets
+
+from fastapi import Header, HTTPException
+
+from settings import settings
+
+# Admin endpoints are disabled unless ADMIN_TOKEN is set.
+ADMIN_TOKEN = settings.admin_token
+
+ADMIN_RESPONSES = {403: {"description": "Missing or wrong admin token, or `ADMIN_TOKEN` is not configured."}}
+
+
+def require_admin(x_admin_token: str = Header(default="")):
+    """Dependency for endpoints that expose per-session data or control the process.
+
+    Session IDs are the only credential for the interview socket, so anything
+    that lists them must not be public.
+    """
+    if not ADMIN_TOKEN or not secrets.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required.")
@@ -1,7 +1,7 @@
 # schemas.py
 
 from pydantic import BaseModel, Field
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 # ===================================================================
 # Generic Schemas
@@ -24,6 +24,20 @@ class StartInterviewResponse(BaseModel):
     sessionId: str = Field(..., example="session_abc123", description="The unique session ID for this interview instance.")
     resumeUrl: str = Field(..., example="https://example.com/resumes/doc.pdf", description="A URL to the candidate's resume.")
 
+class StartInterviewAcceptedResponse(BaseModel):
+    handle: str = Field(..., example="3f2b9c1e8a7d4b6f9e0a1c2d3e4f5a6b", description="Pending session handle; the real session ID arrives once n8n answers.")
+    status: str = Field("pending", example="pending")
+    statusUrl: str = Field(..., example="/api/interview/start/3f2b9c1e8a7d4b6f9e0a1c2d3e4f5a6b", description="Poll this URL if the WebSocket is not available.")
+    socketUrl: str = Field(..., example="/ws/interview/3f2b9c1e8a7d4b6f9e0a1c2d3e4f5a6b/", description="Connect here to receive an `interview_started` message.")
+    queuePosition: int = Field(0, example=0, description="Place in the start queue; 0 when the start was admitted right away.")
+    estimatedWait: float = Field(0.0, example=0.0, description="Estimated seconds until the start is admitted.")
+
+class StartInterviewStatusResponse(BaseModel):
+    status: str = Field(..., example="ready", description="One of: pending, ready, failed.")
+    sessionId: Optional[str] = Field(None, example="session_abc123")
+    resumeUrl: Optional[str] = Field(None, example="https://example.com/resumes/doc.pdf")
+    detail: Optional[str] = Field(None, description="Why the start failed, when `status` is `failed`.")
+
 class SendQuestionRequest(BaseModel):
     sessionId: str = Field(..., example="session_abc123")
     question: str = Field(..., example="Can you tell me about a time you faced a challenge?")
@@ -31,6 +45,18 @@ class SendQuestionRequest(BaseModel):
 class EndInterviewRequest(BaseModel):
     sessionId: str = Field(..., example="session_abc123")
 
+class BatchSendQuestionsRequest(BaseModel):
+    items: List[SendQuestionRequest] = Field(..., description="Questions to push, at most one per session is typical.")
+
+class DeliveryResult(BaseModel):
+    sessionId: str = Field(..., example="session_abc123")
+    status: str = Field(..., example="delivered", description="One of: delivered, buffered (replayed when the client reconnects), no_connection, timeout, error.")
+
+class BatchSendQuestionsResponse(BaseModel):
+    delivered: int = Field(..., example=1)
+    failed: int = Field(..., example=0)
+    results: List[DeliveryResult]
+
 
 # ===================================================================
 # HeyGen Schemas
@@ -44,7 +70,7 @@ class HeyGenSessionRequest(BaseModel):
     session_id: str = Field(..., example="sid_xxxxxxxxxxxx", description="The unique ID of the active streaming session.")
 
 class HeyGenTaskRequest(BaseModel):
-    token: str = Field(..., example="tkn_xxxxxxxxxxxx")
+    token: Optional[str] = Field(None, example="tkn_xxxxxxxxxxxx")
     session_id: str = Field(..., example="sid_xxxxxxxxxxxx")
     task_type: str = Field("text", example="text", description="The type of task to perform.")
     text: str = Field(..., example="Hello, welcome to the interview.", description="The text for the avatar to speak.")
@@ -53,6 +79,21 @@ class HeyGenTaskResponse(BaseModel):
     status: str = "ok"
     heygen_status_code: int = Field(..., example=200)
 
+class HeyGenStreamTaskResponse(BaseModel):
+    status: str = "ok"
+    segments: int = Field(..., example=3, description="How many segments the text was split into.")
+    queued_segments: int = Field(..., example=2, description="Segments of this and earlier texts still waiting to be sent.")
+    first_segment_seconds: float = Field(..., example=0.21, description="Time until HeyGen accepted the first segment.")
+    first_task: Optional[Dict[str, Any]] = Field(None, description="HeyGen's response data for the first segment.")
+
+class HeyGenInterruptRequest(BaseModel):
+    token: Optional[str] = Field(None, example="tkn_xxxxxxxxxxxx")
+    session_id: str = Field(..., example="sid_xxxxxxxxxxxx")
+
+class HeyGenInterruptResponse(BaseModel):
+    status: str = "ok"
+    cancelled_segments: int = Field(..., example=2, description="Queued segments dropped before they were sent.")
+
 class HeyGenSuccessData(BaseModel):
     # This schema can be expanded as you discover more fields from HeyGen
     session_id: Optional[str] = Field(None, example="sid_xxxxxxxxxxxx")
@@ -62,6 +103,18 @@ class HeyGenSuccessResponse(BaseModel):
     data: Optional[HeyGenSuccessData] = None
     error: Any = None # Can be null or an object
 
+class HeyGenPoolStats(BaseModel):
+    enabled: bool
+    size: int = Field(0, description="Number of sessions the pool keeps warm.")
+    ready: int = Field(0, description="Sessions currently ready to hand out.")
+    hits: int = 0
+    misses: int = 0
+    refills: int = 0
+    refill_failures: int = 0
+    retired: int = Field(0, description="Pooled sessions stopped before HeyGen's idle timeout.")
+    last_refill_seconds: float = 0.0
+    avg_refill_seconds: float = 0.0
+
 # ===================================================================
 # Gladia Schemas
 # ===================================================================
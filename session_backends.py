@@ -0,0 +1,224 @@
+import asyncio
+import uuid
+from typing import Awaitable, Callable, Optional, Set
+
+from codec import encode, decode
+from session_registry import SessionRegistry, SESSION_TTL
+from settings import settings
+
+# "memory" keeps everything in this process. "redis" keeps session data and
+# replayable state outside it and routes WebSocket messages between processes,
+# so interviews survive a redeploy: they resume on the new instance while the
+# old one drains, and questions sent to either reach the socket.
+#
+# Only sessions move between processes. Everything else is per process, which
+# is correct for that hand-over but not for several processes serving at once,
+# so the Dockerfile runs a single worker:
+#   - HeyGen token cache and session pool: each instance uses its own tokens
+#     and stops its pooled sessions when it shuts down.
+#   - HeyGen tracker: a resumed socket re-sends its avatar session, which the
+#     new instance adopts; the bound marker in the store keeps the instance
+#     that created it from reaping it as unbound.
+#   - Avatar speech queues: a client's speech goes to the instance it is
+#     talking to, in order, and an idle queue holds nothing worth moving.
+#   - Start coalescing, admission buckets and the start queue: each instance
+#     enforces its own limits, so they are briefly looser during the overlap.
+#     With several workers they would be multiplied, and speech for one avatar
+#     could be sent out of order; that is why there is only one.
+SESSION_BACKEND = settings.session_backend
+REDIS_URL = settings.redis_url
+
+KEY_PREFIX = "interview:session:"
+CHANNEL_PREFIX = "interview:ws:"
+# Backoff while the message bus reconnects to Redis.
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+
+# Delivers a message to a socket held by this worker; returns None when it is not held here.
+Deliver = Callable[[str, dict], Awaitable[Optional[str]]]
+
+
+# ===================================================================
+# Session stores
+# ===================================================================
+
+class MemorySessionStore:
+    """Keeps session data on the process-local registry records, so it expires with them."""
+
+    def __init__(self, registry: SessionRegistry):
+        self._registry = registry
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        return self._registry.get_data(session_id)
+
+    async def set(self, session_id: str, data: dict):
+        self._registry.set_data(session_id, data)
+
+    async def delete(self, session_id: str):
+        self._registry.clear_data(session_id)
+
+    async def close(self):
+        pass
+
+
+class RedisSessionStore:
+    def __init__(self, redis):
+        self._redis = redis
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        raw = await self._redis.get(KEY_PREFIX + session_id)
+        return decode(raw) if raw else None
+
+    async def set(self, session_id: str, data: dict):
+        await self._redis.set(KEY_PREFIX + session_id, encode(data), ex=int(SESSION_TTL))
+
+    async def delete(self, session_id: str):
+        await self._redis.delete(KEY_PREFIX + session_id)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+# ===================================================================
+# Message buses
+# ===================================================================
+
+class LocalMessageBus:
+    """Single-process bus: a message can only be delivered to a socket held here.
+
+    route_message already tried this worker before publishing, so there is
+    nowhere else to send it.
+    """
+
+    async def start(self, deliver: Deliver):
+        pass
+
+    async def subscribe(self, session_id: str):
+        pass
+
+    async def unsubscribe(self, session_id: str):
+        pass
+
+    async def publish(self, session_id: str, message: dict) -> bool:
+        return False
+
+    async def stop(self):
+        pass
+
+
+class RedisMessageBus:
+    """Routes messages through one Redis pub/sub channel per connected session.
+
+    The worker holding a session's socket subscribes to its channel, so a
+    publish from any worker reaches it; PUBLISH returns how many workers
+    received the message, which tells the caller whether it was delivered.
+    If the connection to Redis drops, the listener reconnects with backoff and
+    subscribes to every held session again. Messages published meanwhile
+    reach no one, so their senders buffer them for the client's resume.
+    """
+
+    def __init__(self, redis):
+        self._redis = redis
+        self._pubsub = None
+        self._task = None
+        self._sessions: Set[str] = set()
+        self.reconnects = 0
+        # Every bus needs at least one subscription before it can listen.
+        self._control_channel = f"{CHANNEL_PREFIX}worker:{uuid.uuid4().hex}"
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+        await self._connect()
+        self._task = asyncio.create_task(self._listen_forever())
+
+    async def _connect(self):
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self._control_channel, *(CHANNEL_PREFIX + session_id for session_id in self._sessions))
+        self._pubsub = pubsub
+
+    async def _disconnect(self):
+        pubsub, self._pubsub = self._pubsub, None
+        if pubsub is not None:
+            try:
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+    async def _listen_forever(self):
+        delay = RECONNECT_DELAY
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._connect()
+                    self.reconnects += 1
+                    print(f"Redis message bus reconnected; resubscribed {len(self._sessions)} session(s)")
+                delay = RECONNECT_DELAY
+                await self._listen()
+                print("ERROR: Redis message bus subscription ended; reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"ERROR: Redis message bus lost its connection ({e}); reconnecting in {delay:.1f}s")
+            await self._disconnect()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+    async def _listen(self):
+        async for item in self._pubsub.listen():
+            if item["type"] != "message":
+                continue
+            channel = item["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            if channel == self._control_channel:
+                continue
+            session_id = channel[len(CHANNEL_PREFIX):]
+            try:
+                await self._deliver(session_id, decode(item["data"]))
+            except Exception as e:
+                print(f"Error delivering routed message to session '{session_id}': {e}")
+
+    async def subscribe(self, session_id: str):
+        self._sessions.add(session_id)
+        await self._call_pubsub("subscribe", session_id)
+
+    async def unsubscribe(self, session_id: str):
+        self._sessions.discard(session_id)
+        await self._call_pubsub("unsubscribe", session_id)
+
+    async def _call_pubsub(self, method: str, session_id: str):
+        # While disconnected the listener resubscribes from self._sessions.
+        if self._pubsub is None:
+            return
+        try:
+            await getattr(self._pubsub, method)(CHANNEL_PREFIX + session_id)
+        except Exception as e:
+            print(f"ERROR: Could not {method} session '{session_id}' on the Redis message bus: {e}")
+
+    async def publish(self, session_id: str, message: dict) -> bool:
+        receivers = await self._redis.publish(CHANNEL_PREFIX + session_id, encode(message))
+        return receivers > 0
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._disconnect()
+
+
+def create_backends(registry: SessionRegistry):
+    """Returns the (session store, message bus) pair selected by SESSION_BACKEND."""
+    if SESSION_BACKEND == "memory":
+        return MemorySessionStore(registry), LocalMessageBus()
+    if SESSION_BACKEND == "redis":
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package to be installed.")
+        redis = aioredis.from_url(REDIS_URL)
+        return RedisSessionStore(redis), RedisMessageBus(redis)
+    raise RuntimeError(f"Unknown SESSION_BACKEND '{SESSION_BACKEND}'; expected 'memory' or 'redis'.")
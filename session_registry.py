@@ -0,0 +1,258 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from fastapi import WebSocket
+
+from settings import settings
+
+SESSION_TTL = settings.session_ttl
+SESSION_MAX = settings.session_max
+SWEEP_INTERVAL = settings.session_sweep_interval
+# Sequenced messages kept per session until the client acknowledges them.
+REPLAY_BUFFER_SIZE = settings.ws_replay_buffer_size
+
+
+class SessionRecord:
+    """Everything the server keeps for one interview session."""
+
+    __slots__ = ("session_id", "data", "websocket", "writer", "last_active", "alive", "seq", "replay")
+
+    def __init__(self, session_id: str, now: float):
+        self.session_id = session_id
+        self.data: Optional[dict] = None
+        self.websocket: Optional[WebSocket] = None
+        self.writer = None  # ConnectionWriter sending to `websocket`
+        self.last_active = now
+        self.alive = True
+        self.seq = 0
+        self.replay: Optional[Deque[dict]] = None  # created on the first sequenced message
+
+
+class SessionRegistry:
+    """Per-process session records with idle expiry and a hard size cap.
+
+    Each record has exactly one entry in a min-heap keyed by the deadline it
+    was scheduled with. Activity only bumps `last_active`; the sweeper pops
+    due entries and either evicts the record or reschedules it at its real
+    deadline, so a sweep costs O(k log n) for k due entries instead of a full
+    scan.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL, max_sessions: int = SESSION_MAX,
+                 replay_size: int = REPLAY_BUFFER_SIZE):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.replay_size = replay_size
+        self._records: Dict[str, SessionRecord] = {}
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._records
+
+    def get(self, session_id: str) -> Optional[SessionRecord]:
+        return self._records.get(session_id)
+
+    def touch(self, session_id: str):
+        record = self._records.get(session_id)
+        if record is not None:
+            record.last_active = time.monotonic()
+
+    def get_data(self, session_id: str) -> Optional[dict]:
+        record = self._records.get(session_id)
+        return record.data if record is not None else None
+
+    def set_data(self, session_id: str, data: dict):
+        record = self._ensure(session_id)
+        record.data = data
+        record.last_active = time.monotonic()
+
+    def clear_data(self, session_id: str):
+        record = self._records.get(session_id)
+        if record is not None:
+            record.data = None
+            if record.websocket is None:
+                self._drop(record)
+
+    def websocket(self, session_id: str) -> Optional[WebSocket]:
+        record = self._records.get(session_id)
+        return record.websocket if record is not None else None
+
+    def writer(self, session_id: str):
+        record = self._records.get(session_id)
+        return record.writer if record is not None else None
+
+    def attach(self, session_id: str, websocket: WebSocket, writer=None):
+        record = self._ensure(session_id)
+        record.websocket = websocket
+        record.writer = writer
+        record.last_active = time.monotonic()
+
+    def detach(self, session_id: str, websocket: Optional[WebSocket] = None) -> bool:
+        """Forgets the session's socket; ignores a stale socket replaced by a reconnect."""
+        record = self._records.get(session_id)
+        if record is None or record.websocket is None:
+            return False
+        if websocket is not None and record.websocket is not websocket:
+            return False
+        record.websocket = None
+        record.writer = None
+        # A numbered session stays until its TTL so the client can resume it.
+        if record.data is None and not record.seq:
+            self._drop(record)
+        return True
+
+    def sequence(self, session_id: str, message: dict) -> dict:
+        """Numbers a message for the session and keeps it for replay until acknowledged."""
+        record = self._ensure(session_id)
+        record.seq += 1
+        sequenced = {**message, "seq": record.seq}
+        if record.replay is None:
+            record.replay = deque(maxlen=self.replay_size)
+        record.replay.append(sequenced)
+        return sequenced
+
+    def ack(self, session_id: str, seq: int):
+        record = self._records.get(session_id)
+        if record is None or not record.replay:
+            return
+        while record.replay and record.replay[0]["seq"] <= seq:
+            record.replay.popleft()
+
+    def replay_after(self, session_id: str, last_seq: Optional[int]) -> Optional[List[dict]]:
+        """Messages the client has not seen yet, oldest first.
+
+        Returns None when some of them were already pushed out of the bounded
+        buffer, i.e. the session cannot be resumed without losing messages.
+        """
+        record = self._records.get(session_id)
+        if record is None:
+            return []
+        if last_seq is None:
+            return list(record.replay or ())
+        if last_seq > record.seq:
+            # The client was numbered by another process (e.g. before a
+            # redeploy); nothing buffered here has reached it, so continue
+            # its numbering.
+            offset = last_seq - (record.replay[0]["seq"] - 1 if record.replay else record.seq)
+            if record.replay:
+                record.replay = deque(({**message, "seq": message["seq"] + offset} for message in record.replay),
+                                      maxlen=self.replay_size)
+            record.seq += offset
+            return list(record.replay or ())
+        self.ack(session_id, last_seq)
+        pending = list(record.replay or ())
+        first = pending[0]["seq"] if pending else record.seq + 1
+        if first > last_seq + 1:
+            return None
+        return pending
+
+    def connected(self) -> List[SessionRecord]:
+        return [record for record in self._records.values() if record.writer is not None]
+
+    def connected_count(self) -> int:
+        return sum(1 for record in self._records.values() if record.websocket is not None)
+
+    def _ensure(self, session_id: str) -> SessionRecord:
+        record = self._records.get(session_id)
+        if record is not None:
+            return record
+        while len(self._records) >= self.max_sessions and self._heap:
+            oldest = self._pop_oldest()
+            if oldest is not None:
+                self.evicted_capacity += 1
+                self._evict(oldest)
+        now = time.monotonic()
+        record = self._records[session_id] = SessionRecord(session_id, now)
+        heapq.heappush(self._heap, (now + self.ttl, next(self._counter), record))
+        return record
+
+    def _pop_oldest(self) -> Optional[SessionRecord]:
+        while self._heap:
+            deadline, _, record = heapq.heappop(self._heap)
+            if not record.alive:
+                continue
+            actual = record.last_active + self.ttl
+            if actual > deadline:
+                heapq.heappush(self._heap, (actual, next(self._counter), record))
+                continue
+            return record
+        return None
+
+    def _drop(self, record: SessionRecord):
+        # The heap entry is discarded lazily once `alive` is False.
+        record.alive = False
+        record.data = None
+        self._records.pop(record.session_id, None)
+
+    def _evict(self, record: SessionRecord):
+        websocket, writer = record.websocket, record.writer
+        record.websocket = record.writer = None
+        self._drop(record)
+        if writer is not None:
+            asyncio.get_running_loop().create_task(writer.abort(code=1001))
+        elif websocket is not None:
+            asyncio.get_running_loop().create_task(self._close(record.session_id, websocket))
+
+    async def _close(self, session_id: str, websocket: WebSocket):
+        try:
+            await websocket.close(code=1001)
+        except Exception as e:
+            print(f"Error closing evicted WebSocket for session {session_id}: {e}")
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Evicts every session idle for longer than the TTL; returns how many."""
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, record = heapq.heappop(self._heap)
+            if not record.alive:
+                continue
+            actual = record.last_active + self.ttl
+            if actual > now:
+                heapq.heappush(self._heap, (actual, next(self._counter), record))
+                continue
+            self._evict(record)
+            evicted += 1
+        if evicted:
+            self.evicted_idle += evicted
+            print(f"Session sweep evicted {evicted} idle sessions; {len(self._records)} remain.")
+        return evicted
+
+    async def _sweep_forever(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            self.sweep()
+
+    def start_sweeper(self, interval: float = SWEEP_INTERVAL):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever(interval))
+
+    async def stop_sweeper(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._records),
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl,
+            "scheduled": len(self._heap),
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+        }
@@ -0,0 +1,205 @@
+import re
+from typing import List, Literal, Optional
+from urllib.parse import urlsplit
+
+from pydantic import field_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """Service configuration, read once from the environment and `.env`.
+
+    Field names are the environment variable names, lowercased. A malformed
+    value (e.g. HEYGEN_POOL_SIZE=abc) fails at import; required values that are
+    unset are reported by `missing()` at startup and keep /readyz failing.
+    """
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    # --- n8n ---
+    n8n_start_interview_url: Optional[str] = None
+    # Overall budget for the n8n start workflow, including time spent queued for a slot.
+    n8n_start_deadline: float = 90.0
+    batch_send_concurrency: int = 50
+    booking_code_pattern: str = r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$"
+    start_cache_ttl: float = 600.0
+    start_negative_cache_ttl: float = 5.0
+    start_cache_max: int = 10000
+    # Answers waiting per session for the n8n forwarder (see answer_forwarder.py).
+    n8n_forward_queue_size: int = 16
+    n8n_forward_policy: Literal["block", "drop_oldest", "drop_newest"] = "block"
+    n8n_forward_retries: int = 3
+    n8n_forward_backoff: float = 0.5
+    n8n_forward_flush_timeout: float = 10.0
+
+    # --- HeyGen ---
+    heygen_api_key: Optional[str] = None
+    heygen_server_url: Optional[str] = None
+    avatar_name: Optional[str] = None
+    heygen_token_ttl: float = 600.0
+    heygen_pool_size: int = 0
+    heygen_pool_retire_margin: float = 30.0
+    heygen_initiate_deadline: float = 30.0
+    # Stop an interview's HeyGen session this long after its socket closed.
+    heygen_reap_grace: float = 15.0
+    # Stop sessions never bound to an interview socket after this long; 0 disables.
+    heygen_unbound_ttl: float = 180.0
+    heygen_reap_concurrency: int = 4
+    # Avatar speech segmenting (see avatar_speech.py).
+    heygen_segment_max_chars: int = 160
+    heygen_segment_min_chars: int = 24
+
+    # --- Gladia ---
+    gladia_api_key: Optional[str] = None
+    gladia_api_url: str = "https://api.gladia.io/v2/live"
+    audio_relay_batch_bytes: int = 6400
+    audio_relay_batch_interval: float = 0.1
+    audio_relay_drain_timeout: float = 5.0
+
+    # --- Interview sockets and sessions ---
+    session_backend: Literal["memory", "redis"] = "memory"
+    redis_url: str = "redis://localhost:6379/0"
+    session_ttl: float = 3600.0
+    session_max: int = 10000
+    session_sweep_interval: float = 30.0
+    ws_replay_buffer_size: int = 64
+    ws_writer_queue_size: int = 32
+    ws_slow_consumer_policy: Literal["drop_oldest", "coalesce", "disconnect"] = "drop_oldest"
+    ws_send_timeout: float = 5.0
+    ws_drain_timeout: float = 5.0
+    # Answer fragments are joined until the candidate is quiet (see answer_aggregator.py).
+    answer_quiet_window: float = 2.0
+    answer_max_chars: int = 4000
+    answer_max_hold: float = 60.0
+
+    # --- Upstream connection pools and resilience (see upstream.py, resilience.py) ---
+    upstream_http2: bool = False
+    n8n_max_connections: int = 100
+    n8n_max_keepalive: int = 20
+    n8n_keepalive_expiry: float = 30.0
+    n8n_timeout: float = 30.0
+    n8n_connect_timeout: float = 5.0
+    n8n_max_concurrency: int = 50
+    n8n_bulkhead_wait: float = 1.0
+    n8n_max_retries: int = 2
+    n8n_retry_backoff: float = 0.2
+    n8n_breaker_failures: int = 5
+    n8n_breaker_reset: float = 10.0
+    n8n_retry_ratio: float = 0.2
+    n8n_retry_min: float = 10.0
+    heygen_max_connections: int = 100
+    heygen_max_keepalive: int = 20
+    heygen_keepalive_expiry: float = 30.0
+    heygen_timeout: float = 30.0
+    heygen_connect_timeout: float = 5.0
+    heygen_max_concurrency: int = 50
+    heygen_bulkhead_wait: float = 1.0
+    heygen_max_retries: int = 2
+    heygen_retry_backoff: float = 0.2
+    heygen_breaker_failures: int = 5
+    heygen_breaker_reset: float = 10.0
+    heygen_retry_ratio: float = 0.2
+    heygen_retry_min: float = 10.0
+    gladia_max_connections: int = 100
+    gladia_max_keepalive: int = 20
+    gladia_keepalive_expiry: float = 30.0
+    gladia_timeout: float = 15.0
+    gladia_connect_timeout: float = 5.0
+    gladia_max_concurrency: int = 50
+    gladia_bulkhead_wait: float = 1.0
+    gladia_max_retries: int = 2
+    gladia_retry_backoff: float = 0.2
+    gladia_breaker_failures: int = 5
+    gladia_breaker_reset: float = 10.0
+    gladia_retry_ratio: float = 0.2
+    gladia_retry_min: float = 10.0
+
+    # --- Tracing (see tracing.py) ---
+    tracing_enabled: bool = False
+    # Requests slower than this are kept in the slow-trace ring buffer.
+    trace_slow_threshold: float = 1.0
+    trace_buffer_size: int = 100
+    profile_interval: float = 0.005
+    profile_max_seconds: float = 60.0
+
+    # --- Admission control (see admission.py) ---
+    # Limits are "rate/burst" (tokens per second / bucket size); "0" disables one.
+    admission_start_client: str = "0.1/5"
+    admission_start_global: str = "2/10"
+    admission_heygen_client: str = "0.1/5"
+    admission_heygen_global: str = "2/10"
+    admission_gladia_client: str = "0.1/5"
+    admission_gladia_session: str = "0.05/5"
+    admission_gladia_global: str = "5/20"
+    admission_answer_session: str = "2/20"
+    admission_answer_global: str = "200/400"
+    admission_max_keys: int = 10000
+    # Share of each global bucket only requests from running interviews may use.
+    admission_reserve: float = 0.2
+    # Behind CapRover's nginx the client is the last X-Forwarded-For entry.
+    admission_trust_forwarded: bool = True
+    admission_max_active_interviews: int = 0
+    admission_start_max_wait: float = 30.0
+    admission_start_max_queue: int = 100
+    # New starts wait while the event loop is this late (seconds); 0 disables.
+    admission_start_max_loop_lag: float = 0.25
+
+    # --- Operations ---
+    admin_token: Optional[str] = None
+    # Resolve upstream hosts and open pooled connections before reporting ready.
+    startup_warmup: bool = True
+    startup_warmup_timeout: float = 10.0
+    # Connections opened per upstream during warm-up.
+    startup_warmup_connections: int = 2
+    # Refuse to start (instead of only failing /readyz) when required settings are missing.
+    strict_settings: bool = False
+
+    @field_validator("n8n_start_interview_url", "heygen_server_url", "gladia_api_url")
+    @classmethod
+    def _http_url(cls, value: Optional[str]) -> Optional[str]:
+        if value and urlsplit(value).scheme not in ("http", "https"):
+            raise ValueError("must be an http:// or https:// URL")
+        return value.rstrip("/") if value else value
+
+    @field_validator("admission_start_client", "admission_start_global", "admission_heygen_client",
+                     "admission_heygen_global", "admission_gladia_client", "admission_gladia_session",
+                     "admission_gladia_global", "admission_answer_session", "admission_answer_global")
+    @classmethod
+    def _rate_limit(cls, value: str) -> str:
+        value = value.strip()
+        if value in ("", "0", "off"):
+            return "0"
+        rate, _, burst = value.partition("/")
+        try:
+            if float(rate) <= 0 or float(burst or rate) < 1:
+                raise ValueError
+        except ValueError:
+            raise ValueError('must be "rate/burst" with rate > 0 and burst >= 1, or "0" to disable')
+        return value
+
+    @field_validator("n8n_forward_policy", "session_backend", "ws_slow_consumer_policy", mode="before")
+    @classmethod
+    def _lowercase(cls, value):
+        return value.lower() if isinstance(value, str) else value
+
+    @field_validator("booking_code_pattern")
+    @classmethod
+    def _regex(cls, value: str) -> str:
+        try:
+            re.compile(value)
+        except re.error as e:
+            raise ValueError(f"is not a valid regular expression: {e}")
+        return value
+
+    def upstream(self, name: str, setting: str):
+        """A per-upstream setting, e.g. upstream("heygen", "max_concurrency") is HEYGEN_MAX_CONCURRENCY."""
+        return getattr(self, f"{name}_{setting}")
+
+    def missing(self) -> List[str]:
+        """Environment variables the interview flow cannot work without."""
+        required = ("n8n_start_interview_url", "heygen_api_key", "heygen_server_url", "avatar_name",
+                    "gladia_api_key")
+        return [name.upper() for name in required if not getattr(self, name)]
+
+
+settings = Settings()
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple, Type
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one and caches the outcome.
+
+    While a call for a key is running, later callers await the same task
+    instead of starting their own. Results are cached for `ttl` seconds and
+    failures for `negative_ttl` seconds, in an LRU bounded to `max_entries`.
+    Errors of the `uncached` types are passed on without being cached.
+    The shared task is shielded, so one caller going away (e.g. a client
+    disconnect) does not cancel it for the others.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_entries: int,
+                 uncached: Tuple[Type[BaseException], ...] = ()):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.uncached = uncached
+        self.max_entries = max_entries
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # key -> (expires_at, result, error)
+        self._cache: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.calls = 0
+        self.coalesced = 0
+        self.hits = 0
+        self.negative_hits = 0
+
+    def _cached(self, key: Hashable) -> Optional[tuple]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry
+
+    def _store(self, key: Hashable, result: Any, error: Optional[BaseException]):
+        ttl = self.negative_ttl if error is not None else self.ttl
+        if ttl <= 0:
+            return
+        self._cache[key] = (time.monotonic() + ttl, result, error)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def _call(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if not isinstance(e, self.uncached):
+                self._store(key, None, e)
+            raise
+        else:
+            self._store(key, result, None)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._cached(key)
+        if entry is not None:
+            _, result, error = entry
+            if error is not None:
+                self.negative_hits += 1
+                raise error
+            self.hits += 1
+            return result
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = self._inflight[key] = asyncio.create_task(self._call(key, fn))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def forget(self, key: Hashable):
+        """Drops a cached outcome, e.g. once the session it describes has ended."""
+        self._cache.pop(key, None)
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._cache),
+            "in_flight": len(self._inflight),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "negative_ttl_seconds": self.negative_ttl,
+            "upstream_calls": self.calls,
+            "coalesced": self.coalesced,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+        }
@@ -4,6 +4,9 @@
 let isUserTurn = false;
 let gladiaSocket = null;
 let controlSocket = null;
+let lastSeq = null; // Highest server message seq handled, sent back as ?last_seq= on reconnect.
+let reconnectAttempts = 0;
+let interviewEnded = false;
 let audioProcessor = {};
 let sessionId = null;
 let interviewTimer = null;
@@ -47,51 +50,109 @@ async function startInterview(event) {
         return;
     }
 
-    await startGladiaConnection();
-
-    // startFormContainer.style.display = 'none';
-    // chatContainer.style.display = 'flex';
-    //
-    // try {
-    //     console.log("LOG: Starting interview process...");
-    //     statusText.innerText = "Initializing session with server...";
-    //
-    //     initializeUserCamera();
-    //     startInterviewTimer(10);
-    //
-    //     const response = await fetch('/api/interview/start', {
-    //         method: 'POST',
-    //         headers: { 'Content-Type': 'application/json' },
-    //         body: JSON.stringify({ fullName, email, booking_code })
-    //     });
-    //
-    //     if (!response.ok) {
-    //         const errorData = await response.json();
-    //         throw new Error(errorData.error || 'Failed to start interview session.');
-    //     }
-    //     const data = await response.json();
-    //     sessionId = data.sessionId;
-    //     console.log(`LOG: Session ID received: ${sessionId}`);
-    //
-    //     // connectToBackendControlSocket();
-    //
-    //     // This is now UNCOMMENTED to activate the avatar
-    //     // await initializeHeyGenAvatar();
-    //
-    //     await startGladiaConnection();
-    //
-    //     statusText.innerText = "Waiting for first question...";
-    //     console.log("LOG: Initial setup complete. Waiting for first question from backend.");
-    //
-    // } catch (error) {
-    //     console.error("Error starting interview:", error);
-    //     statusText.innerText = `Error: ${error.message}`;
-    //     updateAvatarStatus('disconnected', 'Connection Failed');
-    // }
+    startFormContainer.style.display = 'none';
+    chatContainer.style.display = 'flex';
+
+    try {
+        console.log("LOG: Starting interview process...");
+        statusText.innerText = "Initializing session with server...";
+
+        initializeUserCamera();
+        startInterviewTimer(10);
+
+        // Returns immediately; the n8n workflow runs on the server meanwhile.
+        const response = await fetch('/api/interview/start_async', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ fullName, email, booking_code })
+        });
+
+        if (!response.ok) {
+            const errorData = await response.json();
+            throw new Error(errorData.detail || 'Failed to start interview session.');
+        }
+        const pending = await response.json();
+        if (pending.queuePosition > 0) {
+            statusText.innerText = `The server is busy; starting in about ${Math.ceil(pending.estimatedWait)} seconds...`;
+        }
+
+        // Avatar and microphone setup do not depend on the session ID.
+        const [session] = await Promise.all([
+            waitForSession(pending),
+            initializeHeyGenAvatar(),
+            navigator.mediaDevices.getUserMedia({ audio: true, video: false }),
+        ]);
+        sessionId = session.sessionId;
+        console.log(`LOG: Session ID received: ${sessionId}`);
+
+        connectToBackendControlSocket();
+        await startGladiaConnection();
+
+        statusText.innerText = "Waiting for first question...";
+        console.log("LOG: Initial setup complete. Waiting for first question from backend.");
+
+    } catch (error) {
+        console.error("Error starting interview:", error);
+        statusText.innerText = `Error: ${error.message}`;
+        updateAvatarStatus('disconnected', 'Connection Failed');
+    }
+}
+
+// Resolves with {sessionId, resumeUrl} once the server pushes `interview_started`
+// on the pending handle's socket, polling `statusUrl` if the socket fails or
+// closes first (e.g. 1012 while the server restarts, 1001 on eviction).
+function waitForSession(pending) {
+    return new Promise((resolve, reject) => {
+        let settled = false;
+        let polling = false;
+        const settle = (result) => {
+            if (settled) return;
+            if (result.status === 'ready') {
+                settled = true;
+                resolve(result);
+            } else if (result.status === 'failed') {
+                settled = true;
+                reject(new Error(result.detail || 'Failed to start interview session.'));
+            }
+            if (settled) socket.close();
+        };
+        const poll = async () => {
+            while (!settled) {
+                const response = await fetch(pending.statusUrl);
+                if (response.status === 404) {
+                    settled = true;
+                    reject(new Error('The interview start expired; please try again.'));
+                    return;
+                }
+                if (response.ok) settle(await response.json());
+                if (!settled) await sleep(2000);
+            }
+        };
+        // onerror is followed by onclose; poll once for both.
+        const fallBackToPolling = () => {
+            if (settled || polling) return;
+            polling = true;
+            poll().catch((error) => {
+                settled = true;
+                reject(error);
+            });
+        };
+
+        const socket = new WebSocket('ws://' + window.location.host + pending.socketUrl);
+        socket.onmessage = (event) => {
+            const command = JSON.parse(event.data);
+            if (command.type === 'interview_started' || command.type === 'interview_start_failed') {
+                settle(command.payload);
+            }
+        };
+        socket.onerror = fallBackToPolling;
+        socket.onclose = fallBackToPolling;
+    });
 }
 
 function endInterview() {
     console.log("LOG: Ending the interview.");
+    interviewEnded = true;
     clearInterval(interviewTimer);
     stopGladiaConnection();
     closeHeyGenSession();
@@ -125,7 +186,8 @@ async function createHeyGenSession() {
     // Call our backend proxy
     const response = await fetch(`/api/heygen/new_session`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        // Lets the server admit avatars of running interviews ahead of new ones.
+        headers: { "Content-Type": "application/json", ...(sessionId ? { "X-Interview-Session": sessionId } : {}) },
         body: JSON.stringify({ token: heygenSessionToken }),
     });
 
@@ -208,10 +270,12 @@ async function sendTextToAvatar(text, taskType = "talk") {
 
     try {
         console.log(`LOG: Sending task '${taskType}' to proxy with text: "${text}"`);
-        const response = await fetch('/api/heygen/task', {
+        // Streamed sentence by sentence; resolves once the first one is queued.
+        const response = await fetch('/api/heygen/task/stream', {
             method: "POST",
             headers: { "Content-Type": "application/json" },
             body: JSON.stringify({
+                token: heygenSessionToken,
                 session_id: heygenSessionInfo.session_id,
                 text: text,
                 task_type: taskType,
@@ -220,7 +284,7 @@ async function sendTextToAvatar(text, taskType = "talk") {
 
         if (!response.ok) {
             const errorData = await response.json();
-            console.error(`Error sending task via proxy: ${errorData.message || response.statusText}`);
+            console.error(`Error sending task via proxy: ${errorData.detail || response.statusText}`);
         }
     } catch (error) {
         console.error("Error sending text to avatar via proxy:", error);
@@ -275,20 +339,35 @@ async function initializeHeyGenAvatar() {
 // --- 4. FASTAPI BACKEND COMMUNICATION ---
 function connectToBackendControlSocket() {
     statusText.innerText = "Connecting to interview server...";
-    const controlWsUrl = 'ws://' + window.location.host + '/ws/interview/' + sessionId + '/';
+    const resume = lastSeq === null ? '' : '?last_seq=' + lastSeq;
+    const controlWsUrl = 'ws://' + window.location.host + '/ws/interview/' + sessionId + '/' + resume;
     controlSocket = new WebSocket(controlWsUrl);
 
     controlSocket.onopen = () => {
         console.log("LOG: Control Socket to FastAPI backend connected.");
-        showAiLoadingBubble();
+        if (lastSeq === null) showAiLoadingBubble();
+        reconnectAttempts = 0;
+        // Lets the server stop the avatar session if this tab goes away.
+        if (heygenSessionInfo) {
+            controlSocket.send(JSON.stringify({
+                type: 'heygen_session',
+                payload: { session_id: heygenSessionInfo.session_id, token: heygenSessionToken }
+            }));
+        }
     };
     controlSocket.onmessage = async (event) => await onBackendMessage(event);
-    controlSocket.onclose = () => {
-        console.log("LOG: Control Socket to FastAPI backend closed.");
+    controlSocket.onclose = (event) => {
+        console.log(`LOG: Control Socket to FastAPI backend closed (code ${event.code}).`);
+        if (interviewEnded) return;
+        // Network blips and redeploys (1012) resume where we left off; the
+        // server replays every message after lastSeq.
+        const delay = Math.min(500 * 2 ** reconnectAttempts, 8000);
+        reconnectAttempts++;
+        statusText.innerText = "Reconnecting to interview server...";
+        setTimeout(connectToBackendControlSocket, delay);
     };
     controlSocket.onerror = (err) => {
         console.error("Control Socket error:", err);
-        statusText.innerText = "Connection error. Please refresh.";
     };
 }
 
@@ -296,6 +375,29 @@ async function onBackendMessage(event) {
     const command = JSON.parse(event.data);
     console.log("LOG: Received command from backend:", command);
 
+    if (command.seq !== undefined) {
+        // Replays after a reconnect can repeat messages we already handled.
+        if (lastSeq !== null && command.seq <= lastSeq) return;
+        lastSeq = command.seq;
+        controlSocket.send(JSON.stringify({ type: 'ack', seq: command.seq }));
+    }
+    if (command.type === 'rate_limited') {
+        // The server dropped an answer fragment sent too fast.
+        console.warn("Answer rate limited; retry after", command.payload.retry_after, "s");
+        return;
+    }
+    if (command.type === 'replay_gap') {
+        // Some messages were lost while disconnected; the newest ones follow.
+        console.warn("Missed server messages after seq", command.payload.last_seq);
+        return;
+    }
+
+    // Relayed Gladia events, see startGladiaConnection().
+    if (command.type === 'transcript' || command.type === 'speech_start' || command.type === 'speech_end') {
+        onGladiaMessage(command.payload);
+        return;
+    }
+
     removeLoadingBubble('ai-loading-bubble');
 
     if (command.type === 'new_question' && command.payload.text) {
@@ -326,22 +428,22 @@ async function onBackendMessage(event) {
     }
 }
 
-function submitTranscript(finalTranscript) {
-    statusText.innerText = "AI is thinking...";
-    showAiLoadingBubble();
-    console.log("LOG: Submitting answer to backend:", finalTranscript);
+function submitTranscript(fragment) {
+    console.log("LOG: Sending answer fragment to backend:", fragment);
 
     if (controlSocket && controlSocket.readyState === WebSocket.OPEN) {
+        // Every finished utterance is one fragment of the answer. The server
+        // joins them and forwards the answer once the candidate has been quiet
+        // for ANSWER_QUIET_WINDOW, so the turn stays open until the next question.
         controlSocket.send(JSON.stringify({
             type: 'user_answer',
-            payload: { answer: finalTranscript }
+            payload: { answer: fragment }
         }));
+        statusText.innerText = "Listening... pause when you have finished your answer.";
     } else {
         console.error("Cannot submit transcript, control socket is not open.");
         statusText.innerText = "Connection error. Please refresh.";
     }
-    isUserTurn = false;
-    console.log("LOG: Mic gate closed (isUserTurn=false). Waiting for next question.");
 }
 
 
@@ -379,39 +481,23 @@ function showAiLoadingBubble() {
 
 
 // --- 6. GLADIA TRANSCRIPTION LOGIC (PROXIED) ---
+// Raw PCM is sent as binary frames to our relay at /ws/audio/<sessionId>/, which
+// forwards it to Gladia. Transcripts come back over the control socket.
 async function startGladiaConnection() {
     try {
         audioProcessor.stream = await navigator.mediaDevices.getUserMedia({ audio: true, video: false });
 
-        // This is the complete configuration object, as you requested
-        const gladiaConfig = {
-            encoding: "wav/pcm",
-            sample_rate: 16000,
-            model: "solaria-1",
-            endpointing: 2,
-            language_config: {
-                languages: ["en", "id"],
-                code_switching: false,
-            },
-            maximum_duration_without_endpointing: 60,
-        };
-
-        const initResponse = await fetch("/api/gladia/init", {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify(gladiaConfig)
-        });
-
-        if (!initResponse.ok) throw new Error('Gladia API initialization via proxy failed.');
-        const initData = await initResponse.json();
-
-        gladiaSocket = new WebSocket(initData.url);
+        const audioWsUrl = 'ws://' + window.location.host + '/ws/audio/' + sessionId + '/';
+        gladiaSocket = new WebSocket(audioWsUrl);
+        gladiaSocket.binaryType = 'arraybuffer';
         gladiaSocket.onopen = () => processMicrophoneAudio();
-        gladiaSocket.onmessage = onGladiaMessage;
         gladiaSocket.onclose = (event) => {
-            console.log('LOG: Persistent Gladia socket closed.');
+            console.log('LOG: Audio relay socket closed.');
+            if (event.code === 1011) {
+                statusText.innerText = `Error: ${event.reason || 'transcription stopped'}`;
+            }
         };
-        gladiaSocket.onerror = (err) => console.error('Gladia socket error:', err);
+        gladiaSocket.onerror = (err) => console.error('Audio relay socket error:', err);
 
     } catch (err) {
         console.error("Gladia connection error:", err);
@@ -420,13 +506,7 @@ async function startGladiaConnection() {
     }
 }
 
-// Replace the existing onGladiaMessage function with this one
-
-// Replace the existing onGladiaMessage function with this one
-
-function onGladiaMessage(event) {
-    const data = JSON.parse(event.data);
-
+function onGladiaMessage(data) {
     // --- ADD THIS LINE FOR DEBUGGING ---
     console.log("GLADIA MESSAGE RECEIVED:", data);
     // --- END OF DEBUGGING CODE ---
@@ -437,14 +517,12 @@ function onGladiaMessage(event) {
 
     if (data.type === 'transcript' && data.data && data.data.is_final) {
         if (isUserTurn) {
-            // This line is still causing the error, which is expected for now.
             finalizeAndProceed(data.data.utterance.text);
         }
     }
 }
 
 function finalizeAndProceed(finalText) {
-    isUserTurn = false;
     removeLoadingBubble('user-loading-bubble');
 
     if (finalText && finalText.trim().length > 0) {
@@ -456,7 +534,7 @@ function finalizeAndProceed(finalText) {
 function stopGladiaConnection() {
     console.log("LOG: Stopping Gladia connection...");
     if (gladiaSocket && gladiaSocket.readyState === WebSocket.OPEN) {
-        gladiaSocket.send(JSON.stringify({ type: 'stop_recording' }));
+        // Closing the relay socket makes the server send stop_recording to Gladia.
         gladiaSocket.close();
     }
     if (audioProcessor.stream) {
@@ -473,6 +551,7 @@ function processMicrophoneAudio() {
     const source = audioProcessor.context.createMediaStreamSource(audioProcessor.stream);
     const bufferSize = 4096;
     audioProcessor.processor = audioProcessor.context.createScriptProcessor(bufferSize, 1, 1);
+    const silentChunk = new Int16Array(bufferSize);
 
     audioProcessor.processor.onaudioprocess = (e) => {
         if (isUserTurn) {
@@ -481,16 +560,12 @@ function processMicrophoneAudio() {
             for (let i = 0; i < inputData.length; i++) {
                 pcmData[i] = inputData[i] * 0x7FFF;
             }
-            const base64Data = btoa(String.fromCharCode.apply(null, new Uint8Array(pcmData.buffer)));
-
             if (gladiaSocket && gladiaSocket.readyState === WebSocket.OPEN) {
-                gladiaSocket.send(JSON.stringify({ type: 'audio_chunk', data: { chunk: base64Data } }));
+                gladiaSocket.send(pcmData.buffer);
             }
         } else {
-            const silentChunk = new Int16Array(bufferSize);
-            const base64Data = btoa(String.fromCharCode.apply(null, new Uint8Array(silentChunk.buffer)));
             if (gladiaSocket && gladiaSocket.readyState === WebSocket.OPEN) {
-                gladiaSocket.send(JSON.stringify({ type: 'audio_chunk', data: { chunk: base64Data } }));
+                gladiaSocket.send(silentChunk.buffer);
             }
         }
     };
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Upstreams are never reached by these tests; the settings only have to be present.
+os.environ.setdefault("N8N_START_INTERVIEW_URL", "http://127.0.0.1:9/n8n/start")
+os.environ.setdefault("HEYGEN_API_KEY", "test")
+os.environ.setdefault("HEYGEN_SERVER_URL", "http://127.0.0.1:9/heygen")
+os.environ.setdefault("AVATAR_NAME", "test")
+os.environ.setdefault("GLADIA_API_KEY", "test")
+os.environ.setdefault("GLADIA_API_URL", "http://127.0.0.1:9/gladia")
+os.environ.setdefault("STARTUP_WARMUP", "false")
+# Every TestClient request comes from the same address.
+os.environ.setdefault("ADMISSION_START_CLIENT", "0")
+os.environ.setdefault("ADMISSION_HEYGEN_CLIENT", "0")
+os.environ.setdefault("ADMISSION_GLADIA_CLIENT", "0")
+
+
+@pytest.fixture(scope="session")
+def client():
+    # One app lifespan for the whole run: module-level singletons hold
+    # asyncio primitives bound to the loop that first used them.
+    import main
+    with TestClient(main.app) as test_client:
+        yield test_client
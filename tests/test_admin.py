@@ -0,0 +1,36 @@
+import pytest
+
+from routes import admin
+
+ADMIN_ENDPOINTS = ("/api/interview/forwarding", "/api/interview/sessions", "/api/traces")
+
+
+@pytest.mark.parametrize("path", ADMIN_ENDPOINTS)
+def test_session_data_requires_admin_token(client, monkeypatch, path):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    assert client.get(path).status_code == 403
+    assert client.get(path, headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get(path, headers={"X-Admin-Token": "secret"}).status_code == 200
+
+
+def test_admin_endpoints_are_closed_without_configured_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    assert client.get("/api/interview/forwarding", headers={"X-Admin-Token": ""}).status_code == 403
+
+
+def test_profile_requires_admin_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    path = "/api/admin/profile?seconds=0.1"
+    assert client.post(path).status_code == 403
+    assert client.post(path, headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.post(path, headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert response.json()["seconds"] == 0.1
+
+
+def test_profile_is_disabled_without_configured_token(client, monkeypatch):
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", None)
+    path = "/api/admin/profile?seconds=0.1"
+    assert client.post(path).status_code == 403
+    assert client.post(path, headers={"X-Admin-Token": ""}).status_code == 403
+    assert client.post(path, headers={"X-Admin-Token": "None"}).status_code == 403
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionDenied, RateLimit, StartQueue
+from settings import Settings
+
+
+def test_rate_limit_keeps_reserve_for_running_interviews():
+    limit = RateLimit("heygen_session", client=(0.001, 2), global_=(0.001, 10), reserve=0.5)
+    limit.check(client="a")
+    limit.check(client="a")
+    with pytest.raises(AdmissionDenied) as denied:
+        limit.check(client="a")
+    assert (denied.value.scope, denied.value.status_code) == ("client", 429)
+
+    for client in "bcd":
+        limit.check(client=client)
+    with pytest.raises(AdmissionDenied) as denied:
+        limit.check(client="e")
+    assert (denied.value.scope, denied.value.status_code) == ("global", 503)
+    limit.check(client="e", priority=True)
+
+
+def test_start_queue_admits_in_order_and_refuses_past_max_wait():
+    async def scenario():
+        queue = StartQueue((20.0, 1), lambda: 0, max_active=0, max_wait=0.12, max_queue=10, max_loop_lag=0)
+        admitted, refused = [], []
+
+        async def start(index: int):
+            try:
+                async with queue.slot():
+                    admitted.append(index)
+            except AdmissionDenied as e:
+                refused.append((index, e.scope))
+
+        tasks = []
+        for index in range(5):
+            tasks.append(asyncio.create_task(start(index)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return admitted, refused
+
+    admitted, refused = asyncio.run(scenario())
+    assert admitted == [0, 1, 2]
+    assert refused == [(3, "queue_full"), (4, "queue_full")]
+
+
+def test_malformed_rate_limit_setting_is_rejected(monkeypatch):
+    monkeypatch.setenv("ADMISSION_START_CLIENT", "fast")
+    with pytest.raises(ValueError):
+        Settings()
+    monkeypatch.setenv("ADMISSION_START_CLIENT", "off")
+    assert Settings().admission_start_client == "0"
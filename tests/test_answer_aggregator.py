@@ -0,0 +1,97 @@
+import asyncio
+
+from answer_aggregator import AnswerAggregator
+
+
+class RecordingAggregator(AnswerAggregator):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reasons = []
+
+    async def flush(self, reason: str) -> bool:
+        if self.pending:
+            self.reasons.append(reason)
+        return await super().flush(reason)
+
+
+def collect(scenario, **limits):
+    """Runs `scenario(aggregator)` and returns the submitted answers as (flush reason, answer)."""
+    submitted = []
+
+    async def submit(answer):
+        submitted.append(answer)
+        return True
+
+    async def main():
+        aggregator = RecordingAggregator("s1", submit, **{"quiet_window": 0.05, "max_chars": 4000,
+                                                          "max_hold": 5.0, **limits})
+        await scenario(aggregator)
+        await aggregator.close()
+        return list(zip(aggregator.reasons, submitted))
+
+    return asyncio.run(main())
+
+
+def test_fragments_are_joined_after_the_quiet_window():
+    async def scenario(aggregator):
+        await aggregator.add("I worked on")
+        await asyncio.sleep(0.02)
+        await aggregator.add("the payments team.")
+        await asyncio.sleep(0.02)
+        assert aggregator.pending == 2
+        await asyncio.sleep(0.1)
+        assert aggregator.pending == 0
+
+    assert collect(scenario) == [("quiet", "I worked on the payments team.")]
+
+
+def test_speech_start_holds_the_answer_until_the_next_fragment():
+    async def scenario(aggregator):
+        await aggregator.add("First part.")
+        aggregator.speech_started()
+        await asyncio.sleep(0.15)
+        assert aggregator.pending == 1
+        await aggregator.add("Second part.")
+        await asyncio.sleep(0.1)
+
+    assert collect(scenario) == [("quiet", "First part. Second part.")]
+
+
+def test_answer_complete_flushes_at_once():
+    async def scenario(aggregator):
+        await aggregator.add("Short answer.")
+        assert await aggregator.flush("complete")
+        assert not await aggregator.flush("complete")
+
+    assert collect(scenario, quiet_window=10) == [("complete", "Short answer.")]
+
+
+def test_size_limit_flushes():
+    async def scenario(aggregator):
+        await aggregator.add("a" * 10)
+        await aggregator.add("b" * 10)
+        assert aggregator.pending == 0
+        await aggregator.add("c")
+
+    assert collect(scenario, max_chars=20, quiet_window=10) == [("size", "a" * 10 + " " + "b" * 10), ("close", "c")]
+
+
+def test_max_hold_caps_a_candidate_who_keeps_talking():
+    async def scenario(aggregator):
+        await aggregator.add("Still")
+        aggregator.speech_started()
+        await asyncio.sleep(0.05)
+        await aggregator.add("talking")
+        aggregator.speech_started()
+        await asyncio.sleep(0.15)
+        assert aggregator.pending == 0
+
+    assert collect(scenario, max_hold=0.1, quiet_window=10) == [("max_hold", "Still talking")]
+
+
+def test_close_flushes_what_is_left():
+    async def scenario(aggregator):
+        await aggregator.add("Cut off by a closed tab")
+
+    assert collect(scenario, quiet_window=10) == [("close", "Cut off by a closed tab")]
+
@@ -0,0 +1,24 @@
+import asyncio
+
+import answer_forwarder
+
+
+def test_forwarder_survives_an_unexpected_error(monkeypatch):
+    forwarded = []
+
+    async def forward(session_id, answer):
+        if answer == "bad":
+            raise RuntimeError("session store unavailable")
+        forwarded.append(answer)
+        return True
+
+    async def scenario():
+        forwarder = answer_forwarder.AnswerForwarder("s-error", forward, maxsize=1, policy="block")
+        for answer in ("bad", "one", "two", "three"):
+            await asyncio.wait_for(forwarder.submit(answer), 1)
+        await forwarder.close()
+        return forwarder
+
+    forwarder = asyncio.run(scenario())
+    assert forwarded == ["one", "two", "three"]
+    assert (forwarder.forwarded, forwarder.failures) == (3, 1)
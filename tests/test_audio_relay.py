@@ -0,0 +1,136 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+import websockets
+from starlette.websockets import WebSocketDisconnect
+
+import helper
+from audio_relay import AudioRelay
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+async def fake_gladia(handler):
+    server = await websockets.serve(handler, "127.0.0.1", 0)
+    return server, f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}/"
+
+
+def test_relay_reports_gladia_dropping_the_session():
+    async def handler(ws):
+        await ws.send(json.dumps({"type": "speech_start"}))
+        await ws.close(code=1011)
+
+    async def scenario():
+        server, url = await fake_gladia(handler)
+        received, errors = [], []
+
+        async def on_message(message):
+            received.append(message["type"])
+
+        async def on_error(error):
+            errors.append(error)
+
+        relay = AudioRelay("s1", url, on_message, on_error)
+        await relay.open()
+        for _ in range(100):
+            if errors:
+                break
+            await asyncio.sleep(0.02)
+        await relay.feed(b"\0" * 64)
+        await relay.close()
+        server.close()
+        return received, errors
+
+    received, errors = run(scenario)
+    assert received == ["speech_start"]
+    assert len(errors) == 1 and isinstance(errors[0], websockets.ConnectionClosedError)
+
+
+def test_relay_reports_a_failing_message_handler_and_closes_quietly():
+    async def handler(ws):
+        await ws.send(json.dumps({"type": "transcript"}))
+        async for message in ws:
+            if isinstance(message, str) and json.loads(message)["type"] == "stop_recording":
+                await ws.close()
+
+    async def scenario():
+        server, url = await fake_gladia(handler)
+        errors = []
+
+        async def on_message(message):
+            raise RuntimeError("interview socket is gone")
+
+        async def on_error(error):
+            errors.append(error)
+
+        relay = AudioRelay("s2", url, on_message, on_error)
+        await relay.open()
+        for _ in range(100):
+            if errors:
+                break
+            await asyncio.sleep(0.02)
+        await relay.close()
+        server.close()
+        return relay, errors
+
+    relay, errors = run(scenario)
+    assert [str(error) for error in errors] == ["interview socket is gone"]
+    assert relay.error is errors[0]
+
+
+def test_relay_closed_by_the_client_is_not_a_failure():
+    async def handler(ws):
+        async for message in ws:
+            if isinstance(message, str) and json.loads(message)["type"] == "stop_recording":
+                await ws.send(json.dumps({"type": "post_final_transcript"}))
+                await ws.close()
+
+    async def scenario():
+        server, url = await fake_gladia(handler)
+        received, errors = [], []
+
+        async def on_message(message):
+            received.append(message["type"])
+
+        async def on_error(error):
+            errors.append(error)
+
+        relay = AudioRelay("s3", url, on_message, on_error)
+        await relay.open()
+        await relay.feed(b"\0" * 64)
+        await relay.close()
+        server.close()
+        return received, errors
+
+    assert run(scenario) == (["post_final_transcript"], [])
+
+
+def relay_close_code(client, session_id):
+    with client.websocket_connect(f"/ws/audio/{session_id}/") as ws:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_bytes()
+    return closed.value.code
+
+
+def test_relay_endpoint_opens_no_gladia_session_for_unknown_interviews(client, monkeypatch):
+    calls = []
+
+    async def request(upstream, operation, method, url, **kwargs):
+        calls.append(operation)
+        return httpx.Response(200, content=b"<html>oops</html>", request=httpx.Request(method, url))
+
+    monkeypatch.setattr("resilience.request", request)
+    assert relay_close_code(client, "never-started") == 1008
+    assert calls == []
+
+    client.portal.call(helper.STORE.set, "relay-known", {"resumeUrl": "http://n8n.invalid"})
+    try:
+        # A non-JSON answer from Gladia closes the socket instead of raising.
+        assert relay_close_code(client, "relay-known") == 1011
+    finally:
+        client.portal.call(helper.STORE.delete, "relay-known")
+    assert calls == ["live.init"]
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import pytest
+
+from connection_writer import ConnectionWriter
+
+
+class StalledSocket:
+    """Accepts sends only once `release` is set; records what was sent and how it was closed."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.sent = []
+        self.close_code = None
+
+    async def send_text(self, text: str):
+        await self.release.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("policy", ["drop_oldest", "coalesce"])
+def test_slow_client_loses_only_ephemeral_messages(policy):
+    async def scenario():
+        socket = StalledSocket()
+        writer = ConnectionWriter("slow-1", socket, maxsize=3, policy=policy, send_timeout=5)
+        writer.enqueue({"type": "new_question", "seq": 1})  # taken by the writer task, stuck in send
+        await asyncio.sleep(0)
+        writer.enqueue({"type": "transcript", "payload": "a"})
+        writer.enqueue({"type": "new_question", "seq": 2})
+        writer.enqueue({"type": "transcript", "payload": "b"})
+        assert writer.enqueue({"type": "new_question", "seq": 3})
+        assert writer.depth == 3
+        socket.release.set()
+        await writer.close(timeout=1)
+        return socket, writer
+
+    socket, writer = run(scenario)
+    assert [message.get("seq") for message in socket.sent if "seq" in message] == [1, 2, 3]
+    assert socket.close_code is None
+    assert writer.dropped + writer.coalesced == 1
+
+
+def test_queue_full_of_numbered_messages_disconnects_instead_of_dropping():
+    async def scenario():
+        socket = StalledSocket()
+        writer = ConnectionWriter("slow-2", socket, maxsize=2, policy="drop_oldest", send_timeout=5)
+        for seq in (1, 2, 3):
+            writer.enqueue({"type": "new_question", "seq": seq})
+            await asyncio.sleep(0)
+        refused = writer.enqueue({"type": "new_question", "seq": 4})
+        await asyncio.sleep(0.01)
+        return socket, writer, refused
+
+    socket, writer, refused = run(scenario)
+    assert refused is False
+    assert writer.dropped == 0
+    assert socket.close_code == 1013
+
+
+def test_ephemeral_message_is_refused_when_only_numbered_messages_are_queued():
+    async def scenario():
+        socket = StalledSocket()
+        writer = ConnectionWriter("slow-3", socket, maxsize=1, policy="drop_oldest", send_timeout=5)
+        writer.enqueue({"type": "new_question", "seq": 1})
+        await asyncio.sleep(0)
+        writer.enqueue({"type": "new_question", "seq": 2})
+        refused = writer.enqueue({"type": "transcript", "payload": "a"})
+        socket.release.set()
+        await writer.close(timeout=1)
+        return socket, refused
+
+    socket, refused = run(scenario)
+    assert refused is False
+    assert [message["seq"] for message in socket.sent] == [1, 2]
+    assert socket.close_code is None
@@ -0,0 +1,119 @@
+import asyncio
+
+import httpx
+import pytest
+
+import heygen_sessions
+from heygen_sessions import SessionPool
+
+
+@pytest.fixture
+def heygen(monkeypatch):
+    """Fakes the HeyGen streaming API and records every call by operation."""
+    calls = []
+
+    async def request(upstream, operation, method, url, **kwargs):
+        calls.append(operation)
+        await asyncio.sleep(0.01)
+        data = {}
+        if operation == "streaming.create_token":
+            data = {"token": f"token-{calls.count(operation)}"}
+        elif operation == "streaming.new":
+            n = calls.count(operation)
+            data = {"session_id": f"heygen-{n}", "url": "wss://livekit.invalid", "access_token": f"lk-{n}"}
+        return httpx.Response(200, json={"data": data}, request=httpx.Request(method, url))
+
+    monkeypatch.setattr(heygen_sessions.resilience, "request", request)
+    monkeypatch.setitem(heygen_sessions._token_cache, "token", None)
+    monkeypatch.setitem(heygen_sessions._token_cache, "expires_at", 0.0)
+    return calls
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    return condition()
+
+
+def test_concurrent_token_refreshes_mint_one_token(heygen):
+    async def scenario():
+        return await asyncio.gather(*(heygen_sessions.get_streaming_token() for _ in range(10)))
+
+    assert set(asyncio.run(scenario())) == {"token-1"}
+    assert heygen.count("streaming.create_token") == 1
+
+
+def test_pool_refills_after_acquire_with_one_token(heygen):
+    async def scenario():
+        pool = SessionPool(size=2, max_age=60)
+        pool.start()
+        assert await wait_for(lambda: pool.stats()["ready"] == 2)
+        first = pool.acquire()
+        assert await wait_for(lambda: pool.stats()["ready"] == 2)
+        second = pool.acquire()
+        assert await wait_for(lambda: pool.stats()["ready"] == 2)
+        await pool.stop()
+        return pool, first, second
+
+    pool, first, second = asyncio.run(scenario())
+    assert (first["session_id"], second["session_id"]) == ("heygen-1", "heygen-2")
+    assert {first["token"], second["token"]} == {"token-1"}
+    assert (pool.hits, pool.refills) == (2, 4)
+    assert heygen.count("streaming.create_token") == 1
+    # The two sessions still pooled at shutdown are stopped.
+    assert heygen.count("streaming.stop") == 2
+
+
+def test_acquire_retires_expired_sessions(heygen):
+    async def scenario():
+        pool = SessionPool(size=1, max_age=60)
+        pool._ready.append((0.0, {"session_id": "stale", "token": "old"}))
+        assert pool.acquire() is None
+        assert len(pool._retiring) == 1
+        await pool.stop()
+        return pool
+
+    pool = asyncio.run(scenario())
+    assert (pool.misses, pool.retired) == (1, 1)
+    assert not pool._retiring
+    assert heygen == ["streaming.stop"]
+
+
+def test_pool_retires_sessions_before_they_expire(heygen):
+    async def scenario():
+        pool = SessionPool(size=1, max_age=0.1)
+        pool.start()
+        assert await wait_for(lambda: pool.retired >= 1 and pool.stats()["ready"] == 1)
+        await pool.stop()
+        return pool
+
+    pool = asyncio.run(scenario())
+    assert pool.refills >= 2
+    assert heygen.count("streaming.create_token") == 1
+
+
+def test_pool_keeps_refilling_after_a_malformed_response(heygen, monkeypatch):
+    fake = heygen_sessions.resilience.request
+    broken = []
+
+    async def request(upstream, operation, method, url, **kwargs):
+        if operation == "streaming.new" and not broken:
+            broken.append(operation)
+            return httpx.Response(200, content=b"<html>Bad Gateway</html>", request=httpx.Request(method, url))
+        return await fake(upstream, operation, method, url, **kwargs)
+
+    monkeypatch.setattr(heygen_sessions.resilience, "request", request)
+    monkeypatch.setattr(heygen_sessions, "POOL_RETRY_DELAY", 0.05)
+
+    async def scenario():
+        pool = SessionPool(size=1, max_age=60)
+        pool.start()
+        assert await wait_for(lambda: pool.stats()["ready"] == 1)
+        running = not pool._task.done()
+        await pool.stop()
+        return pool, running
+
+    pool, running = asyncio.run(scenario())
+    assert running
+    assert (pool.refill_failures, pool.refills) == (1, 1)
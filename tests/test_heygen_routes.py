@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+import avatar_speech
+import heygen_tracker
+
+
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def fake_heygen(monkeypatch):
+    """Records the HeyGen calls the router makes as (operation, Authorization header)."""
+    calls = []
+
+    async def request(upstream, operation, method, url, **kwargs):
+        calls.append((operation, kwargs["headers"].get("Authorization")))
+        return httpx.Response(200, json={"data": {}}, request=httpx.Request(method, url))
+
+    monkeypatch.setattr("resilience.request", request)
+    return calls
+
+
+def test_task_without_token_needs_a_session_bound_to_a_connected_interview(client, monkeypatch):
+    calls = fake_heygen(monkeypatch)
+    body = {"session_id": "heygen-unknown", "text": "Hello"}
+    assert client.post("/api/heygen/task", json=body).status_code == 403
+
+    heygen_tracker.TRACKER.track("heygen-bound", "session-token")
+    body["session_id"] = "heygen-bound"
+    assert client.post("/api/heygen/task", json=body).status_code == 403
+    client.portal.call(heygen_tracker.TRACKER.bind, "heygen-bound", None, "interview-1")
+    assert client.post("/api/heygen/task", json=body).status_code == 200
+    heygen_tracker.TRACKER.interview_disconnected("interview-1")
+    assert client.post("/api/heygen/task", json=body).status_code == 403
+    heygen_tracker.TRACKER.release("heygen-bound")
+
+    body = {"session_id": "heygen-unknown", "text": "Hello", "token": "caller-token"}
+    assert client.post("/api/heygen/task", json=body).status_code == 200
+    assert calls == [("streaming.task", "Bearer session-token"), ("streaming.task", "Bearer caller-token")]
+
+
+def test_stream_serves_only_tracked_sessions_and_drops_idle_queues(client, monkeypatch):
+    fake_heygen(monkeypatch)
+    for n in range(5):
+        body = {"session_id": f"random-{n}", "token": "caller-token", "text": "Hello there."}
+        assert client.post("/api/heygen/task/stream", json=body).status_code == 404
+    heygen_tracker.TRACKER.track("heygen-stream", "session-token")
+    body = {"session_id": "heygen-stream", "token": "session-token", "text": "Hello there. How are you today?"}
+    assert client.post("/api/heygen/task/stream", json=body).status_code == 200
+    assert wait_for(lambda: not avatar_speech.QUEUES)
+    heygen_tracker.TRACKER.release("heygen-stream")
+
+
+def test_malformed_heygen_response_fails_speak_instead_of_hanging(monkeypatch):
+    async def send_task(token, session_id, text, task_type):
+        return ["not", "a", "dict"]
+
+    monkeypatch.setattr("heygen_sessions.send_task", send_task)
+
+    async def scenario():
+        queue = avatar_speech.get_queue("heygen-bad", "token")
+        with pytest.raises(HTTPException) as error:
+            await asyncio.wait_for(queue.speak("Hello.", "repeat"), 2)
+        await asyncio.sleep(0)
+        return error.value.status_code
+
+    assert asyncio.run(scenario()) == 502
+    assert "heygen-bad" not in avatar_speech.QUEUES
+
+
+@pytest.mark.parametrize("payload", [{"data": {"url": "wss://livekit"}}, {"data": None}, {"code": 400}])
+def test_new_session_without_session_id_is_a_bad_gateway(client, monkeypatch, payload):
+    async def request(upstream, operation, method, url, **kwargs):
+        return httpx.Response(200, json=payload, request=httpx.Request(method, url))
+
+    monkeypatch.setattr("resilience.request", request)
+    tracked = len(heygen_tracker.TRACKER)
+    response = client.post("/api/heygen/new_session", json={"token": "caller-token"})
+    assert response.status_code == 502
+    assert len(heygen_tracker.TRACKER) == tracked
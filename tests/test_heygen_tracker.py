@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+import helper
+import heygen_tracker
+from heygen_tracker import SessionTracker
+
+
+@pytest.fixture
+def stopped(monkeypatch):
+    """Session IDs passed to HeyGen's streaming.stop."""
+    calls = []
+
+    async def stop_session(token, session_id):
+        calls.append(session_id)
+        return {"code": 100}
+
+    monkeypatch.setattr("heygen_sessions.stop_session", stop_session)
+    monkeypatch.setattr(heygen_tracker, "REAP_INTERVAL", 0.01)
+    return calls
+
+
+def test_bound_session_is_reaped_only_after_the_grace_period(stopped):
+    async def scenario():
+        tracker = SessionTracker(grace=0.05, unbound_ttl=0)
+        tracker.track("hg-1", "token")
+        await tracker.bind("hg-1", None, "interview-1")
+        assert tracker.token_for("hg-1") == "token"
+        tracker.interview_disconnected("interview-1")
+        await tracker.reap_due()
+        assert stopped == []
+        # A reconnect within the grace period keeps the avatar.
+        tracker.interview_connected("interview-1")
+        await asyncio.sleep(0.08)
+        await tracker.reap_due()
+        assert stopped == []
+        tracker.interview_disconnected("interview-1")
+        await asyncio.sleep(0.08)
+        await tracker.reap_due()
+        return tracker
+
+    tracker = asyncio.run(scenario())
+    assert stopped == ["hg-1"]
+    assert tracker.stats()["reaped"] == {"socket_closed": 1}
+    assert len(tracker) == 0
+
+
+def test_unbound_sessions_expire_after_the_ttl(stopped):
+    async def scenario():
+        tracker = SessionTracker(grace=10, unbound_ttl=0.05)
+        tracker.track("hg-unbound", "token")
+        tracker.track("hg-bound", "token")
+        await tracker.bind("hg-bound", None, "interview-2")
+        await asyncio.sleep(0.08)
+        await tracker.reap_due()
+        return tracker
+
+    tracker = asyncio.run(scenario())
+    assert stopped == ["hg-unbound"]
+    assert tracker.stats()["reaped"] == {"unbound": 1}
+    assert "hg-bound" in tracker
+
+
+def test_ended_interview_is_reaped_by_the_background_task(stopped):
+    async def scenario():
+        tracker = SessionTracker(grace=10, unbound_ttl=0)
+        tracker.start()
+        tracker.track("hg-3", "token")
+        await tracker.bind("hg-3", None, "interview-3")
+        tracker.interview_ended("interview-3")
+        for _ in range(100):
+            if stopped:
+                break
+            await asyncio.sleep(0.01)
+        await tracker.stop()
+        return tracker
+
+    tracker = asyncio.run(scenario())
+    assert stopped == ["hg-3"]
+    assert tracker.stats()["reaped"] == {"interview_ended": 1}
+
+
+def test_reaper_survives_store_and_response_errors(stopped, monkeypatch):
+    async def broken_get(key):
+        raise ConnectionError("redis is down")
+
+    async def bad_body(token, session_id):
+        stopped.append(session_id)
+        raise ValueError("not JSON")
+
+    async def scenario():
+        tracker = SessionTracker(grace=10, unbound_ttl=0.01)
+        tracker.start()
+        monkeypatch.setattr(helper.STORE, "get", broken_get)
+        tracker.track("hg-store", "token")
+        # Retried on later passes, then given up on.
+        for _ in range(100):
+            if tracker.reap_failures:
+                break
+            await asyncio.sleep(0.01)
+        monkeypatch.undo()
+        monkeypatch.setattr(heygen_tracker, "REAP_INTERVAL", 0.01)
+        monkeypatch.setattr("heygen_sessions.stop_session", bad_body)
+        tracker.track("hg-body", "token")
+        for _ in range(100):
+            if "hg-body" in stopped:
+                break
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.02)
+        running = not tracker._task.done()
+        await tracker.stop()
+        return tracker, running
+
+    tracker, running = asyncio.run(scenario())
+    assert running
+    assert tracker.reap_failures == 1
+    assert stopped == ["hg-body"]
+    assert tracker.stats()["reaped"] == {"unbound": 1}
+    assert len(tracker) == 0
@@ -0,0 +1,28 @@
+import helper
+
+
+def test_malformed_messages_are_ignored(client):
+    with client.websocket_connect("/ws/interview/malformed-1/") as ws:
+        for message in ('{"type": "user_answer", "payload": null}', '{"type": "user_answer", "payload": 5}',
+                        '[1, 2]', '{"type": "user_answer", "payload": {"answer": 42}}', 'not json'):
+            ws.send_text(message)
+        ws.send_json({"type": "ack", "seq": 0})
+        client.post("/api/send-question", json={"sessionId": "malformed-1", "question": "still there?"})
+        assert ws.receive_json()["payload"]["text"] == "still there?"
+    assert helper.REGISTRY.websocket("malformed-1") is None
+
+
+def test_socket_is_detached_when_the_handler_fails(client, monkeypatch):
+    async def fail(*args):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr("heygen_tracker.TRACKER.bind", fail)
+    connected = helper.REGISTRY.connected_count()
+    try:
+        with client.websocket_connect("/ws/interview/failing-1/") as ws:
+            ws.send_json({"type": "heygen_session", "payload": {"session_id": "hg-1"}})
+            ws.receive_json()
+    except Exception:
+        pass
+    assert helper.REGISTRY.websocket("failing-1") is None
+    assert helper.REGISTRY.connected_count() == connected
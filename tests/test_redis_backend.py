@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+from redis import exceptions as redis_exceptions  # noqa: E402
+
+import session_backends
+from session_backends import RedisMessageBus, RedisSessionStore
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+async def wait_for(condition, timeout: float = 3.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.02)
+    return condition()
+
+
+def test_store_round_trip():
+    async def scenario():
+        store = RedisSessionStore(fakeredis.FakeAsyncRedis())
+        await store.set("s1", {"resumeUrl": "http://n8n/resume"})
+        assert await store.get("s1") == {"resumeUrl": "http://n8n/resume"}
+        await store.delete("s1")
+        assert await store.get("s1") is None
+        await store.close()
+
+    run(scenario)
+
+
+def test_bus_routes_between_processes_and_survives_a_connection_loss(monkeypatch):
+    monkeypatch.setattr(session_backends, "RECONNECT_DELAY", 0.05)
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        holder = RedisMessageBus(fakeredis.FakeAsyncRedis(server=server))
+        sender = RedisMessageBus(fakeredis.FakeAsyncRedis(server=server))
+        delivered = []
+
+        async def deliver(session_id, message):
+            delivered.append((session_id, message))
+            return "delivered"
+
+        await holder.start(deliver)
+        await sender.start(deliver)
+        await holder.subscribe("s1")
+        assert await sender.publish("s1", {"type": "new_question", "n": 1})
+        assert await wait_for(lambda: len(delivered) == 1)
+        assert not await sender.publish("s2", {"type": "new_question"})
+
+        # The listener is blocked reading the next message; once it has
+        # delivered that one, its next read fails as if Redis had gone away.
+        async def lost(*args, **kwargs):
+            raise redis_exceptions.ConnectionError("Connection closed by server.")
+
+        holder._pubsub.parse_response = lost
+        assert await sender.publish("s1", {"type": "new_question", "n": 2})
+        assert await wait_for(lambda: holder.reconnects >= 1)
+        assert await sender.publish("s1", {"type": "new_question", "n": 3})
+        assert await wait_for(lambda: len(delivered) == 3)
+
+        await holder.stop()
+        await sender.stop()
+        return delivered
+
+    assert [message["n"] for _, message in run(scenario)] == [1, 2, 3]
@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+import pytest
+
+import resilience
+from resilience import UpstreamPolicy, UpstreamUnavailable
+
+
+def run_with_upstream(policy: UpstreamPolicy, handler, scenario):
+    async def main():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        original = resilience.get_client
+        resilience.get_client = lambda name: client
+        try:
+            return await scenario()
+        finally:
+            resilience.get_client = original
+            await client.aclose()
+    return asyncio.run(main())
+
+
+def test_failing_operation_does_not_open_the_breaker_of_another():
+    policy = UpstreamPolicy("n8n")
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(503 if request.url.path == "/start" else 200)
+
+    async def scenario():
+        for _ in range(policy.breaker_failures):
+            with pytest.raises(httpx.HTTPStatusError):
+                await policy.request("start_interview", "POST", "http://n8n/start")
+        with pytest.raises(UpstreamUnavailable) as refused:
+            await policy.request("start_interview", "POST", "http://n8n/start")
+        assert refused.value.reason == "circuit_open"
+        response = await policy.request("forward_answer", "POST", "http://n8n/resume")
+        assert response.status_code == 200
+
+    run_with_upstream(policy, handler, scenario)
+    stats = policy.stats()
+    assert stats["circuit"] == "open"
+    assert stats["operations"]["forward_answer"]["circuit"] == "closed"
+
+
+def test_full_bulkhead_of_one_operation_leaves_others_a_slot():
+    policy = UpstreamPolicy("n8n")
+    policy.max_concurrency = 1
+    policy.bulkhead_wait = 0.05
+    gate = asyncio.Event()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/start":
+            await gate.wait()
+        return httpx.Response(200)
+
+    async def scenario():
+        start = asyncio.create_task(policy.request("start_interview", "POST", "http://n8n/start"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(UpstreamUnavailable) as refused:
+            await policy.request("start_interview", "POST", "http://n8n/start")
+        assert refused.value.reason == "bulkhead_full"
+        assert (await policy.request("forward_answer", "POST", "http://n8n/resume")).status_code == 200
+        gate.set()
+        await start
+
+    run_with_upstream(policy, handler, scenario)
+
+
+def test_exhausted_retry_budget_is_counted():
+    policy = UpstreamPolicy("heygen")
+    policy.retry_backoff = 0
+    policy.budget.tokens = 0
+
+    async def scenario():
+        with pytest.raises(httpx.HTTPStatusError):
+            await policy.request("streaming.task", "POST", "http://heygen/task", idempotent=True)
+
+    run_with_upstream(policy, lambda request: httpx.Response(503), scenario)
+    assert policy.rejected == {"retry_budget_exhausted": 1}
+
+
+@pytest.mark.parametrize("error, status_code", [
+    (httpx.ConnectError("refused"), 502),
+    (httpx.ReadTimeout("slow"), 504),
+])
+def test_unreachable_upstream_maps_to_gateway_errors(client, monkeypatch, error, status_code):
+    async def request(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr("resilience.request", request)
+    monkeypatch.setattr("heygen_sessions._token_cache", {"token": None, "expires_at": 0.0})
+    for method, path, body in (("post", "/api/heygen/new_session", {"token": "t"}),
+                               ("post", "/api/heygen/initiate_session", None),
+                               ("post", "/api/gladia/init", None)):
+        response = getattr(client, method)(path, json=body)
+        assert response.status_code == status_code, path
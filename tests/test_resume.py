@@ -0,0 +1,51 @@
+import time
+
+import answer_forwarder
+import helper
+
+
+def wait_for(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_resumed_socket_keeps_forwarder_after_old_socket_closes(client, monkeypatch):
+    forwarded = []
+
+    async def forward(session_id, answer):
+        forwarded.append((session_id, answer))
+        return True
+
+    monkeypatch.setattr("routes.InterviewRouter.forward_answer_to_n8n", forward)
+    old = client.websocket_connect("/ws/interview/resume-1/")
+    old.__enter__()
+    with client.websocket_connect("/ws/interview/resume-1/?last_seq=0") as new:
+        old.__exit__(None, None, None)
+        time.sleep(0.1)
+        assert not answer_forwarder.FORWARDERS["resume-1"]._closing
+        new.send_json({"type": "user_answer", "payload": {"answer": "hello", "final": True}})
+        assert wait_for(lambda: forwarded)
+    assert forwarded == [("resume-1", "hello")]
+    assert wait_for(lambda: "resume-1" not in answer_forwarder.FORWARDERS)
+
+
+def test_buffered_message_is_sequenced_once(client):
+    client.portal.call(helper.STORE.set, "resume-2", {"resumeUrl": "http://example.invalid"})
+    response = client.post("/api/send-question", json={"sessionId": "resume-2", "question": "Q1"})
+    assert "reconnecting" in response.json()["status"]
+    assert [message["seq"] for message in helper.REGISTRY.replay_after("resume-2", None)] == [1]
+    with client.websocket_connect("/ws/interview/resume-2/?last_seq=0") as ws:
+        message = ws.receive_json()
+        assert (message["type"], message["seq"]) == ("new_question", 1)
+        client.post("/api/send-question", json={"sessionId": "resume-2", "question": "Q2"})
+        assert ws.receive_json()["seq"] == 2
+
+
+def test_message_refused_by_closing_writer_is_sequenced_once(client):
+    with client.websocket_connect("/ws/interview/resume-3/"):
+        helper.REGISTRY.writer("resume-3").stop()
+        response = client.post("/api/send-question", json={"sessionId": "resume-3", "question": "Q1"})
+        assert "reconnecting" in response.json()["status"]
+        assert [message["seq"] for message in helper.REGISTRY.replay_after("resume-3", 0)] == [1]
@@ -0,0 +1,45 @@
+import asyncio
+
+import helper
+from routes import InterviewRouter
+
+
+def test_batch_reports_each_session_and_bounds_concurrency(client, monkeypatch):
+    in_flight, peak = [0], [0]
+    send_with_status = InterviewRouter.send_with_status
+
+    async def counting_send(message, session_id):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        try:
+            await asyncio.sleep(0.01)
+            return await send_with_status(message, session_id)
+        finally:
+            in_flight[0] -= 1
+
+    monkeypatch.setattr(InterviewRouter, "send_with_status", counting_send)
+    monkeypatch.setattr(InterviewRouter, "BATCH_SEND_CONCURRENCY", 2)
+    # Known to the store but without a socket: kept for replay on reconnect.
+    client.portal.call(helper.STORE.set, "batch-buffered", {"resumeUrl": "http://n8n.invalid"})
+
+    items = [{"sessionId": "batch-connected", "question": "Q1"},
+             {"sessionId": "batch-buffered", "question": "Q1"},
+             {"sessionId": "batch-unknown", "question": "Q1"},
+             {"sessionId": "batch-connected", "question": "Q2"},
+             {"sessionId": "batch-unknown-2", "question": "Q1"}]
+    with client.websocket_connect("/ws/interview/batch-connected/") as ws:
+        response = client.post("/api/send-questions", json={"items": items})
+        received = sorted(ws.receive_json()["payload"]["text"] for _ in range(2))
+
+    body = response.json()
+    assert [(result["sessionId"], result["status"]) for result in body["results"]] == [
+        ("batch-connected", "delivered"),
+        ("batch-buffered", "buffered"),
+        ("batch-unknown", "no_connection"),
+        ("batch-connected", "delivered"),
+        ("batch-unknown-2", "no_connection"),
+    ]
+    assert (body["delivered"], body["failed"]) == (2, 3)
+    assert received == ["Q1", "Q2"]
+    assert peak[0] == 2
+    assert [m["payload"]["text"] for m in helper.REGISTRY.replay_after("batch-buffered", None)] == ["Q1"]
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+from session_registry import SessionRegistry
+
+
+class FakeSocket:
+    def __init__(self):
+        self.close_codes = []
+
+    async def close(self, code: int = 1000):
+        self.close_codes.append(code)
+
+
+class FakeWriter:
+    def __init__(self):
+        self.abort_codes = []
+
+    async def abort(self, code: int):
+        self.abort_codes.append(code)
+
+
+def fill(registry: SessionRegistry, total: int):
+    for i in range(total):
+        registry.set_data(f"session-{i:04d}", {"resumeUrl": f"https://n8n.invalid/{i}"})
+
+
+def test_sweep_evicts_only_idle_sessions():
+    registry = SessionRegistry(ttl=60.0, max_sessions=1000)
+    fill(registry, 200)
+    assert registry.sweep() == 0
+    # Every 10th session was active more recently than its scheduled deadline.
+    for i in range(0, 200, 10):
+        registry.get(f"session-{i:04d}").last_active += 30.0
+    now = time.monotonic()
+    assert registry.sweep(now=now + 61.0) == 180
+    assert len(registry) == 20
+    assert all(f"session-{i:04d}" in registry for i in range(0, 200, 10))
+    # The active ones were rescheduled at their real deadline, not dropped.
+    assert registry.sweep(now=now + 61.0) == 0
+    assert registry.stats()["scheduled"] == 20
+    assert registry.sweep(now=now + 91.0) == 20
+    assert registry.stats()["evicted_idle"] == 200
+    assert len(registry) == 0
+
+
+def test_capacity_evicts_the_oldest_session_first():
+    registry = SessionRegistry(ttl=60.0, max_sessions=10)
+    fill(registry, 10)
+    registry.get("session-0000").last_active += 5.0
+    for i in range(10, 25):
+        registry.set_data(f"session-{i:04d}", {})
+    assert len(registry) == 10
+    assert registry.stats()["evicted_capacity"] == 15
+    # session-0000 was touched, so the 9 after it and the 6 after those went first.
+    assert "session-0000" in registry
+    assert [f"session-{i:04d}" in registry for i in range(1, 16)] == [False] * 15
+    assert all(f"session-{i:04d}" in registry for i in range(16, 25))
+
+
+def test_capacity_eviction_aborts_the_socket_as_going_away():
+    async def scenario():
+        registry = SessionRegistry(ttl=60.0, max_sessions=2)
+        socket, writer = FakeSocket(), FakeWriter()
+        registry.attach("oldest", FakeSocket(), writer)
+        registry.attach("recent", socket)
+        # Over capacity: the writer of the oldest session aborts its socket.
+        registry.set_data("newcomer", {})
+        await asyncio.sleep(0)
+        return registry, socket, writer
+
+    registry, socket, writer = asyncio.run(scenario())
+    assert writer.abort_codes == [1001]
+    assert socket.close_codes == []
+    assert "oldest" not in registry and len(registry) == 2
+
+
+def test_idle_socket_is_closed_by_the_sweep():
+    async def scenario():
+        registry = SessionRegistry(ttl=60.0, max_sessions=10)
+        socket = FakeSocket()
+        registry.attach("idle", socket)
+        assert registry.sweep(now=time.monotonic() + 61.0) == 1
+        await asyncio.sleep(0)
+        return registry, socket
+
+    registry, socket = asyncio.run(scenario())
+    assert socket.close_codes == [1001]
+    assert registry.websocket("idle") is None and len(registry) == 0
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+import single_flight
+from single_flight import SingleFlight
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(single_flight, "time", clock)
+    return clock
+
+
+class Upstream:
+    """Counts calls; each call returns its number or raises `error`."""
+
+    def __init__(self, error: Exception = None, delay: float = 0.0):
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.calls
+
+
+def test_burst_makes_one_call(clock):
+    flight = SingleFlight(ttl=0, negative_ttl=0, max_entries=10)
+    upstream = Upstream(delay=0.01)
+
+    async def scenario():
+        return await asyncio.gather(*(flight.run("key", upstream) for _ in range(20)))
+
+    assert asyncio.run(scenario()) == [1] * 20
+    assert upstream.calls == 1
+    assert (flight.calls, flight.coalesced) == (1, 19)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_results_are_cached_until_the_ttl_expires(clock):
+    flight = SingleFlight(ttl=30, negative_ttl=0, max_entries=10)
+    upstream = Upstream()
+
+    async def scenario():
+        first = await flight.run("key", upstream)
+        clock.now += 29
+        cached = await flight.run("key", upstream)
+        clock.now += 1
+        return first, cached, await flight.run("key", upstream)
+
+    assert asyncio.run(scenario()) == (1, 1, 2)
+    assert (flight.calls, flight.hits) == (2, 1)
+
+
+def test_failures_are_cached_until_the_negative_ttl_expires(clock):
+    flight = SingleFlight(ttl=30, negative_ttl=5, max_entries=10)
+    upstream = Upstream(error=ValueError("booking code not found"))
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                await flight.run("key", upstream)
+        calls_while_cached = upstream.calls
+        clock.now += 5
+        upstream.error = None
+        return calls_while_cached, await flight.run("key", upstream)
+
+    assert asyncio.run(scenario()) == (1, 2)
+    assert flight.negative_hits == 1
+
+
+def test_uncached_errors_are_retried_on_the_next_call(clock):
+    flight = SingleFlight(ttl=30, negative_ttl=30, max_entries=10, uncached=(ConnectionError,))
+    upstream = Upstream(error=ConnectionError("upstream unreachable"))
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            await flight.run("key", upstream)
+        upstream.error = None
+        return await flight.run("key", upstream)
+
+    assert asyncio.run(scenario()) == 2
+    assert flight.negative_hits == 0
+
+
+def test_forget_drops_the_cached_result(clock):
+    flight = SingleFlight(ttl=30, negative_ttl=0, max_entries=10)
+    upstream = Upstream()
+
+    async def scenario():
+        await flight.run("key", upstream)
+        flight.forget("key")
+        flight.forget("never-cached")
+        return await flight.run("key", upstream)
+
+    assert asyncio.run(scenario()) == 2
+    assert flight.hits == 0
+
+
+def test_cache_keeps_the_most_recently_used_entries(clock):
+    flight = SingleFlight(ttl=30, negative_ttl=0, max_entries=3)
+    upstream = Upstream()
+
+    async def scenario():
+        for key in ("a", "b", "c"):
+            await flight.run(key, upstream)
+        await flight.run("a", upstream)  # "b" is now the least recently used
+        await flight.run("d", upstream)
+        calls = upstream.calls
+        for key in ("a", "c", "d"):
+            await flight.run(key, upstream)
+        assert upstream.calls == calls
+        return await flight.run("b", upstream)
+
+    assert asyncio.run(scenario()) == 5
+    assert flight.stats()["cached"] == 3
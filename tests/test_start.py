@@ -0,0 +1,35 @@
+import time
+
+import helper
+from routes import InterviewRouter
+
+
+def test_background_start_fails_the_handle_on_unexpected_errors(client, monkeypatch):
+    async def broken_workflow(booking_code):
+        raise AttributeError("'list' object has no attribute 'get'")
+
+    monkeypatch.setattr(InterviewRouter, "run_start_workflow", broken_workflow)
+    response = client.post("/api/interview/start_async", json={"booking_code": "bg-fail-1"})
+    assert response.status_code == 202
+    status_url = response.json()["statusUrl"]
+    deadline = time.monotonic() + 2
+    while client.get(status_url).json()["status"] == "pending" and time.monotonic() < deadline:
+        time.sleep(0.02)
+    status = client.get(status_url).json()
+    assert status["status"] == "failed"
+    assert "no attribute" in status["detail"]
+    assert not InterviewRouter._pending_starts
+
+
+def test_non_object_n8n_response_is_a_bad_gateway(client, monkeypatch):
+    class Response:
+        def json(self):
+            return ["not", "an", "object"]
+
+    async def request(*args, **kwargs):
+        return Response()
+
+    monkeypatch.setattr(InterviewRouter.resilience, "request", request)
+    response = client.post("/api/interview/start", json={"booking_code": "bad-json-1"})
+    assert response.status_code == 502
+    assert client.portal.call(helper.STORE.get, "bad-json-1") is None
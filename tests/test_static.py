@@ -0,0 +1,8 @@
+def test_static_assets_answer_head(client):
+    get = client.get("/static/interview.js", headers={"Accept-Encoding": "gzip"})
+    head = client.head("/static/interview.js", headers={"Accept-Encoding": "gzip"})
+    assert (get.status_code, head.status_code) == (200, 200)
+    assert head.content == b""
+    assert head.headers["etag"] == get.headers["etag"]
+    assert head.headers["content-length"] == get.headers["content-length"]
+    assert client.head("/static/missing.js").status_code == 404
@@ -0,0 +1,61 @@
+import asyncio
+from collections import deque
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import tracing
+
+
+@pytest.fixture
+def traced_app(monkeypatch):
+    """A small app behind TracingMiddleware, as main.py installs it when TRACING_ENABLED is set."""
+    monkeypatch.setattr(tracing, "SLOW_TRACES", deque(maxlen=3))
+    monkeypatch.setitem(tracing._counts, "traced", 0)
+    monkeypatch.setitem(tracing._counts, "slow", 0)
+    app = FastAPI()
+    app.add_middleware(tracing.TracingMiddleware)
+
+    @app.get("/work")
+    async def work():
+        with tracing.span("upstream.call"):
+            await asyncio.sleep(0.01)
+        with tracing.span("handler.render"):
+            pass
+        return {"ok": True}
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_response_carries_server_timing_for_each_span(traced_app):
+    response = traced_app.get("/work")
+    entries = [entry.split(";dur=") for entry in response.headers["server-timing"].split(", ")]
+    assert [name for name, _ in entries] == ["upstream.call", "handler.render", "total"]
+    durations = {name: float(ms) for name, ms in entries}
+    assert durations["upstream.call"] >= 10.0
+    assert durations["total"] >= durations["upstream.call"]
+
+
+def test_slow_traces_are_kept_in_a_bounded_buffer(traced_app, monkeypatch):
+    monkeypatch.setattr(tracing, "SLOW_THRESHOLD", 0.0)
+    for _ in range(5):
+        traced_app.get("/work")
+    stats = tracing.get_stats()
+    assert (stats["traced"], stats["slow"]) == (5, 5)
+    assert len(stats["recent_slow"]) == 3
+    trace = stats["recent_slow"][0]
+    assert (trace["name"], trace["status"]) == ("GET /work", 200)
+    assert [entry["name"] for entry in trace["spans"]] == ["upstream.call", "handler.render"]
+
+
+def test_fast_requests_are_counted_but_not_kept(traced_app, monkeypatch):
+    monkeypatch.setattr(tracing, "SLOW_THRESHOLD", 60.0)
+    traced_app.get("/work")
+    assert (tracing._counts["traced"], tracing._counts["slow"]) == (1, 0)
+    assert not tracing.SLOW_TRACES
+
+
+def test_span_outside_a_request_is_a_noop():
+    assert tracing.span("anything") is tracing.NOOP
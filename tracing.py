@@ -0,0 +1,244 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter as Tally, deque
+from contextvars import ContextVar
+from typing import Deque, List, Optional
+
+from settings import settings
+
+# Span tracing is off unless TRACING_ENABLED is set. When off, the middleware
+# is not installed and `span()` is one ContextVar lookup returning a shared
+# no-op, so instrumented code costs next to nothing.
+ENABLED = settings.tracing_enabled
+# Requests slower than this are kept in the slow-trace ring buffer.
+SLOW_THRESHOLD = settings.trace_slow_threshold
+BUFFER_SIZE = settings.trace_buffer_size
+PROFILE_INTERVAL = settings.profile_interval
+PROFILE_MAX_SECONDS = settings.profile_max_seconds
+
+
+class Trace:
+    __slots__ = ("name", "started", "started_at", "spans", "finished")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.spans: List[tuple] = []  # (name, start offset, duration), in completion order
+        self.finished = False
+
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        # Background tasks spawned by a request inherit its trace and may
+        # outlive it; their spans are not part of the response.
+        if not self.trace.finished:
+            ended = time.perf_counter()
+            self.trace.spans.append((self.name, self.started - self.trace.started, ended - self.started))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NOOP = _NoopSpan()
+_current: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+SLOW_TRACES: Deque[dict] = deque(maxlen=BUFFER_SIZE)
+_counts = {"traced": 0, "slow": 0}
+
+
+def span(name: str):
+    """Times a block as part of the current request's trace, if there is one."""
+    trace = _current.get()
+    if trace is None:
+        return NOOP
+    return _Span(trace, name)
+
+
+def _finish(trace: Trace, status: Optional[int] = None) -> float:
+    duration = time.perf_counter() - trace.started
+    trace.finished = True
+    _counts["traced"] += 1
+    if duration >= SLOW_THRESHOLD:
+        _counts["slow"] += 1
+        SLOW_TRACES.append({
+            "name": trace.name,
+            "status": status,
+            "started_at": trace.started_at,
+            "duration_ms": round(duration * 1000, 1),
+            "spans": [{"name": name, "start_ms": round(start * 1000, 1), "duration_ms": round(spent * 1000, 1)}
+                      for name, start, spent in sorted(trace.spans, key=lambda entry: entry[1])],
+        })
+    return duration
+
+
+class background:
+    """Traces work that runs outside a request, e.g. session pool refills."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._trace: Optional[Trace] = None
+
+    def __enter__(self):
+        if ENABLED:
+            self._trace = Trace(self.name)
+            self._token = _current.set(self._trace)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._trace is not None:
+            _current.reset(self._token)
+            _finish(self._trace)
+        return False
+
+
+def server_timing(trace: Trace, total: float) -> bytes:
+    entries = [f"{name};dur={spent * 1000:.1f}" for name, _, spent in trace.spans]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries).encode("latin-1")
+
+
+class TracingMiddleware:
+    """Traces every HTTP request and reports its spans in a Server-Timing header.
+
+    Only spans finished before the response headers go out can appear in the
+    header; the slow-trace buffer gets all of them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace(f"{scope['method']} {scope['path']}")
+        token = _current.set(trace)
+        status = None
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.append((b"server-timing", server_timing(trace, time.perf_counter() - trace.started)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            _finish(trace, status)
+
+
+def get_stats() -> dict:
+    return {
+        "enabled": ENABLED,
+        "slow_threshold_ms": SLOW_THRESHOLD * 1000,
+        "traced": _counts["traced"],
+        "slow": _counts["slow"],
+        "recent_slow": list(reversed(SLOW_TRACES)),
+    }
+
+
+# --- Sampling profiler ---
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    # The loop is waiting in selector.select() for I/O or a timer.
+    return frame.f_code.co_name in ("select", "poll", "epoll", "kqueue", "control") \
+        and "selectors" in frame.f_code.co_filename
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, target_thread: int, interval: float):
+        super().__init__(name="loop-profiler", daemon=True)
+        self.target_thread = target_thread
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.stacks: Tally = Tally()
+        self.samples = 0
+        self.idle = 0
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread)
+            if frame is None:
+                continue
+            self.samples += 1
+            if _is_idle(frame):
+                self.idle += 1
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+
+_profile_lock = asyncio.Lock()
+
+
+async def profile_loop(seconds: float, interval: float = PROFILE_INTERVAL, top: int = 25) -> dict:
+    """Samples the event loop thread's stack every `interval` for `seconds`.
+
+    Runs on the live loop, so the profile shows whatever the server is doing
+    meanwhile. Samples taken while the loop waits for I/O are counted as idle.
+    `collapsed` is in the folded-stack format flamegraph tools read.
+    """
+    seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+    if _profile_lock.locked():
+        raise RuntimeError("A profile is already running.")
+    async with _profile_lock:
+        sampler = _Sampler(threading.get_ident(), interval)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop_event.set()
+            await asyncio.to_thread(sampler.join)
+
+    own: Tally = Tally()
+    inclusive: Tally = Tally()
+    for stack, count in sampler.stacks.items():
+        frames = stack.split(";")
+        own[frames[-1]] += count
+        for label in set(frames):
+            inclusive[label] += count
+    busy = sampler.samples - sampler.idle
+    return {
+        "seconds": seconds,
+        "interval_ms": interval * 1000,
+        "samples": sampler.samples,
+        "idle_samples": sampler.idle,
+        "busy_ratio": round(busy / sampler.samples, 3) if sampler.samples else 0.0,
+        "top_self": [{"function": label, "samples": count} for label, count in own.most_common(top)],
+        "top_cumulative": [{"function": label, "samples": count} for label, count in inclusive.most_common(top)],
+        "collapsed": "\n".join(f"{stack} {count}" for stack, count in sampler.stacks.most_common()),
+    }
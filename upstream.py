@@ -0,0 +1,73 @@
+import importlib.util
+from typing import Dict
+
+import httpx
+
+from settings import settings
+
+# One pooled client per upstream service. They are opened once in the app
+# lifespan (see main.py) so keep-alive connections, DNS results and TLS
+# sessions are reused across requests instead of being rebuilt per call.
+N8N = "n8n"
+HEYGEN = "heygen"
+GLADIA = "gladia"
+
+UPSTREAMS = (N8N, HEYGEN, GLADIA)
+
+CLIENTS: Dict[str, httpx.AsyncClient] = {}
+
+
+def _http2_enabled() -> bool:
+    if not settings.upstream_http2:
+        return False
+    # httpx only speaks HTTP/2 when the optional `h2` package is installed.
+    if importlib.util.find_spec("h2") is None:
+        print("WARNING: UPSTREAM_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1.")
+        return False
+    return True
+
+
+def build_client(name: str) -> httpx.AsyncClient:
+    """Creates the pooled client for one upstream, configured from settings.
+
+    Every setting is per upstream, e.g. `HEYGEN_MAX_CONNECTIONS`, `N8N_TIMEOUT`
+    or `GLADIA_KEEPALIVE_EXPIRY`. `*_TIMEOUT` is the default read timeout;
+    individual calls can still pass their own `timeout=` when they know better
+    (e.g. the n8n start workflow).
+    """
+    limits = httpx.Limits(
+        max_connections=settings.upstream(name, "max_connections"),
+        max_keepalive_connections=settings.upstream(name, "max_keepalive"),
+        keepalive_expiry=settings.upstream(name, "keepalive_expiry"),
+    )
+    timeout = httpx.Timeout(
+        settings.upstream(name, "timeout"),
+        connect=settings.upstream(name, "connect_timeout"),
+    )
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=_http2_enabled())
+
+
+def open_clients():
+    for name in UPSTREAMS:
+        if name not in CLIENTS:
+            CLIENTS[name] = build_client(name)
+    print(f"Upstream client pools opened: {list(CLIENTS.keys())}")
+
+
+async def close_clients():
+    for name in list(CLIENTS.keys()):
+        client = CLIENTS.pop(name)
+        await client.aclose()
+    print("Upstream client pools closed.")
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    """Returns the shared client for an upstream.
+
+    Falls back to creating it lazily so code paths used outside the app
+    lifespan (scripts, ad-hoc calls) keep working.
+    """
+    client = CLIENTS.get(name)
+    if client is None or client.is_closed:
+        client = CLIENTS[name] = build_client(name)
+    return client
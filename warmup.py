@@ -0,0 +1,141 @@
+import asyncio
+import os
+import socket
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from settings import settings
+from upstream import get_client, N8N, HEYGEN, GLADIA
+
+# Startup warm-up: resolve every upstream host and open pooled keep-alive
+# connections (TCP + TLS) to it, so the first interview after a redeploy does
+# not pay for DNS and handshakes on its critical path. /readyz reports ready
+# once this has finished (or timed out) and the required settings are present.
+
+_state = {
+    "status": "pending",  # pending -> warming -> warm (or disabled)
+    "upstreams": {},
+    "milestones": {},
+}
+_task: Optional[asyncio.Task] = None
+_MODULE_LOADED = time.monotonic()
+
+
+def _process_age() -> float:
+    """Seconds since this process was started (Linux), else since this module loaded."""
+    try:
+        with open("/proc/self/stat") as stat:
+            start_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as uptime:
+            return float(uptime.read().split()[0]) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _MODULE_LOADED
+
+
+def mark(milestone: str):
+    """Records how long after process start a startup milestone was reached."""
+    _state["milestones"].setdefault(milestone, round(_process_age(), 3))
+
+
+def upstream_urls() -> Dict[str, str]:
+    urls = {
+        N8N: settings.n8n_start_interview_url,
+        HEYGEN: settings.heygen_server_url,
+        GLADIA: settings.gladia_api_url,
+    }
+    return {name: url for name, url in urls.items() if url}
+
+
+async def warm_upstream(name: str, url: str, connections: int, timeout: float) -> dict:
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    result = {"host": parts.hostname}
+    started = time.perf_counter()
+    try:
+        addresses = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        result["error"] = f"DNS lookup failed: {e}"
+        return result
+    result["dns_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    result["addresses"] = sorted({address[4][0] for address in addresses})
+
+    # Any HTTP response, even a 404, leaves an open connection in the pool.
+    # Concurrent requests make HTTP/1.1 pools open one connection each.
+    origin = f"{parts.scheme}://{parts.netloc}/"
+    started = time.perf_counter()
+    responses = await asyncio.gather(
+        *(get_client(name).request("HEAD", origin, timeout=timeout) for _ in range(connections)),
+        return_exceptions=True)
+    result["connect_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    errors = [response for response in responses if isinstance(response, Exception)]
+    result["connections"] = len(responses) - len(errors)
+    if errors:
+        result["error"] = f"{type(errors[0]).__name__}: {errors[0]}"
+    return result
+
+
+async def _warm():
+    _state["status"] = "warming"
+    urls = upstream_urls()
+    started = time.perf_counter()
+    names = list(urls)
+    try:
+        results = await asyncio.wait_for(asyncio.gather(
+            *(warm_upstream(name, urls[name], settings.startup_warmup_connections, settings.startup_warmup_timeout)
+              for name in names), return_exceptions=True), settings.startup_warmup_timeout)
+    except asyncio.TimeoutError:
+        results = [asyncio.TimeoutError("warm-up timed out")] * len(names)
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            result = {"error": f"{type(result).__name__}: {result}"}
+        _state["upstreams"][name] = result
+        if "error" in result:
+            # Not fatal: the upstream may come up later and calls go through the breakers anyway.
+            print(f"WARNING: Warm-up of {name} failed: {result['error']}")
+    _state["status"] = "warm"
+    mark("warm")
+    print(f"Upstream warm-up finished in {time.perf_counter() - started:.2f}s: "
+          + ", ".join(f"{name} {result.get('connections', 0)} conn" for name, result in _state["upstreams"].items()))
+
+
+def start():
+    """Starts warm-up in the background so the server can answer /readyz meanwhile."""
+    global _task
+    mark("lifespan_started")
+    missing = settings.missing()
+    if missing:
+        print(f"ERROR: Required settings are not set: {', '.join(missing)}")
+        if settings.strict_settings:
+            raise RuntimeError(f"Required settings are not set: {', '.join(missing)}")
+    if not settings.startup_warmup:
+        _state["status"] = "disabled"
+        mark("warm")
+        return
+    _task = asyncio.create_task(_warm())
+
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def is_ready() -> bool:
+    return _state["status"] in ("warm", "disabled") and not settings.missing()
+
+
+def get_stats() -> dict:
+    return {
+        "ready": is_ready(),
+        "warmup": _state["status"],
+        "missing_settings": settings.missing(),
+        "upstreams": _state["upstreams"],
+        # Seconds after process start.
+        "milestones": _state["milestones"],
+    }